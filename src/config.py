@@ -4,6 +4,45 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     BOT_TOKEN: str | None = None
     ADMIN_USER_ID: int = 751585223  # ID администратора
+    TEXT_CACHE_TTL: int = 300  # Время жизни кэша текстов, сек (0 — без истечения)
+    # Через сколько секунд индекс подбора перечитывается из БД: анкеты, измененные
+    # на других инстансах функции, сюда не приходят (0 — без истечения)
+    MATCH_INDEX_TTL: int = 300
+    BATCH_CONCURRENCY: int = 16  # Сколько чатов из пачки апдейтов обрабатывать параллельно
+    POLLING_CONCURRENCY: int = 32  # То же для локального polling
+    # Polling не запрашивает новые апдейты, пока в очередях чатов их больше, чем
+    # POLLING_CONCURRENCY * POLLING_QUEUE_FACTOR
+    POLLING_QUEUE_FACTOR: int = 4
+    WEBHOOK_REPLY: bool = False  # Возвращать answerCallbackQuery в ответе вебхука
+    # Свой адрес Bot API (например, локальный стенд tests/fake_bot_api.py)
+    TELEGRAM_API_URL: str | None = None
+    # Адрес /metrics для Prometheus в локальном режиме (порт 0 — не поднимать)
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9108
+
+    # Трассировка апдейтов (см. utils/tracing.py): доля трасс, которые пишутся
+    # всегда, и порог медленного апдейта, мс (0 — выключено)
+    TRACE_SAMPLE_RATE: float = 0
+    TRACE_SLOW_MS: float = 0
+    TRACE_FILE: str = "/tmp/traces.jsonl"  # пусто — писать трассы в лог
+
+    # Бюджет запросов к БД на апдейт (см. utils/query_budget.py). Строгий режим
+    # для тестов: апдейт с превышением завершается ошибкой
+    QUERY_BUDGET_SESSIONS: int = 2
+    QUERY_BUDGET_STATEMENTS: int = 10
+    QUERY_BUDGET_STRICT: bool = False
+
+    # Лимиты отправки сообщений (см. utils/rate_limiter.py)
+    RATE_GLOBAL_PER_SEC: float = 30
+    RATE_CHAT_PER_SEC: float = 1
+    RATE_CHAT_BURST: float = 5
+    RATE_GROUP_PER_MIN: float = 20
+
+    # Сколько секунд рассылка работает в одном вызове, остаток — кнопкой
+    # «Продолжить». Должно быть меньше таймаута функции: после ответа функции
+    # инстанс замораживается и фоновая задача встает. В polling (main.py)
+    # рассылка идет в фоне до конца
+    BROADCAST_TIME_BUDGET: float = 25
 
     model_config = SettingsConfigDict(env_file=".env")
 
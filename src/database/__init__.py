@@ -1,15 +1,55 @@
-from .models import Base, User, TextTemplate
-from .engine import engine, async_session_maker, init_db, get_session
-from .repository import UserRepository, TextTemplateRepository
+from .models import (
+    Base,
+    User,
+    TextTemplate,
+    FSMRecord,
+    Broadcast,
+    BroadcastDelivery,
+    Chat,
+    ChatMapping,
+    UserStat,
+)
+from .engine import (
+    engine,
+    async_session_maker,
+    init_db,
+    get_session,
+    create_engine,
+    STORAGE_PROFILES,
+)
+from .write_queue import WriteQueue, write_queue
+from .repository import (
+    UserRepository,
+    TextTemplateRepository,
+    BroadcastRepository,
+    ChatRepository,
+    UserStatsRepository,
+)
+from .fsm_storage import SQLiteStorage, FSMFlushMiddleware
 
 __all__ = [
     "Base",
     "User",
     "TextTemplate",
+    "FSMRecord",
+    "Broadcast",
+    "BroadcastDelivery",
+    "Chat",
+    "ChatMapping",
+    "UserStat",
     "engine",
     "async_session_maker",
     "init_db",
     "get_session",
+    "create_engine",
+    "STORAGE_PROFILES",
+    "WriteQueue",
+    "write_queue",
     "UserRepository",
     "TextTemplateRepository",
+    "BroadcastRepository",
+    "ChatRepository",
+    "UserStatsRepository",
+    "SQLiteStorage",
+    "FSMFlushMiddleware",
 ]
@@ -0,0 +1,84 @@
+"""
+Подготовка БД при холодном старте.
+
+Версия схемы и текстов по умолчанию хранится в PRAGMA user_version. Если БД уже
+на текущей версии, DDL и заполнение текстов пропускаются — остается один
+дешевый PRAGMA-запрос.
+"""
+
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from .engine import engine, init_db
+from .init_texts import init_default_texts
+from .init_chats import init_default_chats
+from .migrations import migrate_user_masks
+from .user_stats import install_user_stats
+
+# Увеличивайте при изменении моделей или текстов по умолчанию
+DB_VERSION = 5
+
+# Разовые шаги при переходе на версию: (версия, в которой появился, функция)
+MIGRATIONS = (
+    (3, migrate_user_masks),
+    (4, init_default_chats),
+)
+
+
+async def get_db_version() -> int:
+    """Текущая версия схемы, записанная в БД"""
+    async with engine.connect() as conn:
+        result = await conn.execute(text("PRAGMA user_version"))
+        return result.scalar_one()
+
+
+async def set_db_version(version: int) -> None:
+    """Записать версию схемы в БД"""
+    async with engine.begin() as conn:
+        # PRAGMA не поддерживает параметры, версия — всегда int
+        await conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+async def prepare_database(timings: Optional[dict[str, float]] = None) -> bool:
+    """
+    Привести БД к текущей версии.
+
+    Args:
+        timings: Словарь, куда записывается длительность фаз (мс)
+
+    Returns:
+        True, если понадобились DDL и заполнение текстов
+    """
+    timings = timings if timings is not None else {}
+
+    started = time.perf_counter()
+    version = await get_db_version()
+    timings["version_check"] = (time.perf_counter() - started) * 1000
+
+    if version == DB_VERSION:
+        return False
+
+    started = time.perf_counter()
+    await init_db()
+    timings["ddl"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for since, migration in MIGRATIONS:
+        if version < since:
+            await migration()
+    timings["migrate"] = (time.perf_counter() - started) * 1000
+
+    # Триггеры генерируются из справочников вариантов — пересоздаем при каждой
+    # смене версии и сверяем счетчики
+    started = time.perf_counter()
+    await install_user_stats()
+    timings["stats"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    await init_default_texts()
+    timings["seed"] = (time.perf_counter() - started) * 1000
+
+    await set_db_version(DB_VERSION)
+    return True
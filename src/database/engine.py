@@ -1,17 +1,86 @@
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
 
 from .models import Base
 
 # SQLite по умолчанию в /tmp — в Functions корень read-only.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:////tmp/bot.db")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    # Таймаут для ожидания разблокировки БД (критично для 120+ пользователей)
-    connect_args={"check_same_thread": False, "timeout": 20},
-)
+# Профили хранения: PRAGMA, которые применяются к каждому новому соединению.
+#   durable       — WAL + полный fsync: читатели не блокируются записью, данные
+#                   переживают сбой питания
+#   throughput    — WAL + synchronous=NORMAL, больше кэш и mmap: быстрее коммиты,
+#                   при сбое ОС можно потерять последние транзакции
+#   ephemeral-tmp — журнал в памяти без fsync: для БД в /tmp, которая все равно
+#                   живет не дольше инстанса функции
+STORAGE_PROFILES: dict[str, dict[str, str | int]] = {
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 20000,
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 20000,
+        "cache_size": -32000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+    "ephemeral-tmp": {
+        "journal_mode": "MEMORY",
+        "synchronous": "OFF",
+        "busy_timeout": 20000,
+        "cache_size": -32000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    },
+}
+
+STORAGE_PROFILE = os.getenv("STORAGE_PROFILE", "durable")
+
+
+def create_engine(
+    url: str = DATABASE_URL, profile: str = STORAGE_PROFILE
+) -> AsyncEngine:
+    """Создать движок SQLite с PRAGMA выбранного профиля"""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(
+            f"Unknown storage profile '{profile}', "
+            f"expected one of: {', '.join(STORAGE_PROFILES)}"
+        )
+    pragmas = STORAGE_PROFILES[profile]
+
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        # Таймаут для ожидания разблокировки БД (критично для 120+ пользователей)
+        connect_args={
+            "check_same_thread": False,
+            "timeout": pragmas["busy_timeout"] / 1000,
+        },
+    )
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return new_engine
+
+
+engine = create_engine()
 async_session_maker = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
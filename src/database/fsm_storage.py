@@ -0,0 +1,261 @@
+"""
+Хранилище FSM aiogram в той же БД, что и таблица users.
+
+В Cloud Functions соседние апдейты одного пользователя могут попасть на разные
+инстансы, поэтому MemoryStorage теряет шаги регистрации. Здесь состояние и данные
+читаются одним SELECT при первом обращении в рамках апдейта, дальше отдаются из
+памяти, а все изменения записываются одной транзакцией после обработки апдейта.
+
+Каждый апдейт работает со своими копиями записей: соседний апдейт того же
+пользователя (быстрые нажатия) не видит чужие незаписанные изменения, а общий
+кэш не очищается, пока ключ держит хотя бы один незавершенный апдейт.
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.types import TelegramObject
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .engine import async_session_maker
+from .models import FSMRecord
+from .write_queue import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: str = "{}"
+
+    def copy(self) -> "_Record":
+        return _Record(self.state, self.data)
+
+
+class _UpdateRecords:
+    """Копии записей, прочитанных в рамках одного апдейта"""
+
+    __slots__ = ("records", "dirty")
+
+    def __init__(self):
+        self.records: dict[str, _Record] = {}
+        self.dirty: set[str] = set()
+
+
+# Записи текущего апдейта (None — вне апдейта, пишем сразу)
+_pending: ContextVar[Optional[_UpdateRecords]] = ContextVar("fsm_pending", default=None)
+# Последняя запись, прочитанная вне апдейта: FSMContextMiddleware читает
+# состояние до FSMFlushMiddleware, и тот забирает запись в апдейт
+_prefetched: ContextVar[Optional[tuple[str, _Record]]] = ContextVar(
+    "fsm_prefetched", default=None
+)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite с кэшем чтения и отложенной записью"""
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession] = async_session_maker,
+        key_builder: Optional[KeyBuilder] = None,
+        keep_cache: bool = False,
+        write_queue: Optional[WriteQueue] = None,
+    ):
+        """
+        Args:
+            session_maker: Фабрика сессий БД
+            key_builder: Построитель строковых ключей
+            keep_cache: Хранить записи в памяти между апдейтами.
+                Безопасно только когда бот работает в одном процессе (polling).
+            write_queue: Очередь группового коммита; без нее запись идет
+                своей транзакцией
+        """
+        self.session_maker = session_maker
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_destiny=True
+        )
+        self.keep_cache = keep_cache
+        self.write_queue = write_queue
+        # Последнее записанное состояние ключей (без keep_cache — только
+        # ключей, которые держат незавершенные апдейты)
+        self._cache: dict[str, _Record] = {}
+        # Сколько незавершенных апдейтов держат ключ
+        self._holders: dict[str, int] = {}
+
+    async def _load(self, key: str) -> _Record:
+        pending = _pending.get()
+        if pending is not None:
+            record = pending.records.get(key)
+            if record is not None:
+                return record
+
+        record = self._cache.get(key)
+        if record is None:
+            async with self.session_maker() as session:
+                result = await session.execute(
+                    select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key)
+                )
+                row = result.one_or_none()
+            record = _Record(row.state, row.data) if row else _Record()
+            if self.keep_cache or pending is not None:
+                # Пока шел SELECT, ключ мог записать соседний апдейт
+                record = self._cache.setdefault(key, record)
+            else:
+                _prefetched.set((key, record))
+
+        record = record.copy()
+        if pending is not None:
+            pending.records[key] = record
+            self._holders[key] = self._holders.get(key, 0) + 1
+        return record
+
+    def adopt(self, pending: _UpdateRecords, key: str) -> None:
+        """Взять в апдейт запись ключа, прочитанную перед ним"""
+        prefetched = _prefetched.get()
+        if prefetched is None:
+            return
+        _prefetched.set(None)
+        if prefetched[0] != key or key in pending.records:
+            return
+        record = self._cache.setdefault(key, prefetched[1])
+        pending.records[key] = record.copy()
+        self._holders[key] = self._holders.get(key, 0) + 1
+
+    async def _mark_dirty(self, key: str, record: _Record) -> None:
+        pending = _pending.get()
+        if pending is not None:
+            pending.dirty.add(key)
+        else:
+            await self.flush({key: record})
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        str_key = self.key_builder.build(key)
+        record = await self._load(str_key)
+        record.state = state.state if isinstance(state, State) else state
+        await self._mark_dirty(str_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._load(self.key_builder.build(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        str_key = self.key_builder.build(key)
+        record = await self._load(str_key)
+        record.data = json.dumps(data, ensure_ascii=False)
+        await self._mark_dirty(str_key, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = await self._load(self.key_builder.build(key))
+        # Разбор JSON каждый раз отдает независимую копию данных
+        return json.loads(record.data)
+
+    async def flush(self, records: dict[str, _Record]) -> None:
+        """Записать измененные записи одной транзакцией"""
+        if not records:
+            return
+
+        statements = [self._write_stmt(key, record) for key, record in records.items()]
+        if self.write_queue is not None and self.write_queue.enabled:
+            await self.write_queue.submit_many(*statements)
+        else:
+            async with self.session_maker() as session:
+                for stmt in statements:
+                    await session.execute(stmt)
+                await session.commit()
+
+        for key, record in records.items():
+            if self.keep_cache or key in self._cache:
+                self._cache[key] = record.copy()
+
+    async def release(self, pending: _UpdateRecords) -> None:
+        """
+        Записать изменения завершенного апдейта и отпустить его ключи.
+
+        Ключ убирается из кэша (без keep_cache), только когда его не держит
+        больше ни один незавершенный апдейт.
+        """
+        try:
+            await self.flush({key: pending.records[key] for key in pending.dirty})
+        finally:
+            for key in pending.records:
+                holders = self._holders.pop(key) - 1
+                if holders:
+                    self._holders[key] = holders
+                elif not self.keep_cache:
+                    self._cache.pop(key, None)
+
+    @staticmethod
+    def _write_stmt(key: str, record: _Record):
+        if record.state is None and record.data == "{}":
+            return delete(FSMRecord).where(FSMRecord.key == key)
+        stmt = insert(FSMRecord).values(key=key, state=record.state, data=record.data)
+        return stmt.on_conflict_do_update(
+            index_elements=[FSMRecord.key],
+            set_={
+                "state": stmt.excluded.state,
+                "data": stmt.excluded.data,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """
+    Откладывает запись FSM до конца обработки апдейта.
+
+    Регистрируется как outer-middleware апдейтов после встроенного
+    FSMContextMiddleware, поэтому видит ключ текущего контекста.
+
+    Ошибка записи после упавшего хендлера только пишется в лог, чтобы не
+    подменить исходную ошибку.
+    """
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        pending = _UpdateRecords()
+        context = data.get("state")
+        if context is not None:
+            self.storage.adopt(pending, self.storage.key_builder.build(context.key))
+        token = _pending.set(pending)
+        handled = False
+        try:
+            result = await handler(event, data)
+            handled = True
+            return result
+        finally:
+            _pending.reset(token)
+            try:
+                await self.storage.release(pending)
+            except Exception as e:
+                if handled:
+                    raise
+                logger.error(f"Failed to flush FSM state after handler error: {e}")
@@ -0,0 +1,42 @@
+"""Рекомендуемые чаты по умолчанию"""
+from database import async_session_maker, ChatRepository
+
+# Чаты: (id, название, ссылка)
+DEFAULT_CHATS = (
+    (1, "Клуб биржевых инвестиций", "https://t.me/+hDOyTja5fJxjNTM6"),
+    (2, "Менеджмент новой реальности!", "https://t.me/+3vE_6_mHzeA5NzY6"),
+    (3, "Маркетинг и креатив в бизнесе", "https://t.me/+IHrqutbfD-kyOTQ6"),
+)
+
+# Вариант (callback_data) -> ID рекомендуемых чатов по порядку
+DEFAULT_CHAT_MAPPINGS = {
+    "interest_investments": (1,),
+    "interest_career": (2,),
+    "interest_business": (2,),
+    "interest_economy": (1,),
+    "interest_marketing": (3,),
+    "interest_art": (3,),
+    "event_business": (2,),
+    "event_cultural": (3,),
+}
+
+
+async def init_default_chats() -> bool:
+    """
+    Заполнить справочник чатов, если он пуст.
+
+    Непустой справочник не трогается — удаленные в админке чаты и привязки
+    не возвращаются.
+    """
+    async with async_session_maker() as session:
+        return await ChatRepository(session).create_defaults(
+            [
+                {"id": chat_id, "title": title, "url": url, "position": chat_id}
+                for chat_id, title, url in DEFAULT_CHATS
+            ],
+            [
+                {"option": option, "chat_id": chat_id, "position": position}
+                for option, chat_ids in DEFAULT_CHAT_MAPPINGS.items()
+                for position, chat_id in enumerate(chat_ids)
+            ],
+        )
@@ -15,69 +15,97 @@ TEXT_KEYS = {
     "event_invitation": ("Приглашение на мероприятие", "Сообщение с приглашением на мероприятие"),
 }
 
+# Подстановки, которые передаются в каждый текст при отправке.
+# Используются для проверки текста при сохранении в админке.
+TEXT_PLACEHOLDERS = {
+    "welcome_new": frozenset({"first_name"}),
+    "welcome_return": frozenset({"first_name"}),
+    "registration_name": frozenset(),
+    "registration_city": frozenset(),
+    "registration_interests": frozenset(),
+    "registration_events": frozenset(),
+    "registration_about": frozenset(),
+    "status_diamond": frozenset({"first_name"}),
+    "registration_complete": frozenset(
+        {"first_name", "last_name", "city", "interests", "events", "about"}
+    ),
+    "event_invitation": frozenset({"first_name"}),
+}
+
+
+# Тексты по умолчанию, которые создаются при первом запуске
+DEFAULT_TEXTS = {
+    "welcome_new": (
+        "👋 Привет, <b>{first_name}</b>!\n\n"
+        "Давайте познакомимся поближе.\n\n"
+        "<b>Как Вас зовут?</b>\n"
+        "Введите имя и фамилию."
+    ),
+    "welcome_return": (
+        "👋 С возвращением, <b>{first_name}</b>!\n\n"
+        "Ваш профиль уже заполнен.\n"
+        "Используйте /profile чтобы посмотреть информацию."
+    ),
+    "registration_name": (
+        "<b>Как Вас зовут?</b>\n"
+        "Введите имя и фамилию."
+    ),
+    "registration_city": (
+        "<b>Из какого вы города?</b>"
+    ),
+    "registration_interests": (
+        "<b>Какими сферами вы интересуетесь?</b>\n"
+        "Выберите один или несколько вариантов:"
+    ),
+    "registration_events": (
+        "<b>Какие мероприятия Вам интересны?</b>\n"
+        "Выберите один или несколько вариантов:"
+    ),
+    "registration_about": (
+        "<b>Расскажите о себе</b>\n\n"
+        "Это поможет лучше подобрать для Вас собеседника.\n"
+        "Максимум 150 слов.\n\n"
+        "Или нажмите кнопку, чтобы пропустить этот шаг."
+    ),
+    "status_diamond": (
+        "{first_name}, Поздравляем Вас с получением статуса Бриллиант 💎"
+    ),
+    "registration_complete": (
+        "🎉 <b>Спасибо, что ответили!</b>\n\n"
+        "<b>Ваши ответы:</b>\n\n"
+        "👤 <b>Имя:</b> {first_name} {last_name}\n"
+        "🏙️ <b>Город:</b> {city}\n"
+        "💡 <b>Интересы:</b> {interests}\n"
+        "🎪 <b>Мероприятия:</b> {events}\n"
+        "📝 <b>О себе:</b> {about}\n\n"
+        "Ваш профиль успешно создан! ✅"
+    ),
+    "event_invitation": (
+        "Здравствуйте, {first_name}! Будем рады видеть Вас на мероприятии, "
+        "посвященном окончанию кейс-чемпионата Cup  Moscow 2025!\n\n"
+        "Дата: 17 декабря 2025\n"
+        "Место: Отель Хилтон (г. Москва, Каланчёвская ул., 21/40)"
+    ),
+}
+
 
 async def init_default_texts():
-    """Инициализация текстов по умолчанию"""
+    """
+    Инициализация текстов по умолчанию.
+
+    Все тексты вставляются одним INSERT ... ON CONFLICT DO NOTHING, поэтому
+    отредактированные в админке тексты не затрагиваются.
+    """
     async with async_session_maker() as session:
         repo = TextTemplateRepository(session)
-        
-        default_texts = {
-            "welcome_new": (
-                "👋 Привет, <b>{first_name}</b>!\n\n"
-                "Давайте познакомимся поближе.\n\n"
-                "<b>Как Вас зовут?</b>\n"
-                "Введите имя и фамилию."
-            ),
-            "welcome_return": (
-                "👋 С возвращением, <b>{first_name}</b>!\n\n"
-                "Ваш профиль уже заполнен.\n"
-                "Используйте /profile чтобы посмотреть информацию."
-            ),
-            "registration_name": (
-                "<b>Как Вас зовут?</b>\n"
-                "Введите имя и фамилию."
-            ),
-            "registration_city": (
-                "<b>Из какого вы города?</b>"
-            ),
-            "registration_interests": (
-                "<b>Какими сферами вы интересуетесь?</b>\n"
-                "Выберите один или несколько вариантов:"
-            ),
-            "registration_events": (
-                "<b>Какие мероприятия Вам интересны?</b>\n"
-                "Выберите один или несколько вариантов:"
-            ),
-            "registration_about": (
-                "<b>Расскажите о себе</b>\n\n"
-                "Это поможет лучше подобрать для Вас собеседника.\n"
-                "Максимум 150 слов.\n\n"
-                "Или нажмите кнопку, чтобы пропустить этот шаг."
-            ),
-            "status_diamond": (
-                "{first_name}, Поздравляем Вас с получением статуса Бриллиант 💎"
-            ),
-            "registration_complete": (
-                "🎉 <b>Спасибо, что ответили!</b>\n\n"
-                "<b>Ваши ответы:</b>\n\n"
-                "👤 <b>Имя:</b> {first_name} {last_name}\n"
-                "🏙️ <b>Город:</b> {city}\n"
-                "💡 <b>Интересы:</b> {interests}\n"
-                "🎪 <b>Мероприятия:</b> {events}\n"
-                "📝 <b>О себе:</b> {about}\n\n"
-                "Ваш профиль успешно создан! ✅"
-            ),
-            "event_invitation": (
-                "Здравствуйте, {first_name}! Будем рады видеть Вас на мероприятии, "
-                "посвященном окончанию кейс-чемпионата Cup  Moscow 2025!\n\n"
-                "Дата: 17 декабря 2025\n"
-                "Место: Отель Хилтон (г. Москва, Каланчёвская ул., 21/40)"
-            ),
-        }
-        
-        for key, (title, description) in TEXT_KEYS.items():
-            content = default_texts.get(key, "")
-            existing = await repo.get_by_key(key)
-            if not existing:  # Создаем только если еще не существует
-                await repo.create_or_update(key, title, content, description)
-
+        await repo.create_missing(
+            [
+                {
+                    "key": key,
+                    "title": title,
+                    "content": DEFAULT_TEXTS.get(key, ""),
+                    "description": description,
+                }
+                for key, (title, description) in TEXT_KEYS.items()
+            ]
+        )
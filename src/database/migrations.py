@@ -0,0 +1,133 @@
+"""
+Миграции существующей БД.
+
+create_all создает только отсутствующие таблицы, изменения уже созданных таблиц
+выполняются здесь. Каждая миграция сама проверяет схему, поэтому ее можно
+повторить после сбоя и безопасно запустить на новой БД.
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from options import EVENTS, INTERESTS
+
+from .engine import engine
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной транзакции переноса: короткие транзакции не задерживают
+# запись от обработчиков, пока миграция идет
+BACKFILL_BATCH = 500
+
+
+async def _table_columns(conn: AsyncConnection, table: str) -> set[str]:
+    result = await conn.execute(text(f"PRAGMA table_info({table})"))
+    return {row.name for row in result}
+
+
+def _can_clear(value: Optional[str], mask: int) -> bool:
+    """Старую строку можно очистить: она перенесена в маску или пуста."""
+    return value is None or mask != 0 or not value.strip()
+
+
+async def migrate_user_masks() -> int:
+    """
+    Перенести интересы и типы мероприятий из строк названий в битовые маски.
+
+    Добавляет колонки interests_mask / events_mask с индексами и порциями
+    заполняет их из старых колонок interests / events, очищая перенесенные строки.
+    Строку, в которой не нашлось ни одного известного варианта, оставляем как
+    есть и пишем предупреждение — ее можно поправить вручную и перезапустить.
+
+    Returns:
+        Число перенесенных пользователей
+    """
+    async with engine.begin() as conn:
+        columns = await _table_columns(conn, "users")
+        for column in ("interests_mask", "events_mask"):
+            if column not in columns:
+                await conn.execute(
+                    text(
+                        f"ALTER TABLE users ADD COLUMN {column} "
+                        "INTEGER NOT NULL DEFAULT 0"
+                    )
+                )
+            await conn.execute(
+                text(f"CREATE INDEX IF NOT EXISTS ix_users_{column} ON users ({column})")
+            )
+
+    if not {"interests", "events"} <= columns:
+        return 0
+
+    migrated = 0
+    kept = 0
+    cursor = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT id, interests, events FROM users "
+                    "WHERE id > :cursor "
+                    "AND (interests IS NOT NULL OR events IS NOT NULL) "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"cursor": cursor, "limit": BACKFILL_BATCH},
+            )
+            rows = result.all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                interests_mask = INTERESTS.mask_from_names(row.interests)
+                events_mask = EVENTS.mask_from_names(row.events)
+                clear_interests = _can_clear(row.interests, interests_mask)
+                clear_events = _can_clear(row.events, events_mask)
+                if not (clear_interests and clear_events):
+                    kept += 1
+                    logger.warning(
+                        f"User {row.id}: legacy interests/events not recognized, "
+                        f"column kept (interests={row.interests!r}, events={row.events!r})"
+                    )
+                else:
+                    migrated += 1
+                params.append(
+                    {
+                        "id": row.id,
+                        "interests_mask": interests_mask,
+                        "events_mask": events_mask,
+                        "clear_interests": clear_interests,
+                        "clear_events": clear_events,
+                    }
+                )
+
+            # Маску, уже записанную новым кодом во время миграции, не затираем.
+            # Старую строку очищаем, только если она перенесена в маску
+            await conn.execute(
+                text(
+                    "UPDATE users SET "
+                    "interests_mask = CASE WHEN interests_mask = 0 "
+                    "THEN :interests_mask ELSE interests_mask END, "
+                    "events_mask = CASE WHEN events_mask = 0 "
+                    "THEN :events_mask ELSE events_mask END, "
+                    "interests = CASE WHEN :clear_interests "
+                    "THEN NULL ELSE interests END, "
+                    "events = CASE WHEN :clear_events "
+                    "THEN NULL ELSE events END "
+                    "WHERE id = :id"
+                ),
+                params,
+            )
+
+        cursor = rows[-1].id
+
+    if migrated:
+        logger.info(f"Migrated interests/events of {migrated} users to bitmasks")
+    if kept:
+        logger.warning(
+            f"Legacy interests/events of {kept} users kept: no known options found"
+        )
+    return migrated
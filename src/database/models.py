@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, String, Text, DateTime
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, String, Text, DateTime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -34,11 +34,19 @@ class User(Base):
     city: Mapped[Optional[str]] = mapped_column(
         String(100), nullable=True, comment="Город пользователя"
     )
-    interests: Mapped[Optional[str]] = mapped_column(
-        Text, nullable=True, comment="Интересы пользователя"
+    interests_mask: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        index=True,
+        comment="Интересы пользователя: битовая маска INTERESTS",
     )
-    events: Mapped[Optional[str]] = mapped_column(
-        Text, nullable=True, comment="События пользователя"
+    events_mask: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        index=True,
+        comment="Типы мероприятий: битовая маска EVENTS",
     )
     about: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="О себе")
     created_at: Mapped[datetime] = mapped_column(
@@ -83,4 +91,141 @@ class TextTemplate(Base):
     )
 
     def __repr__(self) -> str:
-        return f"TextTemplate(key={self.key}, title={self.title})"
\ No newline at end of file
+        return f"TextTemplate(key={self.key}, title={self.title})"
+
+
+class FSMRecord(Base):
+    """Модель для хранения состояний FSM (aiogram)"""
+
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(
+        String(255), primary_key=True, comment="Ключ хранилища aiogram"
+    )
+    state: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, comment="Текущее состояние"
+    )
+    data: Mapped[str] = mapped_column(
+        Text, default="{}", comment="Данные состояния (JSON)"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        comment="Дата обновления",
+    )
+
+    def __repr__(self) -> str:
+        return f"FSMRecord(key={self.key}, state={self.state})"
+
+
+class Broadcast(Base):
+    """Модель рассылки шаблона всем пользователям"""
+
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    template_key: Mapped[str] = mapped_column(
+        String(100), comment="Ключ рассылаемого шаблона"
+    )
+    status: Mapped[str] = mapped_column(
+        String(16), default="running", index=True, comment="running / done"
+    )
+    last_user_id: Mapped[int] = mapped_column(
+        BigInteger, default=0, comment="Курсор: последний обработанный ID пользователя"
+    )
+    total: Mapped[int] = mapped_column(Integer, default=0, comment="Получателей на старте")
+    sent: Mapped[int] = mapped_column(Integer, default=0, comment="Доставлено")
+    failed: Mapped[int] = mapped_column(Integer, default=0, comment="Ошибок доставки")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, comment="Дата создания"
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, nullable=True, comment="Дата завершения"
+    )
+
+    def __repr__(self) -> str:
+        return f"Broadcast(id={self.id}, status={self.status})"
+
+
+class BroadcastDelivery(Base):
+    """Статус доставки рассылки конкретному пользователю"""
+
+    __tablename__ = "broadcast_deliveries"
+
+    broadcast_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("broadcasts.id"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[str] = mapped_column(String(16), comment="sent / failed")
+    error: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, comment="Текст ошибки Telegram"
+    )
+    sent_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, comment="Время попытки"
+    )
+
+    def __repr__(self) -> str:
+        return f"BroadcastDelivery(broadcast_id={self.broadcast_id}, user_id={self.user_id})"
+
+
+class Chat(Base):
+    """Чат, который рекомендуется после регистрации"""
+
+    __tablename__ = "chats"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    title: Mapped[str] = mapped_column(String(100), comment="Название чата")
+    url: Mapped[str] = mapped_column(String(255), comment="Ссылка-приглашение")
+    position: Mapped[int] = mapped_column(Integer, default=0, comment="Порядок вывода")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        comment="Дата обновления",
+    )
+
+    def __repr__(self) -> str:
+        return f"Chat(id={self.id}, title={self.title})"
+
+
+class ChatMapping(Base):
+    """Привязка чата к интересу или типу мероприятий"""
+
+    __tablename__ = "chat_mappings"
+
+    option: Mapped[str] = mapped_column(
+        String(50), primary_key=True, comment="callback_data варианта (interest_*, event_*)"
+    )
+    chat_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("chats.id"), primary_key=True
+    )
+    position: Mapped[int] = mapped_column(
+        Integer, default=0, comment="Порядок чата внутри варианта"
+    )
+
+    def __repr__(self) -> str:
+        return f"ChatMapping(option={self.option}, chat_id={self.chat_id})"
+
+
+class UserStat(Base):
+    """
+    Счетчик статистики участников.
+
+    Поддерживается триггерами на users в той же транзакции, что и запись анкеты
+    (см. database/user_stats.py).
+    """
+
+    __tablename__ = "user_stats"
+    __table_args__ = (Index("ix_user_stats_kind_count", "kind", "count"),)
+
+    kind: Mapped[str] = mapped_column(
+        String(16), primary_key=True, comment="users / option / city"
+    )
+    name: Mapped[str] = mapped_column(
+        String(100), primary_key=True, comment="Имя счетчика, вариант или город"
+    )
+    count: Mapped[int] = mapped_column(Integer, default=0, comment="Значение")
+
+    def __repr__(self) -> str:
+        return f"UserStat(kind={self.kind}, name={self.name}, count={self.count})"
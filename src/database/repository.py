@@ -1,8 +1,53 @@
+from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import select
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import User, TextTemplate
+from options import EVENTS, INTERESTS
+
+from .models import (
+    User,
+    TextTemplate,
+    Broadcast,
+    BroadcastDelivery,
+    Chat,
+    ChatMapping,
+    UserStat,
+)
+from .user_stats import COMPLETE_PROFILE, rebuild_statements
+from .write_queue import write_queue
+
+users_table = User.__table__
+broadcasts_table = Broadcast.__table__
+deliveries_table = BroadcastDelivery.__table__
+
+# Поля анкеты и их значения после сброса профиля
+PROFILE_DEFAULTS = {
+    "first_name": None,
+    "last_name": None,
+    "city": None,
+    "interests_mask": 0,
+    "events_mask": 0,
+    "about": None,
+}
+
+# Максимум параметров в одном IN (лимит переменных SQLite в старых сборках — 999)
+IN_CHUNK_SIZE = 900
+
+# Строк в одной странице выгрузки пользователей
+EXPORT_CHUNK_SIZE = 500
+
+# Колонки-маски и справочники их вариантов
+MASK_OPTIONS = {"interests_mask": INTERESTS, "events_mask": EVENTS}
+
+# Поля профиля, которые можно менять через UserRepository.update
+USER_UPDATABLE_FIELDS = frozenset(users_table.columns.keys()) - {
+    "id",
+    "created_at",
+    "updated_at",
+}
 
 
 class UserRepository:
@@ -11,6 +56,19 @@ class UserRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    async def _write(self, stmt) -> list[Row]:
+        """
+        Выполнить запись: через очередь группового коммита, если она включена,
+        иначе в своей сессии. Возвращает строки RETURNING.
+        """
+        if write_queue.enabled:
+            return await write_queue.submit(stmt)
+
+        result = await self.session.execute(stmt)
+        rows = result.all()
+        await self.session.commit()
+        return rows
+
     async def get_by_id(self, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
         result = await self.session.execute(select(User).where(User.id == user_id))
@@ -29,51 +87,242 @@ class UserRepository:
         await self.session.refresh(user)
         return user
 
-    async def update(self, user_id: int, **kwargs) -> Optional[User]:
-        """Обновить данные пользователя"""
-        user = await self.get_by_id(user_id)
-        if not user:
-            return None
+    async def update(self, user_id: int, **kwargs) -> Optional[Row]:
+        """
+        Обновить данные пользователя.
 
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
+        Один UPDATE ... RETURNING только с переданными полями и updated_at —
+        без предварительного SELECT и refresh.
 
-        await self.session.commit()
-        await self.session.refresh(user)
-        return user
+        Returns:
+            Строка с актуальными полями пользователя или None, если его нет
+
+        Raises:
+            ValueError: Если передано поле, которого нет в модели User
+        """
+        unknown = set(kwargs) - USER_UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown User fields: {', '.join(sorted(unknown))}")
+
+        stmt = (
+            update(users_table)
+            .where(users_table.c.id == user_id)
+            .values(**kwargs, updated_at=datetime.utcnow())
+            .returning(*users_table.c)
+        )
+        rows = await self._write(stmt)
+        return rows[0] if rows else None
 
     async def get_or_create(
         self,
         user_id: int,
         username: Optional[str] = None,
         first_name_tg: Optional[str] = None,
-    ) -> tuple[User, bool]:
-        """Получить или создать пользователя. Возвращает (user, created)"""
-        user = await self.get_by_id(user_id)
-        if user:
-            return user, False
+    ) -> tuple[Row, bool]:
+        """
+        Получить или создать пользователя. Возвращает (user, created).
 
-        user = await self.create(user_id, username, first_name_tg)
-        return user, True
+        Один INSERT ... ON CONFLICT DO UPDATE ... RETURNING: безопасно при
+        повторной доставке апдейта и двойном /start. Для существующего
+        пользователя обновляются данные из Telegram (username, имя).
+        """
+        now = datetime.utcnow()
+        stmt = insert(users_table).values(
+            id=user_id,
+            username=username,
+            first_name_tg=first_name_tg,
+            created_at=now,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[users_table.c.id],
+            set_={
+                "username": stmt.excluded.username,
+                "first_name_tg": stmt.excluded.first_name_tg,
+            },
+        ).returning(*users_table.c)
+        (user,) = await self._write(stmt)
+        # created_at совпадает с нашим now, только если строку вставили сейчас
+        return user, user.created_at == now
 
-    async def reset_profile(self, user_id: int) -> Optional[User]:
+    async def create_or_reset(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        first_name_tg: Optional[str] = None,
+    ) -> Row:
+        """
+        Создать пользователя или сбросить его анкету одним запросом (для /restart).
+        """
+        now = datetime.utcnow()
+        stmt = insert(users_table).values(
+            id=user_id,
+            username=username,
+            first_name_tg=first_name_tg,
+            created_at=now,
+            updated_at=now,
+        )
+        set_ = dict(PROFILE_DEFAULTS)
+        set_.update(
+            username=stmt.excluded.username,
+            first_name_tg=stmt.excluded.first_name_tg,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[users_table.c.id], set_=set_
+        ).returning(*users_table.c)
+        (user,) = await self._write(stmt)
+        return user
+
+    async def reset_profile(self, user_id: int) -> Optional[Row]:
         """Сбросить профиль пользователя (очистить все поля профиля, кроме базовых)"""
-        user = await self.get_by_id(user_id)
-        if not user:
-            return None
+        return await self.update(user_id, **PROFILE_DEFAULTS)
 
-        # Очищаем все поля профиля, сохраняя базовые данные
-        user.first_name = None
-        user.last_name = None
-        user.city = None
-        user.interests = None
-        user.events = None
-        user.about = None
+    async def get_profiles_page(self, after_user_id: int, limit: int) -> list[Row]:
+        """
+        Страница заполненных анкет после курсора (для подбора собеседников).
 
-        await self.session.commit()
-        await self.session.refresh(user)
-        return user
+        Keyset-пагинация по первичному ключу, только нужные для подбора поля.
+        """
+        result = await self.session.execute(
+            select(
+                users_table.c.id,
+                users_table.c.first_name,
+                users_table.c.interests_mask,
+                users_table.c.events_mask,
+                users_table.c.about,
+            )
+            .where(
+                users_table.c.id > after_user_id,
+                users_table.c.first_name.is_not(None),
+            )
+            .order_by(users_table.c.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def get_by_ids(self, user_ids: list[int]) -> dict[int, Row]:
+        """Пользователи по списку ID (запросами по IN_CHUNK_SIZE)"""
+        users = {}
+        for start in range(0, len(user_ids), IN_CHUNK_SIZE):
+            chunk = user_ids[start : start + IN_CHUNK_SIZE]
+            result = await self.session.execute(
+                select(*users_table.c).where(users_table.c.id.in_(chunk))
+            )
+            users.update((row.id, row) for row in result)
+        return users
+
+    async def get_rows_page(
+        self,
+        columns: list[str],
+        after_user_id: int = 0,
+        complete_only: bool = False,
+        city: Optional[str] = None,
+        limit: int = EXPORT_CHUNK_SIZE,
+    ) -> list[Row]:
+        """
+        Страница пользователей после курсора (для выгрузки).
+
+        Keyset-пагинация по первичному ключу: каждую страницу можно читать в
+        своей короткой сессии, не держа транзакцию чтения на всю выгрузку.
+
+        Args:
+            columns: Колонки users; id добавляется в конец, если его нет, —
+                по нему берется курсор следующей страницы
+            after_user_id: ID последнего пользователя предыдущей страницы
+            complete_only: Только заполненные анкеты
+            city: Только пользователи из города (точное совпадение)
+            limit: Строк в странице
+        """
+        if "id" not in columns:
+            columns = [*columns, "id"]
+        stmt = (
+            select(*(users_table.c[column] for column in columns))
+            .where(users_table.c.id > after_user_id)
+            .order_by(users_table.c.id)
+            .limit(limit)
+        )
+        if complete_only:
+            stmt = stmt.where(text(COMPLETE_PROFILE.format(row="users")))
+        if city:
+            stmt = stmt.where(users_table.c.city == city)
+
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    def _options_filter(self, interests: int, events: int, match_all: bool) -> list:
+        """Условия по маскам: IN по списку подходящих масок использует индексы"""
+        conditions = []
+        if interests:
+            conditions.append(
+                users_table.c.interests_mask.in_(INTERESTS.masks_with(interests, match_all))
+            )
+        if events:
+            conditions.append(
+                users_table.c.events_mask.in_(EVENTS.masks_with(events, match_all))
+            )
+        return conditions
+
+    async def find_by_options(
+        self,
+        interests: int = 0,
+        events: int = 0,
+        match_all: bool = False,
+        limit: Optional[int] = None,
+    ) -> list[Row]:
+        """
+        Пользователи с выбранными интересами и (или) типами мероприятий.
+
+        Args:
+            interests: Биты INTERESTS (0 — без фильтра)
+            events: Биты EVENTS (0 — без фильтра)
+            match_all: True — нужны все биты, False — хотя бы один
+            limit: Максимум строк
+        """
+        stmt = (
+            select(*users_table.c)
+            .where(*self._options_filter(interests, events, match_all))
+            .order_by(users_table.c.id)
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def count_by_options(
+        self, interests: int = 0, events: int = 0, match_all: bool = False
+    ) -> int:
+        """Число пользователей под фильтром find_by_options"""
+        stmt = (
+            select(func.count())
+            .select_from(users_table)
+            .where(*self._options_filter(interests, events, match_all))
+        )
+        return await self.session.scalar(stmt)
+
+    async def count_per_option(self, field: str) -> dict[str, int]:
+        """
+        Число пользователей по каждому варианту (callback_data -> count).
+
+        GROUP BY по маске читает только индекс, разбор масок на варианты — в Python.
+
+        Args:
+            field: "interests_mask" или "events_mask"
+
+        Raises:
+            ValueError: Если поле не является маской
+        """
+        if field not in MASK_OPTIONS:
+            raise ValueError(f"Unknown mask field: {field}")
+        options = MASK_OPTIONS[field]
+        column = users_table.c[field]
+        result = await self.session.execute(
+            select(column, func.count()).where(column != 0).group_by(column)
+        )
+        counts = dict.fromkeys(options.names, 0)
+        for mask, count in result:
+            for callback_data in options.callbacks(mask):
+                counts[callback_data] += count
+        return counts
 
 
 class TextTemplateRepository:
@@ -114,6 +363,25 @@ class TextTemplateRepository:
         await self.session.refresh(template)
         return template
 
+    async def create_missing(self, templates: List[dict]) -> int:
+        """
+        Создать шаблоны, которых еще нет в БД.
+
+        Один многострочный INSERT ... ON CONFLICT DO NOTHING в одной транзакции;
+        существующие шаблоны не изменяются. Возвращает число созданных строк.
+        """
+        if not templates:
+            return 0
+
+        stmt = (
+            insert(TextTemplate)
+            .values(templates)
+            .on_conflict_do_nothing(index_elements=[TextTemplate.key])
+        )
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount
+
     async def delete(self, key: str) -> bool:
         """Удалить шаблон"""
         template = await self.get_by_key(key)
@@ -122,4 +390,280 @@ class TextTemplateRepository:
 
         await self.session.delete(template)
         await self.session.commit()
-        return True
\ No newline at end of file
+        return True
+
+
+class BroadcastRepository:
+    """Репозиторий для работы с рассылками"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_latest(self) -> Optional[Broadcast]:
+        """Последняя рассылка (активная или завершенная)"""
+        result = await self.session.execute(
+            select(Broadcast).order_by(Broadcast.id.desc()).limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_active(self) -> Optional[Broadcast]:
+        """Незавершенная рассылка, которую можно продолжить"""
+        result = await self.session.execute(
+            select(Broadcast)
+            .where(Broadcast.status == "running")
+            .order_by(Broadcast.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def create(self, template_key: str) -> Broadcast:
+        """Создать рассылку; total — число пользователей на момент старта"""
+        total = await self.session.scalar(select(func.count()).select_from(User))
+        broadcast = Broadcast(template_key=template_key, total=total)
+        self.session.add(broadcast)
+        await self.session.commit()
+        await self.session.refresh(broadcast)
+        return broadcast
+
+    async def get_recipients(
+        self, broadcast_id: int, after_user_id: int, limit: int
+    ) -> list[Row]:
+        """
+        Следующая страница получателей после курсора.
+
+        Keyset-пагинация по первичному ключу: каждая страница — короткий запрос,
+        который не держит читающую транзакцию во время отправки. Пользователи,
+        которым рассылка уже доставлялась, пропускаются.
+        """
+        delivered = select(deliveries_table.c.user_id).where(
+            deliveries_table.c.broadcast_id == broadcast_id,
+            deliveries_table.c.user_id == users_table.c.id,
+        )
+        result = await self.session.execute(
+            select(
+                users_table.c.id,
+                users_table.c.first_name,
+                users_table.c.first_name_tg,
+            )
+            .where(users_table.c.id > after_user_id, ~delivered.exists())
+            .order_by(users_table.c.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def record_delivery(
+        self,
+        broadcast_id: int,
+        user_id: int,
+        status: str,
+        error: Optional[str] = None,
+    ) -> None:
+        """Записать результат доставки и обновить счетчики рассылки в одной транзакции"""
+        delivery = (
+            insert(deliveries_table)
+            .values(
+                broadcast_id=broadcast_id,
+                user_id=user_id,
+                status=status,
+                error=error,
+                sent_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing()
+        )
+        counter = broadcasts_table.c.sent if status == "sent" else broadcasts_table.c.failed
+        counters = (
+            update(broadcasts_table)
+            .where(broadcasts_table.c.id == broadcast_id)
+            .values({counter: counter + 1})
+        )
+        await self._write(delivery, counters)
+
+    async def advance(self, broadcast_id: int, last_user_id: int) -> None:
+        """Сдвинуть курсор после обработки страницы"""
+        await self._write(
+            update(broadcasts_table)
+            .where(broadcasts_table.c.id == broadcast_id)
+            .values(last_user_id=last_user_id)
+        )
+
+    async def finish(self, broadcast_id: int) -> None:
+        """Отметить рассылку завершенной"""
+        await self._write(
+            update(broadcasts_table)
+            .where(broadcasts_table.c.id == broadcast_id)
+            .values(status="done", finished_at=datetime.utcnow())
+        )
+
+    async def _write(self, *stmts) -> None:
+        """Выполнить запросы в одной транзакции (через очередь, если она включена)"""
+        if write_queue.enabled:
+            await write_queue.submit_many(*stmts)
+            return
+
+        for stmt in stmts:
+            await self.session.execute(stmt)
+        await self.session.commit()
+
+
+class ChatRepository:
+    """Репозиторий для работы с рекомендуемыми чатами и их привязками"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_all(self) -> List[Chat]:
+        """Все чаты в порядке вывода"""
+        result = await self.session.execute(
+            select(Chat).order_by(Chat.position, Chat.id)
+        )
+        return list(result.scalars().all())
+
+    async def get(self, chat_id: int) -> Optional[Chat]:
+        """Получить чат по ID"""
+        return await self.session.get(Chat, chat_id)
+
+    async def get_mappings(self) -> List[ChatMapping]:
+        """Все привязки в порядке вывода"""
+        result = await self.session.execute(
+            select(ChatMapping).order_by(
+                ChatMapping.option, ChatMapping.position, ChatMapping.chat_id
+            )
+        )
+        return list(result.scalars().all())
+
+    async def get_options(self, chat_id: int) -> set[str]:
+        """Варианты, к которым привязан чат"""
+        result = await self.session.execute(
+            select(ChatMapping.option).where(ChatMapping.chat_id == chat_id)
+        )
+        return set(result.scalars().all())
+
+    async def create(self, title: str, url: str) -> Chat:
+        """Создать чат в конце списка"""
+        position = await self.session.scalar(
+            select(func.coalesce(func.max(Chat.position), 0) + 1)
+        )
+        chat = Chat(title=title, url=url, position=position)
+        self.session.add(chat)
+        await self.session.commit()
+        await self.session.refresh(chat)
+        return chat
+
+    async def update(self, chat_id: int, **kwargs) -> Optional[Chat]:
+        """Обновить название или ссылку чата"""
+        chat = await self.get(chat_id)
+        if not chat:
+            return None
+        for field, value in kwargs.items():
+            setattr(chat, field, value)
+        await self.session.commit()
+        await self.session.refresh(chat)
+        return chat
+
+    async def delete(self, chat_id: int) -> bool:
+        """Удалить чат вместе с его привязками"""
+        await self.session.execute(
+            delete(ChatMapping).where(ChatMapping.chat_id == chat_id)
+        )
+        result = await self.session.execute(delete(Chat).where(Chat.id == chat_id))
+        await self.session.commit()
+        return result.rowcount > 0
+
+    async def toggle_mapping(self, chat_id: int, option: str) -> bool:
+        """
+        Привязать чат к варианту или отвязать от него.
+
+        Returns:
+            True, если чат теперь привязан
+        """
+        result = await self.session.execute(
+            delete(ChatMapping).where(
+                ChatMapping.chat_id == chat_id, ChatMapping.option == option
+            )
+        )
+        if result.rowcount:
+            await self.session.commit()
+            return False
+
+        position = await self.session.scalar(
+            select(func.coalesce(func.max(ChatMapping.position), 0) + 1).where(
+                ChatMapping.option == option
+            )
+        )
+        self.session.add(ChatMapping(option=option, chat_id=chat_id, position=position))
+        await self.session.commit()
+        return True
+
+    async def create_defaults(self, chats: List[dict], mappings: List[dict]) -> bool:
+        """
+        Заполнить пустой справочник чатов.
+
+        Returns:
+            True, если чаты были добавлены (справочник был пуст)
+        """
+        if await self.session.scalar(select(func.count()).select_from(Chat)):
+            return False
+
+        await self.session.execute(insert(Chat).values(chats))
+        if mappings:
+            await self.session.execute(insert(ChatMapping).values(mappings))
+        await self.session.commit()
+        return True
+
+
+class UserStatsRepository:
+    """
+    Репозиторий счетчиков статистики участников.
+
+    Счетчики ведут триггеры на users (database/user_stats.py), поэтому чтение —
+    выборка нескольких десятков строк по первичному ключу и индексу, независимо
+    от размера users.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_summary(self, top_cities: int = 10) -> dict:
+        """
+        Сводка для админки.
+
+        Returns:
+            {"total", "complete", "partial", "options": {callback_data: count},
+             "cities": [(город, count), ...] по убыванию}
+        """
+        result = await self.session.execute(
+            select(UserStat.kind, UserStat.name, UserStat.count).where(
+                UserStat.kind.in_(("users", "option"))
+            )
+        )
+        counters = {"users": {}, "option": {}}
+        for kind, name, count in result:
+            counters[kind][name] = count
+
+        result = await self.session.execute(
+            select(UserStat.name, UserStat.count)
+            .where(UserStat.kind == "city", UserStat.count > 0)
+            .order_by(UserStat.count.desc(), UserStat.name)
+            .limit(top_cities)
+        )
+
+        total = counters["users"].get("total", 0)
+        complete = counters["users"].get("complete", 0)
+        return {
+            "total": total,
+            "complete": complete,
+            "partial": total - complete,
+            "options": counters["option"],
+            "cities": [tuple(row) for row in result],
+        }
+
+    async def rebuild(self) -> None:
+        """Пересчитать все счетчики по таблице users одной транзакцией"""
+        statements = rebuild_statements()
+        if write_queue.enabled:
+            await write_queue.submit_many(*statements)
+            return
+
+        for statement in statements:
+            await self.session.execute(statement)
+        await self.session.commit()
@@ -0,0 +1,144 @@
+"""
+Счетчики статистики участников.
+
+Считать участников по городам, интересам и мероприятиям запросом к users —
+значит читать всю таблицу на каждый просмотр. Вместо этого счетчики лежат в
+user_stats и меняются триггерами SQLite на users: любая запись анкеты (через
+репозиторий, очередь группового коммита или миграцию) меняет счетчики в той же
+транзакции, поэтому они не расходятся с таблицей даже при сбое посреди пачки.
+
+Счетчики (kind, name):
+  * users / total, users / complete — все пользователи и заполненные анкеты;
+  * option / <callback_data> — по каждому интересу и типу мероприятий;
+  * city / <город> — по городам (нулевые строки удаляются).
+
+Триггеры генерируются из справочников вариантов, поэтому при изменении
+INTERESTS / EVENTS достаточно поднять DB_VERSION — install_user_stats
+пересоздаст их и пересчитает счетчики.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+from options import EVENTS, INTERESTS
+
+from .engine import engine
+
+# Анкета заполнена: пройдены все обязательные шаги регистрации («О себе» — нет)
+COMPLETE_PROFILE = (
+    "{row}.first_name IS NOT NULL AND {row}.city IS NOT NULL "
+    "AND {row}.interests_mask != 0 AND {row}.events_mask != 0"
+)
+
+# Колонка-маска и справочник ее вариантов
+MASK_COLUMNS = (("interests_mask", INTERESTS), ("events_mask", EVENTS))
+
+TRIGGER_NAMES = ("user_stats_insert", "user_stats_update", "user_stats_delete")
+
+
+def _option_bits():
+    """(колонка, callback_data, бит) по всем вариантам"""
+    for column, options in MASK_COLUMNS:
+        for callback_data, bit in options.bits.items():
+            yield column, callback_data, bit
+
+
+def _apply_sql(row: str, sign: str) -> list[str]:
+    """
+    Операторы, добавляющие строку users в счетчики (sign = "+") или убирающие ее ("-").
+
+    row — NEW или OLD внутри триггера.
+    """
+    complete = COMPLETE_PROFILE.format(row=row)
+    options = " ".join(
+        f"WHEN '{callback_data}' THEN (({row}.{column} & {bit}) != 0)"
+        for column, callback_data, bit in _option_bits()
+    )
+    statements = [
+        f"UPDATE user_stats SET count = count {sign} CASE name "
+        f"WHEN 'total' THEN 1 WHEN 'complete' THEN ({complete}) END "
+        "WHERE kind = 'users'",
+        f"UPDATE user_stats SET count = count {sign} CASE name {options} ELSE 0 END "
+        f"WHERE kind = 'option' AND ({row}.interests_mask != 0 OR {row}.events_mask != 0)",
+    ]
+    if sign == "+":
+        statements.append(
+            "INSERT OR IGNORE INTO user_stats (kind, name, count) "
+            f"SELECT 'city', {row}.city, 0 WHERE {row}.city IS NOT NULL"
+        )
+    statements.append(
+        f"UPDATE user_stats SET count = count {sign} 1 "
+        f"WHERE kind = 'city' AND name = {row}.city"
+    )
+    return statements
+
+
+def _trigger_sql(name: str, event: str, body: list[str]) -> str:
+    statements = "".join(f"    {statement};\n" for statement in body)
+    return f"CREATE TRIGGER {name} AFTER {event} ON users BEGIN\n{statements}END"
+
+
+def trigger_statements() -> list[str]:
+    """DDL триггеров, поддерживающих счетчики"""
+    drop_empty_city = (
+        "DELETE FROM user_stats "
+        "WHERE kind = 'city' AND name = OLD.city AND count <= 0"
+    )
+    return [
+        _trigger_sql("user_stats_insert", "INSERT", _apply_sql("NEW", "+")),
+        # Только колонки, от которых зависят счетчики: смена username их не трогает
+        _trigger_sql(
+            "user_stats_update",
+            "UPDATE OF first_name, city, interests_mask, events_mask",
+            _apply_sql("OLD", "-") + _apply_sql("NEW", "+") + [drop_empty_city],
+        ),
+        _trigger_sql(
+            "user_stats_delete", "DELETE", _apply_sql("OLD", "-") + [drop_empty_city]
+        ),
+    ]
+
+
+def rebuild_statements() -> list[TextClause]:
+    """
+    Пересчет всех счетчиков по users (для сверки).
+
+    Выполнять в одной транзакции: между удалением и вставкой никто не пишет.
+    """
+    counters = [
+        "SELECT 'users', 'total', count(*) FROM users",
+        "SELECT 'users', 'complete', count(*) FROM users "
+        f"WHERE {COMPLETE_PROFILE.format(row='users')}",
+    ]
+    counters += [
+        f"SELECT 'option', '{callback_data}', count(*) FROM users "
+        f"WHERE ({column} & {bit}) != 0"
+        for column, callback_data, bit in _option_bits()
+    ]
+    return [
+        text("DELETE FROM user_stats"),
+        text(
+            "INSERT INTO user_stats (kind, name, count) "
+            + " UNION ALL ".join(counters)
+        ),
+        text(
+            "INSERT INTO user_stats (kind, name, count) "
+            "SELECT 'city', city, count(*) FROM users "
+            "WHERE city IS NOT NULL GROUP BY city"
+        ),
+    ]
+
+
+async def install_user_stats() -> None:
+    """
+    Пересоздать триггеры и пересчитать счетчики.
+
+    Одна транзакция: записи, пришедшие во время установки, ждут ее окончания
+    и попадают в счетчики уже через новые триггеры.
+    """
+    async with engine.begin() as conn:
+        for name in TRIGGER_NAMES:
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for statement in trigger_statements():
+            await conn.execute(text(statement))
+        for statement in rebuild_statements():
+            await conn.execute(statement)
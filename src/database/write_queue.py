@@ -0,0 +1,224 @@
+"""
+Очередь записей с групповым коммитом.
+
+SQLite допускает одного писателя, поэтому 120 одновременных регистраций дают
+120 транзакций, выстроенных в очередь за блокировкой. Здесь все записи идут через
+одну фоновую задачу, которая раз в несколько миллисекунд (или при наборе пачки)
+выполняет накопленные запросы в одной транзакции. Каждый вызывающий получает
+результат только после коммита своей пачки.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import nullcontext, suppress
+from typing import Any, Callable, ContextManager, Optional
+
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .engine import engine
+
+logger = logging.getLogger(__name__)
+
+# Запросы одного вызывающего и future для их результата
+_Item = tuple[tuple[Any, ...], asyncio.Future]
+
+
+def _is_busy(error: Exception) -> bool:
+    """БД заблокирована другим писателем (database is locked после busy_timeout)"""
+    message = str(error).lower()
+    return isinstance(error, OperationalError) and ("locked" in message or "busy" in message)
+
+
+class WriteQueue:
+    """Фоновый писатель, объединяющий записи в общие транзакции"""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            engine: Движок БД
+            max_batch: Максимум запросов в одной транзакции
+            max_delay: Сколько ждать добора пачки после первого запроса, сек
+            enabled: Если False, репозитории пишут напрямую через свою сессию
+        """
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.enabled = enabled
+        self.commits = 0
+        self.statements = 0
+        self._items: deque[_Item] = deque()
+        # Пачка, которая сейчас коммитится
+        self._batch: list[_Item] = []
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._has_items: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        # Хуки метрик и трассировки (подключает main через utils): сколько
+        # запросов поставлено и контекст вокруг ожидания коммита
+        self.on_submit: Optional[Callable[[int], None]] = None
+        self.wait_context: Callable[[int], ContextManager[Any]] = lambda count: nullcontext()
+
+    def _ensure_writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        if self._loop is not loop:
+            # Новый event loop (новый вызов функции) — очередь старого уже не нужна
+            self._loop = loop
+            self._items.clear()
+            self._has_items = asyncio.Event()
+            self._full = asyncio.Event()
+        self._task = loop.create_task(self._writer())
+
+    async def submit(self, stmt: Any) -> list[Row]:
+        """
+        Поставить запрос в очередь и дождаться коммита.
+
+        Returns:
+            Строки RETURNING (пустой список, если запрос ничего не возвращает)
+        """
+        (rows,) = await self.submit_many(stmt)
+        return rows
+
+    async def submit_many(self, *stmts: Any) -> list[list[Row]]:
+        """
+        Поставить несколько запросов, которые должны попасть в одну транзакцию.
+
+        Returns:
+            Строки RETURNING для каждого запроса
+        """
+        self._ensure_writer()
+        future = self._loop.create_future()
+        self._items.append((stmts, future))
+        self._has_items.set()
+        if len(self._items) >= self.max_batch:
+            self._full.set()
+        if self.on_submit is not None:
+            self.on_submit(len(stmts))
+        with self.wait_context(len(stmts)):
+            return await future
+
+    def depth(self) -> int:
+        """Число запросов, ожидающих записи"""
+        return len(self._items)
+
+    async def _writer(self) -> None:
+        while True:
+            await self._has_items.wait()
+            if len(self._items) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = []
+            while self._items and len(batch) < self.max_batch:
+                batch.append(self._items.popleft())
+            if len(self._items) < self.max_batch:
+                self._full.clear()
+            if not self._items:
+                self._has_items.clear()
+
+            self._batch = batch
+            try:
+                await self._commit(batch)
+            finally:
+                self._batch = []
+
+    async def close(self) -> None:
+        """Дождаться записи всего, что уже в очереди, и остановить писателя"""
+        if self._task is None or self._task.done():
+            return
+        futures = [future for _, future in (*self._batch, *self._items)]
+        if futures:
+            await asyncio.wait(futures)
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _commit(self, batch: list[_Item]) -> None:
+        busy_retries = 1
+        while True:
+            try:
+                results = await self._execute(batch)
+                break
+            except Exception as e:
+                if _is_busy(e) and busy_retries:
+                    # Блокировка не зависит от запросов пачки: повторять по
+                    # одному значило бы ждать busy_timeout на каждом
+                    busy_retries -= 1
+                    logger.warning(f"Database busy, retrying batch of {len(batch)} once: {e}")
+                    continue
+                if _is_busy(e) or len(batch) == 1:
+                    self._fail(batch, e)
+                    return
+                # Пачка откатилась из-за одного из запросов — повторяем по
+                # одному, чтобы его ошибка не задела остальных
+                logger.warning(f"Batch write failed, retrying one by one: {e}")
+                await self._commit_one_by_one(batch)
+                return
+        self._done(batch, results)
+
+    async def _commit_one_by_one(self, batch: list[_Item]) -> None:
+        for position, item in enumerate(batch):
+            try:
+                results = await self._execute([item])
+            except Exception as e:
+                if _is_busy(e):
+                    self._fail(batch[position:], e)
+                    return
+                self._fail([item], e)
+                continue
+            self._done([item], results)
+
+    async def _execute(self, batch: list[_Item]) -> list[list[list[Row]]]:
+        """Выполнить пачку одной транзакцией"""
+        async with self.engine.begin() as conn:
+            results = []
+            for stmts, _ in batch:
+                item_results = []
+                for stmt in stmts:
+                    result = await conn.execute(stmt)
+                    item_results.append(result.all() if result.returns_rows else [])
+                results.append(item_results)
+        return results
+
+    def _done(self, batch: list[_Item], results: list[list[list[Row]]]) -> None:
+        self.commits += 1
+        self.statements += sum(len(stmts) for stmts, _ in batch)
+        for (_, future), rows in zip(batch, results):
+            if not future.done():
+                future.set_result(rows)
+
+    @staticmethod
+    def _fail(batch: list[_Item], error: Exception) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики коммитов и запросов"""
+        return {
+            "commits": self.commits,
+            "statements": self.statements,
+            "depth": self.depth(),
+        }
+
+
+write_queue = WriteQueue(
+    engine,
+    max_batch=int(os.getenv("WRITE_BATCH_SIZE", "64")),
+    max_delay=float(os.getenv("WRITE_BATCH_DELAY_MS", "5")) / 1000,
+    enabled=os.getenv("WRITE_QUEUE", "1") == "1",
+)
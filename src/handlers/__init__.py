@@ -1,5 +1,5 @@
 from aiogram import Router
-from . import registration, admin
+from . import registration, admin, admin_chats, matching, export
 
 # Создаем главный роутер handlers
 router = Router()
@@ -8,3 +8,6 @@ router = Router()
 # Старый start.py удалить или не подключать
 router.include_router(registration.registration_router)
 router.include_router(admin.admin_router)
+router.include_router(admin_chats.admin_chats_router)
+router.include_router(matching.matching_router)
+router.include_router(export.export_router)
@@ -1,17 +1,39 @@
-from aiogram import Router, F
+import asyncio
+import html
+from typing import Optional
+
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 
 from config import settings
 from states.admin import AdminStates
-from database import async_session_maker, TextTemplateRepository
+from database import (
+    async_session_maker,
+    Broadcast,
+    BroadcastRepository,
+    TextTemplateRepository,
+    UserStatsRepository,
+)
 from database.init_texts import TEXT_KEYS, init_default_texts
+from options import EVENTS, INTERESTS
+from utils.text_templates import (
+    template_cache,
+    get_template_cache_stats,
+    validate_template_placeholders,
+)
+from utils.validators import ValidationError
+from utils.rate_limiter import send_limiter
+from utils.broadcast import BROADCAST_TEMPLATE_KEY, broadcast_runner
 from keyboards.admin import (
     get_admin_main_keyboard,
     get_text_list_keyboard,
     get_text_edit_keyboard,
     get_cancel_keyboard,
+    get_broadcast_keyboard,
+    get_stats_keyboard,
 )
 
 admin_router = Router()
@@ -37,6 +59,214 @@ async def cmd_admin(message: Message, state: FSMContext):
     )
 
 
+@admin_router.message(Command("cache_stats"))
+async def cmd_cache_stats(message: Message):
+    """Статистика кэша текстовых шаблонов"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+
+    stats = get_template_cache_stats()
+    await message.answer(
+        "🗂 <b>Кэш текстов</b>\n\n"
+        f"Попадания: {stats['hits']}\n"
+        f"Промахи: {stats['misses']}\n"
+        f"Загрузки из БД: {stats['reloads']}\n"
+        f"Версия: {stats['version']}\n"
+        f"Шаблонов в кэше: {stats['size']}",
+        parse_mode="HTML",
+    )
+
+
+@admin_router.message(Command("send_stats"))
+async def cmd_send_stats(message: Message):
+    """Статистика очереди отправки сообщений"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+
+    stats = send_limiter.stats()
+    await message.answer(
+        "📤 <b>Отправка сообщений</b>\n\n"
+        f"Ожидают отправки: {stats['waiting']}\n"
+        f"Отложено всего: {stats['waits']}\n"
+        f"Суммарное ожидание: {stats['wait_time']} с\n"
+        f"Максимальное ожидание: {stats['max_wait']} с\n"
+        f"Повторы после 429: {stats['retries']}",
+        parse_mode="HTML",
+    )
+
+
+# Сколько городов показывать в статистике
+STATS_TOP_CITIES = 10
+
+
+def _stats_text(summary: dict) -> str:
+    """Текст экрана статистики участников"""
+    lines = [
+        "📊 <b>Статистика участников</b>\n",
+        f"Всего зарегистрировано: {summary['total']}",
+        f"Анкета заполнена: {summary['complete']}",
+        f"Не завершили регистрацию: {summary['partial']}",
+    ]
+    for title, options in (("💡 <b>Интересы</b>", INTERESTS), ("🎪 <b>Мероприятия</b>", EVENTS)):
+        lines.append(f"\n{title}")
+        for option in options.options:
+            lines.append(f"{option.label}: {summary['options'].get(option.callback_data, 0)}")
+
+    lines.append("\n🏙 <b>Города</b>")
+    if summary["cities"]:
+        for city, count in summary["cities"]:
+            lines.append(f"{html.escape(city)}: {count}")
+    else:
+        lines.append("—")
+    return "\n".join(lines)
+
+
+async def _show_stats(message: Message, edit: bool = True) -> None:
+    """Экран статистики по счетчикам"""
+    async with async_session_maker() as session:
+        summary = await UserStatsRepository(session).get_summary(STATS_TOP_CITIES)
+
+    text = _stats_text(summary)
+    if not edit:
+        await message.answer(text, reply_markup=get_stats_keyboard(), parse_mode="HTML")
+        return
+    try:
+        await message.edit_text(text, reply_markup=get_stats_keyboard(), parse_mode="HTML")
+    except TelegramBadRequest:
+        # Цифры не изменились с прошлого обновления
+        pass
+
+
+@admin_router.message(Command("stats"))
+async def cmd_stats(message: Message, state: FSMContext):
+    """Статистика участников"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+
+    await state.set_state(AdminStates.main_menu)
+    await _show_stats(message, edit=False)
+
+
+@admin_router.callback_query(
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text),
+    F.data == "admin_stats",
+)
+async def show_stats(callback: CallbackQuery):
+    """Экран статистики участников"""
+    await callback.answer()  # КРИТИЧНО!
+    await _show_stats(callback.message)
+
+
+@admin_router.callback_query(
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text),
+    F.data == "admin_stats_rebuild",
+)
+async def rebuild_stats(callback: CallbackQuery):
+    """Пересчитать счетчики по таблице пользователей"""
+    # Ответ на callback — сразу, а результат виден по обновленному экрану
+    await callback.answer("Пересчитываю…")
+    async with async_session_maker() as session:
+        await UserStatsRepository(session).rebuild()
+    await _show_stats(callback.message)
+
+
+# Как часто обновлять сообщение с прогрессом рассылки, сек
+BROADCAST_PROGRESS_INTERVAL = 5
+
+# Ссылки на фоновые задачи прогресса, чтобы их не собрал GC
+_progress_tasks: set[asyncio.Task] = set()
+
+
+def _broadcast_status_text(broadcast: Optional[Broadcast]) -> str:
+    """Текст экрана рассылки"""
+    if broadcast is None:
+        return (
+            "📣 <b>Рассылка приглашения</b>\n\n"
+            "Рассылок еще не было. Сообщение «event_invitation» получат все "
+            "пользователи из базы."
+        )
+
+    pending = max(broadcast.total - broadcast.sent - broadcast.failed, 0)
+    if broadcast_runner.running and broadcast_runner.broadcast_id == broadcast.id:
+        status = f"идет, {broadcast_runner.throughput():.1f} сообщ./с"
+    elif broadcast.status == "done":
+        status = "завершена"
+    else:
+        status = "приостановлена"
+
+    return (
+        f"📣 <b>Рассылка #{broadcast.id}</b>\n\n"
+        f"Статус: {status}\n"
+        f"Доставлено: {broadcast.sent}\n"
+        f"Ошибок: {broadcast.failed}\n"
+        f"Осталось: {pending} из {broadcast.total}"
+    )
+
+
+async def _show_broadcast_status(message: Message) -> None:
+    """Перерисовать экран рассылки по данным из БД"""
+    async with async_session_maker() as session:
+        broadcast = await BroadcastRepository(session).get_latest()
+
+    resumable = broadcast is not None and broadcast.status == "running"
+    try:
+        await message.edit_text(
+            _broadcast_status_text(broadcast),
+            reply_markup=get_broadcast_keyboard(broadcast_runner.running, resumable),
+            parse_mode="HTML",
+        )
+    except TelegramBadRequest:
+        # Текст не изменился с прошлого обновления
+        pass
+
+
+async def _report_broadcast_progress(message: Message, task: asyncio.Task) -> None:
+    """Обновлять прогресс рассылки, пока она идет"""
+    while not task.done():
+        await asyncio.wait({task}, timeout=BROADCAST_PROGRESS_INTERVAL)
+        await _show_broadcast_status(message)
+
+
+@admin_router.callback_query(
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text),
+    F.data == "admin_broadcast",
+)
+async def show_broadcast(callback: CallbackQuery):
+    """Экран рассылки приглашения"""
+    await callback.answer()  # КРИТИЧНО!
+    await _show_broadcast_status(callback.message)
+
+
+@admin_router.callback_query(
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text),
+    F.data == "admin_broadcast_start",
+)
+async def start_broadcast(callback: CallbackQuery, bot: Bot):
+    """Начать новую рассылку или продолжить незавершенную"""
+    await callback.answer()  # КРИТИЧНО!
+
+    if broadcast_runner.running:
+        await _show_broadcast_status(callback.message)
+        return
+
+    async with async_session_maker() as session:
+        repo = BroadcastRepository(session)
+        broadcast = await repo.get_active() or await repo.create(BROADCAST_TEMPLATE_KEY)
+
+    task = broadcast_runner.start(bot, broadcast.id, settings.BROADCAST_TIME_BUDGET)
+    progress = _report_broadcast_progress(callback.message, task)
+    if settings.BROADCAST_TIME_BUDGET > 0:
+        # Cloud Functions: работаем в пределах вызова, остаток — следующим нажатием
+        await progress
+    else:
+        progress_task = asyncio.create_task(progress)
+        _progress_tasks.add(progress_task)
+        progress_task.add_done_callback(_progress_tasks.discard)
+
+
 @admin_router.callback_query(
     StateFilter(AdminStates.main_menu, AdminStates.editing_text),
     F.data == "admin_close",
@@ -49,7 +279,7 @@ async def close_admin(callback: CallbackQuery, state: FSMContext):
 
 
 @admin_router.callback_query(
-    StateFilter(AdminStates.main_menu, AdminStates.editing_text),
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text, AdminStates.editing_chat),
     F.data == "admin_back_to_main",
 )
 async def back_to_main(callback: CallbackQuery, state: FSMContext):
@@ -274,15 +504,30 @@ async def save_new_content(message: Message, state: FSMContext):
 
     new_content = message.text
 
+    # Проверяем подстановки сразу, чтобы ошибка не дошла до пользователей
+    try:
+        validate_template_placeholders(key, new_content)
+    except ValidationError as e:
+        await message.answer(
+            f"{e}\n\nОтправьте исправленный текст или нажмите «Отменить».",
+            reply_markup=get_cancel_keyboard(),
+        )
+        return
+
     async with async_session_maker() as session:
         repo = TextTemplateRepository(session)
         template = await repo.get_by_key(key)
         if template:
-            await repo.create_or_update(key, title, new_content, template.description)
+            saved = await repo.create_or_update(
+                key, title, new_content, template.description
+            )
         else:
             # Если шаблона нет, создаем его
             description = TEXT_KEYS.get(key, ("", ""))[1]
-            await repo.create_or_update(key, title, new_content, description)
+            saved = await repo.create_or_update(key, title, new_content, description)
+
+    # Обновляем кэш шаблонов, чтобы пользователи сразу увидели новый текст
+    template_cache.put(saved.key, saved.content, saved.updated_at)
 
     await state.set_state(AdminStates.editing_text)
     await message.answer(
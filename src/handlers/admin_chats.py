@@ -0,0 +1,262 @@
+import html
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery, LinkPreviewOptions
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+
+from states.admin import AdminStates
+from database import async_session_maker, ChatRepository
+from options import EVENTS, INTERESTS
+from utils.chat_recommendations import chat_recommendations
+from keyboards.admin import (
+    get_cancel_keyboard,
+    get_chat_list_keyboard,
+    get_chat_edit_keyboard,
+    get_chat_options_keyboard,
+)
+
+admin_chats_router = Router()
+
+CHAT_TITLE_MAX_LENGTH = 100
+CHAT_URL_MAX_LENGTH = 255
+NO_PREVIEW = LinkPreviewOptions(is_disabled=True)
+
+
+async def _show_chat_list(message: Message, edit: bool = True) -> None:
+    """Список рекомендуемых чатов"""
+    async with async_session_maker() as session:
+        chats = await ChatRepository(session).get_all()
+
+    text = (
+        "💬 <b>Рекомендуемые чаты</b>\n\n"
+        "Чаты показываются после регистрации по выбранным интересам и типам "
+        "мероприятий. Выберите чат для редактирования:"
+    )
+    keyboard = get_chat_list_keyboard([(chat.id, chat.title) for chat in chats])
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+async def _show_chat(message: Message, chat_id: int, edit: bool = True) -> None:
+    """Карточка чата с привязками"""
+    async with async_session_maker() as session:
+        repo = ChatRepository(session)
+        chat = await repo.get(chat_id)
+        options = await repo.get_options(chat_id)
+
+    if not chat:
+        await _show_chat_list(message, edit)
+        return
+
+    interests = INTERESTS.names_str(INTERESTS.mask(options)) or "—"
+    events = EVENTS.names_str(EVENTS.mask(options)) or "—"
+    text = (
+        f"💬 <b>{html.escape(chat.title)}</b>\n\n"
+        f"🔗 {html.escape(chat.url)}\n\n"
+        f"💡 <b>Интересы:</b> {interests}\n"
+        f"🎪 <b>Мероприятия:</b> {events}"
+    )
+    keyboard = get_chat_edit_keyboard(chat_id)
+    if edit:
+        await message.edit_text(
+            text, reply_markup=keyboard, parse_mode="HTML", link_preview_options=NO_PREVIEW
+        )
+    else:
+        await message.answer(
+            text, reply_markup=keyboard, parse_mode="HTML", link_preview_options=NO_PREVIEW
+        )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.main_menu, AdminStates.editing_text, AdminStates.editing_chat),
+    F.data == "admin_chats",
+)
+async def show_chat_list(callback: CallbackQuery, state: FSMContext):
+    """Список рекомендуемых чатов"""
+    await callback.answer()  # КРИТИЧНО!
+    await state.set_state(AdminStates.editing_chat)
+    await _show_chat_list(callback.message)
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_open_")
+)
+async def show_chat(callback: CallbackQuery):
+    """Карточка чата"""
+    await callback.answer()  # КРИТИЧНО!
+    chat_id = int(callback.data.replace("admin_chat_open_", ""))
+    await _show_chat(callback.message, chat_id)
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_tags_")
+)
+async def show_chat_options(callback: CallbackQuery):
+    """Выбор интересов и мероприятий, для которых рекомендуется чат"""
+    await callback.answer()  # КРИТИЧНО!
+    chat_id = int(callback.data.replace("admin_chat_tags_", ""))
+
+    async with async_session_maker() as session:
+        options = await ChatRepository(session).get_options(chat_id)
+
+    await callback.message.edit_text(
+        "🏷 <b>Для каких интересов и мероприятий рекомендовать чат?</b>",
+        reply_markup=get_chat_options_keyboard(chat_id, frozenset(options)),
+        parse_mode="HTML",
+    )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_tag_")
+)
+async def toggle_chat_option(callback: CallbackQuery):
+    """Привязать чат к варианту или отвязать"""
+    await callback.answer()  # КРИТИЧНО!
+    chat_id, option = callback.data.replace("admin_chat_tag_", "").split("_", 1)
+    chat_id = int(chat_id)
+    if option not in INTERESTS.bits and option not in EVENTS.bits:
+        return
+
+    async with async_session_maker() as session:
+        repo = ChatRepository(session)
+        await repo.toggle_mapping(chat_id, option)
+        options = await repo.get_options(chat_id)
+    await chat_recommendations.load()
+
+    await callback.message.edit_reply_markup(
+        reply_markup=get_chat_options_keyboard(chat_id, frozenset(options))
+    )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_del_")
+)
+async def delete_chat(callback: CallbackQuery):
+    """Удаление чата"""
+    await callback.answer("Чат удален")
+    chat_id = int(callback.data.replace("admin_chat_del_", ""))
+
+    async with async_session_maker() as session:
+        await ChatRepository(session).delete(chat_id)
+    await chat_recommendations.load()
+
+    await _show_chat_list(callback.message)
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data == "admin_chat_add"
+)
+async def add_chat(callback: CallbackQuery, state: FSMContext):
+    """Добавление чата: сначала название"""
+    await callback.answer()  # КРИТИЧНО!
+    await state.set_state(AdminStates.waiting_for_chat_title)
+    await state.update_data(chat_id=None)
+    await callback.message.edit_text(
+        "➕ <b>Новый чат</b>\n\n📝 Отправьте название чата:",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML",
+    )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_title_")
+)
+async def edit_chat_title(callback: CallbackQuery, state: FSMContext):
+    """Изменение названия чата"""
+    await callback.answer()  # КРИТИЧНО!
+    chat_id = int(callback.data.replace("admin_chat_title_", ""))
+    await state.set_state(AdminStates.waiting_for_chat_title)
+    await state.update_data(chat_id=chat_id)
+    await callback.message.edit_text(
+        "📝 Отправьте новое название чата:",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML",
+    )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.editing_chat), F.data.startswith("admin_chat_url_")
+)
+async def edit_chat_url(callback: CallbackQuery, state: FSMContext):
+    """Изменение ссылки на чат"""
+    await callback.answer()  # КРИТИЧНО!
+    chat_id = int(callback.data.replace("admin_chat_url_", ""))
+    await state.set_state(AdminStates.waiting_for_chat_url)
+    await state.update_data(chat_id=chat_id)
+    await callback.message.edit_text(
+        "🔗 Отправьте новую ссылку на чат (https://t.me/...):",
+        reply_markup=get_cancel_keyboard(),
+        parse_mode="HTML",
+    )
+
+
+@admin_chats_router.callback_query(
+    StateFilter(AdminStates.waiting_for_chat_title, AdminStates.waiting_for_chat_url),
+    F.data == "admin_cancel_edit",
+)
+async def cancel_chat_edit(callback: CallbackQuery, state: FSMContext):
+    """Отмена правки чата"""
+    await callback.answer()  # КРИТИЧНО!
+    await state.set_state(AdminStates.editing_chat)
+    await _show_chat_list(callback.message)
+
+
+@admin_chats_router.message(StateFilter(AdminStates.waiting_for_chat_title))
+async def save_chat_title(message: Message, state: FSMContext):
+    """Сохранение названия (или переход к ссылке для нового чата)"""
+    title = (message.text or "").strip()
+    if not title or len(title) > CHAT_TITLE_MAX_LENGTH:
+        await message.answer(
+            f"❌ Название должно быть от 1 до {CHAT_TITLE_MAX_LENGTH} символов.",
+            reply_markup=get_cancel_keyboard(),
+        )
+        return
+
+    data = await state.get_data()
+    chat_id = data.get("chat_id")
+    if chat_id is None:
+        await state.update_data(new_chat_title=title)
+        await state.set_state(AdminStates.waiting_for_chat_url)
+        await message.answer(
+            "🔗 Отправьте ссылку на чат (https://t.me/...):",
+            reply_markup=get_cancel_keyboard(),
+        )
+        return
+
+    async with async_session_maker() as session:
+        await ChatRepository(session).update(chat_id, title=title)
+    await chat_recommendations.load()
+
+    await state.set_state(AdminStates.editing_chat)
+    await message.answer("✅ Название сохранено.")
+    await _show_chat(message, chat_id, edit=False)
+
+
+@admin_chats_router.message(StateFilter(AdminStates.waiting_for_chat_url))
+async def save_chat_url(message: Message, state: FSMContext):
+    """Сохранение ссылки (и создание нового чата)"""
+    url = (message.text or "").strip()
+    if not url.startswith(("https://", "http://")) or len(url) > CHAT_URL_MAX_LENGTH:
+        await message.answer(
+            "❌ Отправьте ссылку, начинающуюся с https://",
+            reply_markup=get_cancel_keyboard(),
+        )
+        return
+
+    data = await state.get_data()
+    chat_id = data.get("chat_id")
+    async with async_session_maker() as session:
+        repo = ChatRepository(session)
+        if chat_id is None:
+            chat = await repo.create(data["new_chat_title"], url)
+            chat_id = chat.id
+        else:
+            await repo.update(chat_id, url=url)
+    await chat_recommendations.load()
+
+    await state.set_state(AdminStates.editing_chat)
+    await message.answer("✅ Ссылка сохранена.")
+    await _show_chat(message, chat_id, edit=False)
@@ -0,0 +1,46 @@
+import html
+import os
+from datetime import datetime
+
+from aiogram import Router
+from aiogram.types import Message, FSInputFile
+from aiogram.filters import Command, CommandObject
+
+from handlers.admin import is_admin
+from utils.export import EXPORT_COLUMNS, export_users, parse_export_args
+from utils.validators import ValidationError
+
+export_router = Router()
+
+EXPORT_USAGE = (
+    "📤 <b>Выгрузка участников</b>\n\n"
+    "<code>/export [csv|xlsx] [complete] [city=Город] [columns=...]</code>\n\n"
+    "• <code>complete</code> — только заполненные анкеты\n"
+    "• <code>city=Москва</code> — только из города\n"
+    f"• <code>columns=</code> — через запятую из: {', '.join(EXPORT_COLUMNS)}"
+)
+
+
+@export_router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Выгрузка пользователей в CSV / XLSX (для админа)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+
+    try:
+        request = parse_export_args(command.args)
+    except ValidationError as e:
+        await message.answer(f"{html.escape(str(e))}\n\n{EXPORT_USAGE}", parse_mode="HTML")
+        return
+
+    await message.answer("⏳ Готовлю выгрузку...")
+    path, count = await export_users(request)
+    try:
+        filename = f"users_{datetime.now():%Y%m%d_%H%M}.{request.format}"
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📤 Участников в выгрузке: {count}",
+        )
+    finally:
+        os.unlink(path)
@@ -0,0 +1,100 @@
+import csv
+import html
+import io
+
+from aiogram import Router
+from aiogram.types import Message, BufferedInputFile
+from aiogram.filters import Command
+
+from database import async_session_maker, UserRepository
+from handlers.admin import is_admin
+from options import INTERESTS
+from utils.matchmaking import compute_introductions, get_match_index
+
+matching_router = Router()
+
+# Сколько собеседников показывать по /match
+MATCH_TOP_K = 5
+
+
+def _display_name(user) -> str:
+    name = " ".join(filter(None, (user.first_name, user.last_name)))
+    return f"{name} (@{user.username})" if user.username else name
+
+
+@matching_router.message(Command("match"))
+async def cmd_match(message: Message):
+    """Подбор собеседников по интересам и описанию «О себе»"""
+    user_id = message.from_user.id
+
+    index = await get_match_index()
+    matches = index.top_k(user_id, MATCH_TOP_K)
+    if not matches:
+        async with async_session_maker() as session:
+            user = await UserRepository(session).get_by_id(user_id)
+        if not user or not user.first_name:
+            await message.answer(
+                "❌ Профиль не заполнен.\nИспользуйте /start для регистрации."
+            )
+        else:
+            await message.answer(
+                "Пока не нашлось подходящих собеседников. Загляните позже!"
+            )
+        return
+
+    async with async_session_maker() as session:
+        repo = UserRepository(session)
+        users = await repo.get_by_ids([user_id] + [partner for partner, _ in matches])
+
+    me = users.get(user_id)
+    lines = ["🤝 <b>Вам может быть интересно познакомиться:</b>\n"]
+    for partner_id, score in matches:
+        partner = users.get(partner_id)
+        if partner is None:
+            continue
+        line = f"• {html.escape(_display_name(partner))} — {round(score * 100)}%"
+        if me is not None:
+            common = partner.interests_mask & me.interests_mask
+            if common:
+                line += f"\n  💡 {INTERESTS.names_str(common)}"
+        lines.append(line)
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@matching_router.message(Command("match_pairs"))
+async def cmd_match_pairs(message: Message):
+    """Пары для знакомства на мероприятии по всем участникам (CSV для админа)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к админ-панели.")
+        return
+
+    await message.answer("⏳ Подбираю пары по всем анкетам...")
+    pairs, unpaired = await compute_introductions()
+
+    async with async_session_maker() as session:
+        repo = UserRepository(session)
+        user_ids = [user for a, b, _ in pairs for user in (a, b)] + unpaired
+        users = await repo.get_by_ids(user_ids)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["user_a", "name_a", "user_b", "name_b", "score"])
+    for user_a, user_b, score in pairs:
+        writer.writerow(
+            [
+                user_a,
+                _display_name(users[user_a]) if user_a in users else "",
+                user_b,
+                _display_name(users[user_b]) if user_b in users else "",
+                f"{score:.3f}",
+            ]
+        )
+    for user_id in unpaired:
+        name = _display_name(users[user_id]) if user_id in users else ""
+        writer.writerow([user_id, name, "", "", ""])
+
+    await message.answer_document(
+        BufferedInputFile(buffer.getvalue().encode("utf-8-sig"), "match_pairs.csv"),
+        caption=f"🤝 Пар: {len(pairs)}, без пары: {len(unpaired)}",
+    )
@@ -1,10 +1,11 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, LinkPreviewOptions
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 
 from states.registration import RegistrationStates
 from database import async_session_maker, UserRepository
+from options import EVENTS, INTERESTS, OptionSet
 from keyboards.registration import (
     get_interests_keyboard,
     get_events_keyboard,
@@ -19,8 +20,11 @@ from utils.validators import (
     validate_city,
     validate_about,
     ValidationError,
-    get_interest_names,
-    get_event_names,
+)
+from utils.matchmaking import profile_changed
+from utils.chat_recommendations import (
+    RECOMMENDATIONS_SEND_KWARGS,
+    chat_recommendations,
 )
 
 # 🔴 КРИТИЧЕСКИЙ ИМПОРТ!
@@ -28,79 +32,6 @@ from utils.text_templates import get_text_template
 
 registration_router = Router()
 
-# Карта доступных чатов и их ссылок
-CHAT_LINKS = {
-    "investments": (
-        "Клуб биржевых инвестиций",
-        "https://t.me/+hDOyTja5fJxjNTM6",
-    ),
-    "management": (
-        "Менеджмент новой реальности!",
-        "https://t.me/+3vE_6_mHzeA5NzY6",
-    ),
-    "marketing": (
-        "Маркетинг и креатив в бизнесе",
-        "https://t.me/+IHrqutbfD-kyOTQ6",
-    ),
-}
-
-# Соответствие выбранных сфер интересов рекомендуемым чатам
-INTEREST_CHAT_MAP = {
-    "interest_investments": ["investments"],
-    "interest_career": ["management"],
-    "interest_business": ["management"],
-    "interest_economy": ["investments"],
-    "interest_marketing": ["marketing"],
-    "interest_art": ["marketing"],
-    "interest_sport": [],
-}
-
-# Соответствие выбранных типов мероприятий рекомендуемым чатам
-EVENT_CHAT_MAP = {
-    "event_business": ["management"],
-    "event_educational": [],
-    "event_sport": [],
-    "event_cultural": ["marketing"],
-    "event_gastronomic": [],
-}
-
-
-def _build_chat_recommendations(
-    selected_interests: list[str] | None, selected_events: list[str] | None
-) -> tuple[str, dict] | None:
-    """
-    Подбор списка чатов по выбранным интересам и типам мероприятий.
-    Возвращает (HTML-текст, параметры) или None.
-    """
-    selected_interests = selected_interests or []
-    selected_events = selected_events or []
-
-    ordered_chats: list[str] = []
-    seen = set()
-
-    def _append_chats(keys: list[str]):
-        for chat_key in keys:
-            if chat_key not in seen:
-                ordered_chats.append(chat_key)
-                seen.add(chat_key)
-
-    for interest in selected_interests:
-        _append_chats(INTEREST_CHAT_MAP.get(interest, []))
-
-    for event in selected_events:
-        _append_chats(EVENT_CHAT_MAP.get(event, []))
-
-    if not ordered_chats:
-        return None
-
-    lines = ["📌 Рекомендуем Вам присоединиться к следующим сообществам:"]
-    for chat_key in ordered_chats:
-        title, url = CHAT_LINKS[chat_key]
-        lines.append(f'• <a href="{url}">{title}</a>')
-
-    text = "\n".join(lines)
-    return text, {"link_preview_options": LinkPreviewOptions(is_disabled=True)}
-
 
 @registration_router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
@@ -143,15 +74,13 @@ async def cmd_restart(message: Message, state: FSMContext):
     # Очищаем состояние FSM
     await state.clear()
 
-    # Сбрасываем профиль пользователя в БД
+    # Сбрасываем профиль пользователя в БД (создаем, если его еще нет)
     async with async_session_maker() as session:
         repo = UserRepository(session)
-        # Создаем пользователя, если его еще нет
-        user, _ = await repo.get_or_create(
+        user = await repo.create_or_reset(
             user_id=user_id, username=username, first_name_tg=first_name_tg
         )
-        # Сбрасываем профиль
-        await repo.reset_profile(user_id)
+    profile_changed(user)
 
     # Начинаем регистрацию заново
     welcome_text = await get_text_template("welcome_new", first_name=first_name_tg)
@@ -228,7 +157,7 @@ async def process_city(message: Message, state: FSMContext):
         )
         await state.set_state(RegistrationStates.waiting_for_interests)
         # Инициализируем список выбранных интересов
-        await state.update_data(selected_interests=[])
+        await state.update_data(interests_mask=0)
 
     except ValidationError as e:
         await message.answer(str(e), parse_mode="HTML")
@@ -242,19 +171,16 @@ async def process_interest_selection(callback: CallbackQuery, state: FSMContext)
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_interests", [])
 
     # Переключаем выбор
-    if callback.data in selected:
-        selected.remove(callback.data)
-    else:
-        selected.append(callback.data)
-
-    await state.update_data(selected_interests=selected)
+    mask = INTERESTS.toggle(
+        _selection_mask(data, INTERESTS, "interests"), callback.data
+    )
+    await state.update_data(interests_mask=mask)
 
     # Обновляем клавиатуру
     await callback.message.edit_reply_markup(
-        reply_markup=update_interests_keyboard(selected)
+        reply_markup=update_interests_keyboard(mask)
     )
 
 
@@ -266,19 +192,14 @@ async def confirm_interests(callback: CallbackQuery, state: FSMContext):
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_interests", [])
+    mask = _selection_mask(data, INTERESTS, "interests")
 
-    if not selected:
+    if not mask:
         await callback.answer("❌ Выберите хотя бы один интерес!", show_alert=True)
         return
 
     # Получаем названия интересов
-    interest_names = get_interest_names()
-    selected_names = [interest_names[i] for i in selected]
-    interests_str = ", ".join(selected_names)
-
-    # Сохраняем в БД формат: через запятую
-    await state.update_data(interests=interests_str)
+    interests_str = INTERESTS.names_str(mask)
 
     # Переходим к выбору типов мероприятий
     await callback.message.edit_text(
@@ -292,7 +213,7 @@ async def confirm_interests(callback: CallbackQuery, state: FSMContext):
         parse_mode="HTML",
     )
     await state.set_state(RegistrationStates.waiting_for_events)
-    await state.update_data(selected_events=[])
+    await state.update_data(events_mask=0)
 
 
 @registration_router.callback_query(
@@ -303,19 +224,14 @@ async def process_event_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_events", [])
 
     # Переключаем выбор
-    if callback.data in selected:
-        selected.remove(callback.data)
-    else:
-        selected.append(callback.data)
-
-    await state.update_data(selected_events=selected)
+    mask = EVENTS.toggle(_selection_mask(data, EVENTS, "events"), callback.data)
+    await state.update_data(events_mask=mask)
 
     # Обновляем клавиатуру
     await callback.message.edit_reply_markup(
-        reply_markup=update_events_keyboard(selected)
+        reply_markup=update_events_keyboard(mask)
     )
 
 
@@ -327,21 +243,16 @@ async def confirm_events(callback: CallbackQuery, state: FSMContext):
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_events", [])
+    mask = _selection_mask(data, EVENTS, "events")
 
-    if not selected:
+    if not mask:
         await callback.answer(
             "❌ Выберите хотя бы один тип мероприятий!", show_alert=True
         )
         return
 
     # Получаем названия типов мероприятий
-    event_names = get_event_names()
-    selected_names = [event_names[e] for e in selected]
-    events_str = ", ".join(selected_names)
-
-    # Сохраняем
-    await state.update_data(events=events_str)
+    events_str = EVENTS.names_str(mask)
 
     # Переходим к описанию о себе
     await callback.message.edit_text(
@@ -365,7 +276,7 @@ async def process_about(message: Message, state: FSMContext):
     try:
         about = validate_about(message.text)
         await state.update_data(about=about)
-        await finalize_registration(message, state)
+        await finalize_registration(message, state, message.from_user.id)
 
     except ValidationError as e:
         await message.answer(str(e), parse_mode="HTML")
@@ -386,7 +297,9 @@ async def skip_about(callback: CallbackQuery, state: FSMContext):
     if current_state == RegistrationStates.editing_about.state:
         async with async_session_maker() as session:
             repo = UserRepository(session)
-            await repo.update(user_id=callback.from_user.id, about=None)
+            user = await repo.update(user_id=callback.from_user.id, about=None)
+        if user:
+            profile_changed(user)
 
         await state.set_state(RegistrationStates.editing_menu)
         await callback.message.answer(
@@ -395,27 +308,49 @@ async def skip_about(callback: CallbackQuery, state: FSMContext):
             parse_mode="HTML",
         )
     else:
-        await finalize_registration(callback.message, state)
+        await finalize_registration(callback.message, state, callback.from_user.id)
 
 
-async def finalize_registration(message: Message, state: FSMContext):
-    """Завершение регистрации и сохранение в БД"""
+def _selection_mask(data: dict, options: OptionSet, field: str) -> int:
+    """
+    Маска выбора из данных FSM.
+
+    Регистрация, начатая до перехода на маски, хранит список callback_data
+    (selected_interests) или строку названий (interests).
+    """
+    mask = data.get(f"{field}_mask")
+    if mask is not None:
+        return mask
+    return options.mask(data.get(f"selected_{field}") or []) or options.mask_from_names(
+        data.get(field)
+    )
+
+
+async def finalize_registration(message: Message, state: FSMContext, user_id: int):
+    """
+    Завершение регистрации и сохранение в БД.
+
+    user_id передается явно: при пропуске «О себе» message — сообщение бота.
+    """
     data = await state.get_data()
-    user_id = message.from_user.id
+    interests_mask = _selection_mask(data, INTERESTS, "interests")
+    events_mask = _selection_mask(data, EVENTS, "events")
 
     # Сохраняем все данные в БД с обработкой ошибок
     try:
         async with async_session_maker() as session:
             repo = UserRepository(session)
-            await repo.update(
+            user = await repo.update(
                 user_id=user_id,
                 first_name=data["first_name"],
                 last_name=data["last_name"],
                 city=data["city"],
-                interests=data["interests"],
-                events=data["events"],
+                interests_mask=interests_mask,
+                events_mask=events_mask,
                 about=data.get("about"),
             )
+        if user:
+            profile_changed(user)
     except Exception as e:
         # Логируем ошибку и сообщаем пользователю
         import logging
@@ -435,13 +370,10 @@ async def finalize_registration(message: Message, state: FSMContext):
     )
     await message.answer(status_text, parse_mode="HTML")
 
-    # Формируем рекомендации чатов
-    recommendations = _build_chat_recommendations(
-        data.get("selected_interests"), data.get("selected_events")
-    )
+    # Рекомендации чатов — готовый блок из таблицы по маскам выбора
+    recommendations = await chat_recommendations.render(interests_mask, events_mask)
     if recommendations:
-        text, kwargs = recommendations
-        await message.answer(text, parse_mode="HTML", **kwargs)
+        await message.answer(recommendations, **RECOMMENDATIONS_SEND_KWARGS)
     else:
         await message.answer(
             "Пока нет готовых рекомендаций по выбранным интересам. "
@@ -478,12 +410,14 @@ async def cmd_profile(message: Message):
             return
 
         about_text = user.about or "Не указано"
+        interests_text = INTERESTS.names_str(user.interests_mask or 0) or "Не указаны"
+        events_text = EVENTS.names_str(user.events_mask or 0) or "Не указаны"
         profile_text = (
             "📋 <b>Ваш профиль:</b>\n\n"
             f"👤 <b>Имя:</b> {user.first_name} {user.last_name or ''}\n"
             f"🏙️ <b>Город:</b> {user.city or 'Не указан'}\n"
-            f"💡 <b>Интересы:</b> {user.interests or 'Не указаны'}\n"
-            f"🎪 <b>Мероприятия:</b> {user.events or 'Не указаны'}\n"
+            f"💡 <b>Интересы:</b> {interests_text}\n"
+            f"🎪 <b>Мероприятия:</b> {events_text}\n"
             f"📝 <b>О себе:</b> {about_text}"
         )
 
@@ -570,21 +504,6 @@ async def process_edit_city(message: Message, state: FSMContext):
         await message.answer(str(e), parse_mode="HTML")
 
 
-def _preselect_callbacks_from_names(
-    raw_values: str | None, mapping: dict[str, str]
-) -> list[str]:
-    """Восстановить callback_data по сохраненным названиям (строка через запятую)"""
-    if not raw_values:
-        return []
-    reverse = {name.lower(): key for key, name in mapping.items()}
-    selected = []
-    for item in raw_values.split(","):
-        name = item.strip().lower()
-        if name in reverse:
-            selected.append(reverse[name])
-    return selected
-
-
 @registration_router.callback_query(
     RegistrationStates.editing_menu, F.data == "edit_interests"
 )
@@ -596,17 +515,13 @@ async def edit_interests(callback: CallbackQuery, state: FSMContext):
         repo = UserRepository(session)
         user = await repo.get_by_id(user_id)
 
-    selected = (
-        _preselect_callbacks_from_names(user.interests, get_interest_names())
-        if user
-        else []
-    )
+    mask = user.interests_mask if user else 0
 
-    await state.update_data(selected_interests=selected)
+    await state.update_data(interests_mask=mask)
     await state.set_state(RegistrationStates.editing_interests)
     await callback.message.edit_text(
         "<b>Какими сферами вы интересуетесь?</b>\nВыберите один или несколько вариантов:",
-        reply_markup=update_interests_keyboard(selected),
+        reply_markup=update_interests_keyboard(mask),
         parse_mode="HTML",
     )
 
@@ -618,14 +533,12 @@ async def process_edit_interest_selection(callback: CallbackQuery, state: FSMCon
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_interests", [])
-    if callback.data in selected:
-        selected.remove(callback.data)
-    else:
-        selected.append(callback.data)
-    await state.update_data(selected_interests=selected)
+    mask = INTERESTS.toggle(
+        _selection_mask(data, INTERESTS, "interests"), callback.data
+    )
+    await state.update_data(interests_mask=mask)
     await callback.message.edit_reply_markup(
-        reply_markup=update_interests_keyboard(selected)
+        reply_markup=update_interests_keyboard(mask)
     )
 
 
@@ -636,18 +549,18 @@ async def confirm_edit_interests(callback: CallbackQuery, state: FSMContext):
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_interests", [])
-    if not selected:
+    mask = _selection_mask(data, INTERESTS, "interests")
+    if not mask:
         await callback.answer("❌ Выберите хотя бы один интерес!", show_alert=True)
         return
 
-    interest_names = get_interest_names()
-    selected_names = [interest_names[i] for i in selected]
-    interests_str = ", ".join(selected_names)
+    interests_str = INTERESTS.names_str(mask)
 
     async with async_session_maker() as session:
         repo = UserRepository(session)
-        await repo.update(user_id=callback.from_user.id, interests=interests_str)
+        user = await repo.update(user_id=callback.from_user.id, interests_mask=mask)
+    if user:
+        profile_changed(user)
 
     await callback.message.edit_text(
         f"✅ Интересы обновлены: <b>{interests_str}</b>", parse_mode="HTML"
@@ -669,15 +582,13 @@ async def edit_events(callback: CallbackQuery, state: FSMContext):
         repo = UserRepository(session)
         user = await repo.get_by_id(user_id)
 
-    selected = (
-        _preselect_callbacks_from_names(user.events, get_event_names()) if user else []
-    )
+    mask = user.events_mask if user else 0
 
-    await state.update_data(selected_events=selected)
+    await state.update_data(events_mask=mask)
     await state.set_state(RegistrationStates.editing_events)
     await callback.message.edit_text(
         "<b>Какие мероприятия Вам интересны?</b>\nВыберите один или несколько вариантов:",
-        reply_markup=update_events_keyboard(selected),
+        reply_markup=update_events_keyboard(mask),
         parse_mode="HTML",
     )
 
@@ -689,14 +600,10 @@ async def process_edit_event_selection(callback: CallbackQuery, state: FSMContex
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_events", [])
-    if callback.data in selected:
-        selected.remove(callback.data)
-    else:
-        selected.append(callback.data)
-    await state.update_data(selected_events=selected)
+    mask = EVENTS.toggle(_selection_mask(data, EVENTS, "events"), callback.data)
+    await state.update_data(events_mask=mask)
     await callback.message.edit_reply_markup(
-        reply_markup=update_events_keyboard(selected)
+        reply_markup=update_events_keyboard(mask)
     )
 
 
@@ -707,20 +614,20 @@ async def confirm_edit_events(callback: CallbackQuery, state: FSMContext):
     await callback.answer()  # ✅ КРИТИЧНО!
 
     data = await state.get_data()
-    selected = data.get("selected_events", [])
-    if not selected:
+    mask = _selection_mask(data, EVENTS, "events")
+    if not mask:
         await callback.answer(
             "❌ Выберите хотя бы один тип мероприятий!", show_alert=True
         )
         return
 
-    event_names = get_event_names()
-    selected_names = [event_names[e] for e in selected]
-    events_str = ", ".join(selected_names)
+    events_str = EVENTS.names_str(mask)
 
     async with async_session_maker() as session:
         repo = UserRepository(session)
-        await repo.update(user_id=callback.from_user.id, events=events_str)
+        user = await repo.update(user_id=callback.from_user.id, events_mask=mask)
+    if user:
+        profile_changed(user)
 
     await callback.message.edit_text(
         f"✅ Мероприятия обновлены: <b>{events_str}</b>", parse_mode="HTML"
@@ -750,7 +657,9 @@ async def process_edit_about(message: Message, state: FSMContext):
         about = validate_about(message.text)
         async with async_session_maker() as session:
             repo = UserRepository(session)
-            await repo.update(user_id=message.from_user.id, about=about)
+            user = await repo.update(user_id=message.from_user.id, about=about)
+        if user:
+            profile_changed(user)
 
         about_text = about or "Не указано"
         await message.answer(
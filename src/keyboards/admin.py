@@ -1,21 +1,57 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from options import EVENTS, INTERESTS
+
 
+@lru_cache(maxsize=None)
 def get_admin_main_keyboard() -> InlineKeyboardMarkup:
     """Главное меню админ-панели"""
     keyboard = [
         [InlineKeyboardButton(text="📝 Редактировать тексты", callback_data="admin_edit_texts")],
         [InlineKeyboardButton(text="📋 Список всех текстов", callback_data="admin_list_texts")],
+        [InlineKeyboardButton(text="💬 Рекомендуемые чаты", callback_data="admin_chats")],
+        [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="📣 Рассылка приглашения", callback_data="admin_broadcast")],
         [InlineKeyboardButton(text="❌ Закрыть", callback_data="admin_close")],
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@lru_cache(maxsize=None)
+def get_broadcast_keyboard(running: bool, resumable: bool) -> InlineKeyboardMarkup:
+    """Клавиатура экрана рассылки"""
+    keyboard = []
+    if not running:
+        text = "▶️ Продолжить рассылку" if resumable else "🚀 Начать рассылку"
+        keyboard.append([InlineKeyboardButton(text=text, callback_data="admin_broadcast_start")])
+    keyboard.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_broadcast")])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back_to_main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@lru_cache(maxsize=None)
+def get_stats_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура экрана статистики"""
+    keyboard = [
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="🧮 Пересчитать заново", callback_data="admin_stats_rebuild")],
+        [InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back_to_main")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 def get_text_list_keyboard(texts: list[tuple[str, str]]) -> InlineKeyboardMarkup:
     """
     Клавиатура со списком текстов для редактирования.
     texts: список кортежей (key, title)
     """
+    return _text_list_keyboard(tuple(texts))
+
+
+@lru_cache(maxsize=16)
+def _text_list_keyboard(texts: tuple[tuple[str, str], ...]) -> InlineKeyboardMarkup:
     keyboard = []
     for key, title in texts:
         # Ограничиваем длину названия для красоты
@@ -28,6 +64,7 @@ def get_text_list_keyboard(texts: list[tuple[str, str]]) -> InlineKeyboardMarkup
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@lru_cache(maxsize=128)
 def get_text_edit_keyboard(key: str) -> InlineKeyboardMarkup:
     """Клавиатура для редактирования конкретного текста"""
     keyboard = [
@@ -38,8 +75,58 @@ def get_text_edit_keyboard(key: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой отмены"""
     keyboard = [[InlineKeyboardButton(text="❌ Отменить", callback_data="admin_cancel_edit")]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+
+def get_chat_list_keyboard(chats: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    """
+    Клавиатура со списком рекомендуемых чатов.
+    chats: список кортежей (id, title)
+    """
+    keyboard = []
+    for chat_id, title in chats:
+        display_title = title[:40] + "..." if len(title) > 40 else title
+        keyboard.append(
+            [InlineKeyboardButton(text=f"💬 {display_title}", callback_data=f"admin_chat_open_{chat_id}")]
+        )
+
+    keyboard.append([InlineKeyboardButton(text="➕ Добавить чат", callback_data="admin_chat_add")])
+    keyboard.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin_back_to_main")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+@lru_cache(maxsize=64)
+def get_chat_edit_keyboard(chat_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура для редактирования рекомендуемого чата"""
+    keyboard = [
+        [
+            InlineKeyboardButton(text="✏️ Название", callback_data=f"admin_chat_title_{chat_id}"),
+            InlineKeyboardButton(text="🔗 Ссылка", callback_data=f"admin_chat_url_{chat_id}"),
+        ],
+        [InlineKeyboardButton(text="🏷 Интересы и мероприятия", callback_data=f"admin_chat_tags_{chat_id}")],
+        [InlineKeyboardButton(text="🗑 Удалить", callback_data=f"admin_chat_del_{chat_id}")],
+        [InlineKeyboardButton(text="◀️ Назад к списку", callback_data="admin_chats")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_chat_options_keyboard(chat_id: int, selected: frozenset[str]) -> InlineKeyboardMarkup:
+    """Клавиатура привязки чата к интересам и типам мероприятий"""
+    keyboard = []
+    for option in INTERESTS.options + EVENTS.options:
+        text = f"✅ {option.label}" if option.callback_data in selected else option.label
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    text=text,
+                    callback_data=f"admin_chat_tag_{chat_id}_{option.callback_data}",
+                )
+            ]
+        )
+
+    keyboard.append([InlineKeyboardButton(text="◀️ Готово", callback_data=f"admin_chat_open_{chat_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
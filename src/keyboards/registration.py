@@ -1,27 +1,30 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from options import EVENTS, INTERESTS, OptionSet
 
-def get_interests_keyboard() -> InlineKeyboardMarkup:
-    """Клавиатура для выбора интересов"""
-    interests = [
-        ("💰 Инвестиции", "interest_investments"),
-        ("📈 Карьерное развитие", "interest_career"),
-        ("💼 Предпринимательство и бизнес", "interest_business"),
-        ("📊 Экономика", "interest_economy"),
-        ("📢 Маркетинг", "interest_marketing"),
-        ("🎨 Искусство", "interest_art"),
-        ("⚽ Спорт", "interest_sport"),
-    ]
 
+@lru_cache(maxsize=None)
+def _selection_keyboard(options: OptionSet, mask: int) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора с отметками выбранных вариантов.
+
+    Объекты aiogram неизменяемы, поэтому одна клавиатура на маску переиспользуется
+    всеми пользователями.
+    """
     keyboard = []
-    for text, callback_data in interests:
-        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
+    for i, option in enumerate(options.options):
+        text = f"✅ {option.label}" if mask >> i & 1 else option.label
+        keyboard.append(
+            [InlineKeyboardButton(text=text, callback_data=option.callback_data)]
+        )
 
     # Кнопка подтверждения выбора
     keyboard.append(
         [
             InlineKeyboardButton(
-                text="✅ Подтвердить выбор", callback_data="interests_confirm"
+                text="✅ Подтвердить выбор", callback_data=options.confirm_callback
             )
         ]
     )
@@ -29,38 +32,24 @@ def get_interests_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_events_keyboard() -> InlineKeyboardMarkup:
-    """Клавиатура для выбора типов мероприятий"""
-    events = [
-        ("💼 Деловые", "event_business"),
-        ("📚 Обучающие", "event_educational"),
-        ("🏃 Спортивные", "event_sport"),
-        ("🎭 Культурные", "event_cultural"),
-        ("🍽️ Гастрономические", "event_gastronomic"),
-    ]
-
-    keyboard = []
-    for text, callback_data in events:
-        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
+def get_interests_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура для выбора интересов"""
+    return _selection_keyboard(INTERESTS, 0)
 
-    # Кнопка подтверждения выбора
-    keyboard.append(
-        [
-            InlineKeyboardButton(
-                text="✅ Подтвердить выбор", callback_data="events_confirm"
-            )
-        ]
-    )
 
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def get_events_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура для выбора типов мероприятий"""
+    return _selection_keyboard(EVENTS, 0)
 
 
+@lru_cache(maxsize=None)
 def get_skip_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой 'Пропустить'"""
     keyboard = [[InlineKeyboardButton(text="⏭️ Пропустить", callback_data="skip_about")]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@lru_cache(maxsize=None)
 def get_edit_profile_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора поля для редактирования профиля"""
     keyboard = [
@@ -78,62 +67,17 @@ def get_edit_profile_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def update_interests_keyboard(selected: list[str]) -> InlineKeyboardMarkup:
-    """Обновленная клавиатура интересов с отметками выбранных"""
-    interests_map = {
-        "interest_investments": "💰 Инвестиции",
-        "interest_career": "📈 Карьерное развитие",
-        "interest_business": "💼 Предпринимательство и бизнес",
-        "interest_economy": "📊 Экономика",
-        "interest_marketing": "📢 Маркетинг",
-        "interest_art": "🎨 Искусство",
-        "interest_sport": "⚽ Спорт",
-    }
-
-    keyboard = []
-    for callback_data, text in interests_map.items():
-        if callback_data in selected:
-            text = f"✅ {text}"
-        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
-
-    keyboard.append(
-        [
-            InlineKeyboardButton(
-                text="✅ Подтвердить выбор", callback_data="interests_confirm"
-            )
-        ]
-    )
-
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def update_interests_keyboard(mask: int) -> InlineKeyboardMarkup:
+    """Обновленная клавиатура интересов с отметками выбранных (маска INTERESTS)"""
+    return _selection_keyboard(INTERESTS, mask)
 
 
-def update_events_keyboard(selected: list[str]) -> InlineKeyboardMarkup:
-    """Обновленная клавиатура мероприятий с отметками выбранных"""
-    events_map = {
-        "event_business": "💼 Деловые",
-        "event_educational": "📚 Обучающие",
-        "event_sport": "🏃 Спортивные",
-        "event_cultural": "🎭 Культурные",
-        "event_gastronomic": "🍽️ Гастрономические",
-    }
-
-    keyboard = []
-    for callback_data, text in events_map.items():
-        if callback_data in selected:
-            text = f"✅ {text}"
-        keyboard.append([InlineKeyboardButton(text=text, callback_data=callback_data)])
-
-    keyboard.append(
-        [
-            InlineKeyboardButton(
-                text="✅ Подтвердить выбор", callback_data="events_confirm"
-            )
-        ]
-    )
-
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def update_events_keyboard(mask: int) -> InlineKeyboardMarkup:
+    """Обновленная клавиатура мероприятий с отметками выбранных (маска EVENTS)"""
+    return _selection_keyboard(EVENTS, mask)
 
 
+@lru_cache(maxsize=None)
 def get_event_registration_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой регистрации на мероприятие"""
     keyboard = [
@@ -1,51 +1,238 @@
 import json
 import logging
 import asyncio
+import signal
+import time
+from contextlib import suppress
+from typing import Any, Awaitable, TypeVar
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Update
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.utils.backoff import Backoff, BackoffConfig
 
 from config import settings
 from handlers import router
-from database import init_db
-from database.init_texts import init_default_texts
+from database import SQLiteStorage, FSMFlushMiddleware, engine, write_queue
+from database.bootstrap import prepare_database
+from utils.text_templates import template_cache
+from utils.rate_limiter import send_limiter
+from utils.metrics import invocation_metrics, setup_metrics, start_metrics_server
+from utils.tracing import setup_tracing, trace_span, trace_update
+from utils.update_scheduler import ChatLaneScheduler
+from utils.webhook_reply import (
+    WebhookReplyMiddleware,
+    capture_webhook_reply,
+    webhook_reply_response,
+)
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=settings.BOT_TOKEN)
-# Хранилище для FSM (состояния)
-storage = MemoryStorage()
+bot = Bot(
+    token=settings.BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    if settings.TELEGRAM_API_URL
+    else None,
+)
+bot.session.middleware(WebhookReplyMiddleware())
+bot.session.middleware(send_limiter)
+# Хранилище для FSM (состояния) — в той же БД, что и пользователи,
+# чтобы регистрация переживала смену инстанса функции
+storage = SQLiteStorage(write_queue=write_queue)
 dp = Dispatcher(storage=storage)
+setup_metrics(dp, bot, engine, write_queue)
+setup_tracing(dp, bot, engine, write_queue)
+dp.update.outer_middleware(FSMFlushMiddleware(storage))
+# При остановке polling дописываем отложенные записи (в Cloud Functions
+# каждый вызов и так дожидается своих коммитов)
+dp.shutdown.register(write_queue.close)
 dp.include_router(router)
 
 db_ready = False
 
 
+async def _timed(coro, phase: str, timings: dict[str, float]):
+    """Выполнить корутину и записать ее длительность (мс) в timings"""
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[phase] = (time.perf_counter() - started) * 1000
+
+
+def _log_cold_start(timings: dict[str, float]):
+    phases = " ".join(f"{name}={ms:.1f}ms" for name, ms in timings.items())
+    logger.info(f"Cold start timings: {phases}")
+
+
 async def handler(event: dict, context):
     """Webhook handler для Yandex Cloud Functions"""
+    with invocation_metrics() as metrics:
+        try:
+            with trace_span("main.handler"):
+                return await _handle_invocation(event)
+        finally:
+            logger.info(metrics.log_line())
+
+
+async def _handle_invocation(event: dict) -> dict:
     global db_ready
-    if not db_ready:
-        await init_db()
-        await init_default_texts()
-        db_ready = True
-        logger.info("Database initialized")
+    if db_ready:
+        return await _process_event(event)
 
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    with trace_span("prepare_database"):
+        migrated = await prepare_database(timings)
+    db_ready = True
+    logger.info("Database initialized" if migrated else "Database is up to date")
+
+    # Прогрев кэша текстов идет параллельно с обработкой первого апдейта
+    warmup = asyncio.create_task(
+        _timed(template_cache.warm(), "template_warmup", timings)
+    )
     try:
-        body: str = event["body"]
-        if not body or body.strip() == "{}":
-            logger.warning("Empty webhook body received")
-            return {"statusCode": 200, "body": ""}
+        return await _timed(_process_event(event), "first_update", timings)
+    finally:
+        try:
+            await warmup
+        except Exception as e:
+            logger.error(f"Template cache warmup failed: {e}")
+        timings["total"] = (time.perf_counter() - started) * 1000
+        _log_cold_start(timings)
 
-        update_data = json.loads(body)
-        if not update_data or "update_id" not in update_data:
-            logger.warning(f"Invalid update data: {update_data}")
-            return {"statusCode": 200, "body": ""}
 
-        update = Update.model_validate(update_data)
+def _extract_batch(event: dict) -> list | None:
+    """
+    Достать пачку апдейтов из события, если это пачка.
+
+    Поддерживаются триггер Message Queue ({"messages": [...]}) и тело
+    вебхука с JSON-массивом апдейтов. Для одиночного апдейта возвращает None.
+    Сообщение очереди, которое не удалось разобрать, становится None: оно
+    попадает в ответ как невалидное, не роняя остальные апдейты пачки.
+    """
+    messages = event.get("messages")
+    if messages is not None:
+        return [_decode_message(index, message) for index, message in enumerate(messages)]
+
+    body = event.get("body")
+    if body and body.lstrip().startswith("["):
+        return json.loads(body)
+    return None
+
+
+def _decode_message(index: int, message: dict) -> Any:
+    """Апдейт из сообщения триггера очереди (None — сообщение повреждено)"""
+    try:
+        return json.loads(message["details"]["message"]["body"])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Undecodable message in batch at position {index}: {e!r}")
+        return None
+
+
+async def _process_batch(raw_updates: list) -> dict:
+    """
+    Обработать пачку апдейтов.
+
+    Апдейты одного чата обрабатываются строго по порядку update_id, разные чаты —
+    параллельно, не больше settings.BATCH_CONCURRENCY одновременно.
+    """
+    results: dict[int, dict] = {}
+    updates: list[Update] = []
+    with trace_span("validate", updates=len(raw_updates)):
+        for index, raw in enumerate(raw_updates):
+            if raw is None:
+                results[-index - 1] = {"update_id": None, "ok": False, "error": "invalid"}
+                continue
+            try:
+                update = Update.model_validate(raw)
+            except Exception as e:
+                logger.warning(f"Invalid update in batch at position {index}: {e}")
+                results[-index - 1] = {"update_id": None, "ok": False, "error": "invalid"}
+                continue
+            if update.update_id in results:
+                continue  # повторная доставка того же апдейта
+            results[update.update_id] = {"update_id": update.update_id, "ok": True}
+            updates.append(update)
+
+    async def process(update: Update):
+        try:
+            await _feed_update(update)
+        except Exception as e:
+            results[update.update_id].update(ok=False, error=str(e))
+            raise
+
+    scheduler = ChatLaneScheduler(process, settings.BATCH_CONCURRENCY)
+    for update in sorted(updates, key=lambda u: u.update_id):
+        scheduler.submit(update)
+    await scheduler.join()
+
+    failed = sum(1 for r in results.values() if not r["ok"])
+    logger.info(f"Batch processed: {len(results)} updates, {failed} failed")
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"results": list(results.values())}),
+    }
+
+
+async def _feed_update(update: Update):
+    """Передать апдейт в диспетчер (в трассе — отдельным спаном)"""
+    with trace_update(update):
         await dp.feed_update(bot, update)
+
+
+async def _feed_with_webhook_reply(update: Update) -> dict:
+    """Обработать апдейт и вернуть первый answerCallbackQuery в ответе вебхука"""
+    failed = None
+    with capture_webhook_reply() as captured:
+        try:
+            await _feed_update(update)
+        except Exception as e:
+            failed = e
+
+    if failed is not None:
+        # Ответ функции с ошибкой Telegram не выполнит — отправляем сами,
+        # уже вне перехвата, иначе middleware снова заберет вызов себе
+        if captured:
+            await bot(captured[0])
+        raise failed
+    if not captured:
+        return {"statusCode": 200, "body": ""}
+    return webhook_reply_response(captured[0])
+
+
+def _parse_update(event: dict) -> Update | None:
+    """Апдейт из тела вебхука (None — тело пустое или без update_id)"""
+    body: str = event["body"]
+    if not body or body.strip() == "{}":
+        logger.warning("Empty webhook body received")
+        return None
+
+    update_data = json.loads(body)
+    if not update_data or "update_id" not in update_data:
+        logger.warning(f"Invalid update data: {update_data}")
+        return None
+
+    return Update.model_validate(update_data)
+
+
+async def _process_event(event: dict) -> dict:
+    """Разбор тела вебхука и передача апдейтов в диспетчер"""
+    try:
+        with trace_span("parse"):
+            batch = _extract_batch(event)
+            update = _parse_update(event) if batch is None else None
+        if batch is not None:
+            return await _process_batch(batch)
+        if update is None:
+            return {"statusCode": 200, "body": ""}
+
+        if settings.WEBHOOK_REPLY:
+            return await _feed_with_webhook_reply(update)
+        await _feed_update(update)
         return {"statusCode": 200, "body": ""}
     except json.JSONDecodeError:
         logger.error("Invalid JSON in webhook body")
@@ -57,18 +244,120 @@ async def handler(event: dict, context):
 
 async def main():
     """Локальный запуск бота для разработки"""
+    # В polling-режиме процесс один, поэтому кэш FSM можно держать между апдейтами
+    storage.keep_cache = True
+    # Процесс живет, пока работает бот, — рассылке не нужен бюджет вызова
+    settings.BROADCAST_TIME_BUDGET = 0
+
     logger.info("Initializing database...")
-    await init_db()
-    await init_default_texts()
-    logger.info("Database initialized")
+    migrated = await prepare_database()
+    logger.info("Database initialized" if migrated else "Database is up to date")
 
-    logger.info("Initializing text templates...")
-    await init_default_texts()
-    logger.info("Text templates initialized")
+    metrics_server = None
+    if settings.METRICS_PORT:
+        metrics_server = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
 
     logger.info("Bot started")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await _poll_updates()
+    finally:
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+
+
+T = TypeVar("T")
+
+
+async def _until_stopped(aw: Awaitable[T], stop: asyncio.Event) -> T | None:
+    """
+    Дождаться aw, но не дольше срабатывания stop.
+
+    Если stop сработал раньше, aw отменяется и возвращается None.
+    """
+    task = asyncio.ensure_future(aw)
+    stopper = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({task, stopper}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopper.cancel()
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    return None if task.cancelled() else task.result()
+
+
+async def _poll_updates(polling_timeout: int = 30):
+    """
+    Long polling с очередью на каждый чат.
+
+    Апдейты одного чата обрабатываются по порядку, разные чаты — параллельно,
+    не больше settings.POLLING_CONCURRENCY одновременно. Пока очереди полны,
+    новые апдейты не запрашиваются: они копятся на стороне Telegram, а не в
+    памяти процесса. Как и dp.start_polling, вызывает обработчики
+    dp.startup / dp.shutdown, а при остановке (Ctrl+C, SIGTERM) дорабатывает
+    полученные апдейты и закрывает сессию бота.
+    """
+    scheduler = ChatLaneScheduler(_feed_update, settings.POLLING_CONCURRENCY)
+    max_queued = settings.POLLING_CONCURRENCY * settings.POLLING_QUEUE_FACTOR
+    backoff = Backoff(BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1))
+    allowed_updates = dp.resolve_used_update_types()
+    offset = None
+    last_report = time.monotonic()
+
+    # Сигнал только выставляет флаг: цикл выходит сам, без CancelledError,
+    # и процесс завершается с кодом 0
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    signals = (signal.SIGINT, signal.SIGTERM)
+    with suppress(NotImplementedError):
+        # На Windows обработчики сигналов не поддерживаются
+        for sig in signals:
+            loop.add_signal_handler(sig, stop.set)
+
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        while not stop.is_set():
+            await _until_stopped(scheduler.wait_below(max_queued), stop)
+            if stop.is_set():
+                break
+            try:
+                updates = await _until_stopped(
+                    bot.get_updates(
+                        offset=offset,
+                        timeout=polling_timeout,
+                        allowed_updates=allowed_updates,
+                        request_timeout=polling_timeout + 10,
+                    ),
+                    stop,
+                )
+            except Exception as e:
+                logger.error(f"Failed to fetch updates: {e}")
+                await _until_stopped(backoff.asleep(), stop)
+                continue
+            if updates is None:
+                break
+            backoff.reset()
+
+            for update in updates:
+                offset = update.update_id + 1
+                scheduler.submit(update)
+
+            if time.monotonic() - last_report >= 60:
+                logger.info(f"Update lanes: {scheduler.stats()}")
+                last_report = time.monotonic()
+    finally:
+        with suppress(NotImplementedError):
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+        logger.info("Polling stopped")
+        try:
+            await scheduler.join()
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""
+Справочник вариантов выбора: интересы и типы мероприятий.
+
+Единственный источник для клавиатур и названий в профиле. Выбор хранится битовой
+маской (бит i — вариант i) и в FSM, и в БД (users.interests_mask / events_mask),
+поэтому переключение — одна операция XOR, а все производные (клавиатура, строка
+названий) кэшируются по маске: вариантов всего 2^7 и 2^5.
+
+Модуль лежит вне utils и database: справочник нужен обоим слоям (маски в
+репозитории и миграциях, клавиатуры и подбор), а database не зависит от utils.
+
+Порядок вариантов менять нельзя — он задает биты в сохраненных масках. Новые
+варианты добавляются только в конец.
+"""
+
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple
+
+
+class Option(NamedTuple):
+    """Вариант выбора"""
+
+    callback_data: str
+    emoji: str
+    name: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.emoji} {self.name}"
+
+
+class OptionSet:
+    """Упорядоченный набор вариантов с выбором в виде битовой маски"""
+
+    def __init__(self, options: tuple[Option, ...], confirm_callback: str):
+        """
+        Args:
+            options: Варианты в порядке отображения
+            confirm_callback: callback_data кнопки подтверждения
+        """
+        self.options = options
+        self.confirm_callback = confirm_callback
+        self.bits = MappingProxyType(
+            {option.callback_data: 1 << i for i, option in enumerate(options)}
+        )
+        self.names: Mapping[str, str] = MappingProxyType(
+            {option.callback_data: option.name for option in options}
+        )
+        self._by_name = {option.name.lower(): option for option in options}
+        self.full_mask = (1 << len(options)) - 1
+        # Кэши по маске; у каждого набора свои, чтобы не хранить self в ключе
+        self.callbacks = lru_cache(maxsize=None)(self._callbacks)
+        self.names_str = lru_cache(maxsize=None)(self._names_str)
+        self.masks_with = lru_cache(maxsize=256)(self._masks_with)
+
+    def toggle(self, mask: int, callback_data: str) -> int:
+        """Переключить вариант в маске (неизвестный callback_data не меняет маску)"""
+        return mask ^ self.bits.get(callback_data, 0)
+
+    def mask(self, callbacks: Iterable[str]) -> int:
+        """Маска по списку callback_data"""
+        mask = 0
+        for callback_data in callbacks:
+            mask |= self.bits.get(callback_data, 0)
+        return mask
+
+    def mask_from_names(self, raw_values: str | None) -> int:
+        """Маска по строке названий через запятую (прежний формат хранения в БД)"""
+        if not raw_values:
+            return 0
+        mask = 0
+        for item in raw_values.split(","):
+            option = self._by_name.get(item.strip().lower())
+            if option is not None:
+                mask |= self.bits[option.callback_data]
+        return mask
+
+    def _callbacks(self, mask: int) -> tuple[str, ...]:
+        """callback_data выбранных вариантов в порядке отображения"""
+        return tuple(
+            option.callback_data
+            for i, option in enumerate(self.options)
+            if mask >> i & 1
+        )
+
+    def _masks_with(self, bits: int, match_all: bool = False) -> tuple[int, ...]:
+        """
+        Все маски, содержащие хотя бы один из битов (или все биты при match_all).
+
+        Условие "interests_mask IN (...)" по такому списку использует индекс,
+        в отличие от "interests_mask & bits".
+        """
+        return tuple(
+            mask
+            for mask in range(self.full_mask + 1)
+            if (mask & bits == bits if match_all else mask & bits)
+        )
+
+    def _names_str(self, mask: int) -> str:
+        """Названия выбранных вариантов через запятую"""
+        return ", ".join(
+            option.name for i, option in enumerate(self.options) if mask >> i & 1
+        )
+
+
+INTERESTS = OptionSet(
+    (
+        Option("interest_investments", "💰", "Инвестиции"),
+        Option("interest_career", "📈", "Карьерное развитие"),
+        Option("interest_business", "💼", "Предпринимательство и бизнес"),
+        Option("interest_economy", "📊", "Экономика"),
+        Option("interest_marketing", "📢", "Маркетинг"),
+        Option("interest_art", "🎨", "Искусство"),
+        Option("interest_sport", "⚽", "Спорт"),
+    ),
+    confirm_callback="interests_confirm",
+)
+
+EVENTS = OptionSet(
+    (
+        Option("event_business", "💼", "Деловые"),
+        Option("event_educational", "📚", "Обучающие"),
+        Option("event_sport", "🏃", "Спортивные"),
+        Option("event_cultural", "🎭", "Культурные"),
+        Option("event_gastronomic", "🍽️", "Гастрономические"),
+    ),
+    confirm_callback="events_confirm",
+)
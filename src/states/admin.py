@@ -8,3 +8,6 @@ class AdminStates(StatesGroup):
     editing_text = State()  # Редактирование текста по ключу
     waiting_for_text_key = State()  # Ожидание выбора ключа для редактирования
     waiting_for_new_content = State()  # Ожидание нового содержимого
+    editing_chat = State()  # Просмотр и правка рекомендуемого чата
+    waiting_for_chat_title = State()  # Ожидание названия чата
+    waiting_for_chat_url = State()  # Ожидание ссылки на чат
@@ -6,6 +6,7 @@ from .validators import (
     get_interest_names,
     get_event_names,
 )
+from options import Option, OptionSet, INTERESTS, EVENTS
 
 __all__ = [
     "validate_full_name",
@@ -14,4 +15,8 @@ __all__ = [
     "ValidationError",
     "get_interest_names",
     "get_event_names",
+    "Option",
+    "OptionSet",
+    "INTERESTS",
+    "EVENTS",
 ]
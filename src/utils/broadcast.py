@@ -0,0 +1,153 @@
+"""
+Рассылка шаблона всем пользователям.
+
+Пользователи читаются страницами по курсору (id > last_user_id), каждая доставка
+записывается в broadcast_deliveries. После падения или таймаута функции рассылка
+продолжается с курсора, а уже получившие сообщение пользователи пропускаются.
+Темп отправки задает RateLimitMiddleware сессии бота, в памяти — не больше одной
+страницы получателей, сколько бы пользователей ни было в БД.
+"""
+
+import asyncio
+import html
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy.engine import Row
+
+from database import async_session_maker, Broadcast, BroadcastRepository
+from keyboards.registration import get_event_registration_keyboard
+from utils.text_templates import CompiledTemplate, template_cache
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TEMPLATE_KEY = "event_invitation"
+
+# Получателей на страницу: столько сообщений одновременно ждут своей очереди
+# в лимитере отправки
+PAGE_SIZE = 200
+
+
+class BroadcastRunner:
+    """Выполняет одну рассылку за раз и считает скорость отправки"""
+
+    def __init__(self, page_size: int = PAGE_SIZE):
+        self.page_size = page_size
+        self.broadcast_id: Optional[int] = None
+        self.started_at = 0.0
+        self.processed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def throughput(self) -> float:
+        """Сообщений в секунду в текущем (или последнем) запуске"""
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if self.started_at and elapsed > 0 else 0.0
+
+    def start(self, bot: Bot, broadcast_id: int, time_budget: float = 0.0) -> asyncio.Task:
+        """Запустить рассылку в фоне (если она еще не идет)"""
+        if not self.running:
+            self._task = asyncio.create_task(self.run(bot, broadcast_id, time_budget))
+            self._task.add_done_callback(self._log_failure)
+        return self._task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Broadcast failed: {task.exception()}")
+
+    async def run(self, bot: Bot, broadcast_id: int, time_budget: float = 0.0) -> bool:
+        """
+        Отправлять страницы получателей, пока они не закончатся или не выйдет время.
+
+        Args:
+            bot: Бот (с лимитером отправки в сессии)
+            broadcast_id: ID рассылки
+            time_budget: Сколько секунд можно работать (0 — без ограничения)
+
+        Returns:
+            True, если рассылка завершена
+        """
+        async with async_session_maker() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+        if broadcast is None or broadcast.status == "done":
+            return True
+
+        template = await template_cache.get(broadcast.template_key)
+        if template is None:
+            raise ValueError(f"Template '{broadcast.template_key}' not found")
+
+        self.broadcast_id = broadcast_id
+        self.started_at = time.monotonic()
+        self.processed = 0
+        deadline = self.started_at + time_budget if time_budget > 0 else None
+        cursor = broadcast.last_user_id
+        keyboard = get_event_registration_keyboard()
+
+        while deadline is None or time.monotonic() < deadline:
+            async with async_session_maker() as session:
+                page = await BroadcastRepository(session).get_recipients(
+                    broadcast_id, cursor, self.page_size
+                )
+            if not page:
+                async with async_session_maker() as session:
+                    await BroadcastRepository(session).finish(broadcast_id)
+                logger.info(
+                    f"Broadcast {broadcast_id} finished: {self.processed} messages "
+                    f"at {self.throughput():.1f}/s"
+                )
+                return True
+
+            await asyncio.gather(
+                *(
+                    self._deliver(bot, broadcast_id, template.compiled, keyboard, user)
+                    for user in page
+                )
+            )
+            cursor = page[-1].id
+            async with async_session_maker() as session:
+                await BroadcastRepository(session).advance(broadcast_id, cursor)
+
+        logger.info(f"Broadcast {broadcast_id} paused at user {cursor}: time budget spent")
+        return False
+
+    async def _deliver(
+        self,
+        bot: Bot,
+        broadcast_id: int,
+        template: CompiledTemplate,
+        keyboard: InlineKeyboardMarkup,
+        user: Row,
+    ) -> None:
+        first_name = user.first_name or user.first_name_tg or ""
+        text = template.render({"first_name": html.escape(first_name)})
+        status, error = "sent", None
+        try:
+            await bot.send_message(
+                user.id,
+                text,
+                reply_markup=keyboard,
+                parse_mode="HTML",
+            )
+        except TelegramForbiddenError as e:
+            # Пользователь заблокировал бота — повторять бессмысленно
+            status, error = "failed", f"forbidden: {e.message}"
+        except TelegramAPIError as e:
+            status, error = "failed", str(e)
+            logger.warning(f"Broadcast {broadcast_id} to {user.id} failed: {e}")
+
+        self.processed += 1
+        async with async_session_maker() as session:
+            await BroadcastRepository(session).record_delivery(
+                broadcast_id, user.id, status, error
+            )
+
+
+broadcast_runner = BroadcastRunner()
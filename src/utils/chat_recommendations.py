@@ -0,0 +1,156 @@
+"""
+Рекомендации чатов по выбранным интересам и типам мероприятий.
+
+Чаты и привязки хранятся в БД (редактируются в админке) и компилируются в таблицу:
+пара масок (интересы, мероприятия) -> готовый HTML-блок. Вариантов всего
+2^7 * 2^5 = 4096, поэтому таблица строится целиком, а рекомендация при
+регистрации — одно обращение по индексу. После правки в админке таблица
+собирается заново и подменяется одним присваиванием: обработчики видят либо
+старую, либо новую таблицу целиком.
+"""
+
+import asyncio
+import html
+import time
+from typing import Optional
+
+from aiogram.types import LinkPreviewOptions
+
+from config import settings
+from database import async_session_maker, ChatRepository
+from options import EVENTS, INTERESTS
+
+# Параметры отправки блока рекомендаций
+RECOMMENDATIONS_SEND_KWARGS = {
+    "parse_mode": "HTML",
+    "link_preview_options": LinkPreviewOptions(is_disabled=True),
+}
+
+EVENT_BITS = len(EVENTS.options)
+
+
+class RecommendationTable:
+    """Неизменяемая таблица: маски выбора -> HTML-блок рекомендаций (или None)"""
+
+    def __init__(
+        self,
+        chats: dict[int, tuple[str, str]],
+        mappings: dict[str, tuple[int, ...]],
+    ):
+        """
+        Args:
+            chats: ID чата -> (название, ссылка) в порядке вывода
+            mappings: callback_data варианта -> ID чатов по порядку
+        """
+        self.chats = chats
+        self.mappings = mappings
+        interest_chats = [mappings.get(o.callback_data, ()) for o in INTERESTS.options]
+        event_chats = [mappings.get(o.callback_data, ()) for o in EVENTS.options]
+
+        # Одинаковые наборы чатов дают один и тот же блок — рендерим один раз
+        blocks: dict[tuple[int, ...], Optional[str]] = {}
+        lookup: list[Optional[str]] = []
+        for interests_mask in range(INTERESTS.full_mask + 1):
+            for events_mask in range(EVENTS.full_mask + 1):
+                ordered = self._ordered_chats(
+                    interest_chats, interests_mask, event_chats, events_mask
+                )
+                if ordered not in blocks:
+                    blocks[ordered] = self._render(ordered)
+                lookup.append(blocks[ordered])
+        self._lookup = tuple(lookup)
+        self.distinct_blocks = len(blocks)
+
+    @staticmethod
+    def _ordered_chats(
+        interest_chats: list[tuple[int, ...]],
+        interests_mask: int,
+        event_chats: list[tuple[int, ...]],
+        events_mask: int,
+    ) -> tuple[int, ...]:
+        """Чаты по порядку: сначала по интересам, затем по мероприятиям, без повторов"""
+        ordered: dict[int, None] = {}
+        for chats, mask in ((interest_chats, interests_mask), (event_chats, events_mask)):
+            for i, chat_ids in enumerate(chats):
+                if mask >> i & 1:
+                    ordered.update(dict.fromkeys(chat_ids))
+        return tuple(ordered)
+
+    def _render(self, chat_ids: tuple[int, ...]) -> Optional[str]:
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id in self.chats]
+        if not chat_ids:
+            return None
+
+        lines = ["📌 Рекомендуем Вам присоединиться к следующим сообществам:"]
+        for chat_id in chat_ids:
+            title, url = self.chats[chat_id]
+            lines.append(
+                f'• <a href="{html.escape(url, quote=True)}">{html.escape(title)}</a>'
+            )
+        return "\n".join(lines)
+
+    def render(self, interests_mask: int, events_mask: int) -> Optional[str]:
+        """HTML-блок рекомендаций для выбора (None — рекомендовать нечего)"""
+        interests_mask &= INTERESTS.full_mask
+        events_mask &= EVENTS.full_mask
+        return self._lookup[interests_mask << EVENT_BITS | events_mask]
+
+
+class ChatRecommendations:
+    """
+    Процессный кэш таблицы рекомендаций.
+
+    Как и кэш текстов, перечитывается по истечении TTL (чаты могли изменить
+    в другом инстансе) и сразу после правки в админке.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._table: Optional[RecommendationTable] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self.ttl <= 0 or time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self) -> RecommendationTable:
+        """Прочитать чаты и привязки из БД и подменить таблицу"""
+        async with async_session_maker() as session:
+            repo = ChatRepository(session)
+            chats = await repo.get_all()
+            mappings = await repo.get_mappings()
+
+        grouped: dict[str, list[int]] = {}
+        for mapping in mappings:
+            grouped.setdefault(mapping.option, []).append(mapping.chat_id)
+
+        table = RecommendationTable(
+            {chat.id: (chat.title, chat.url) for chat in chats},
+            {option: tuple(chat_ids) for option, chat_ids in grouped.items()},
+        )
+        self._table = table
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        return table
+
+    async def warm(self) -> RecommendationTable:
+        """Таблица рекомендаций (загружается, если ее нет или она устарела)"""
+        table = self._table
+        if table is not None and self._is_fresh():
+            return table
+        async with self._lock:
+            # Пока ждали блокировку, таблицу мог загрузить другой запрос
+            if self._table is None or not self._is_fresh():
+                return await self.load()
+            return self._table
+
+    async def render(self, interests_mask: int, events_mask: int) -> Optional[str]:
+        """HTML-блок рекомендаций для выбора пользователя"""
+        table = await self.warm()
+        return table.render(interests_mask, events_mask)
+
+
+chat_recommendations = ChatRecommendations(ttl=settings.TEXT_CACHE_TTL)
@@ -0,0 +1,278 @@
+"""
+Выгрузка пользователей в CSV и XLSX.
+
+Строки читаются из БД страницами по ключу (каждая в своей короткой сессии) и
+сразу дописываются во временный файл, поэтому пиковая память не зависит от
+числа пользователей, а чтение не держит транзакцию, пока пишется файл.
+XLSX собирается без сторонних библиотек: это zip с несколькими XML-файлами,
+лист пишется в архив потоково, строки хранятся прямо в ячейках (inlineStr) —
+без таблицы общих строк, которую пришлось бы держать в памяти целиком.
+
+Форматирование и запись каждой порции идут в отдельном потоке: на десятках
+тысяч строк это секунды, и все это время бот не отвечал бы остальным.
+"""
+
+import asyncio
+import csv
+import os
+import re
+import tempfile
+import zipfile
+from typing import Any, Callable, NamedTuple, Optional
+from xml.sax.saxutils import escape
+
+from database import async_session_maker, UserRepository
+from database.repository import EXPORT_CHUNK_SIZE
+from options import EVENTS, INTERESTS
+from utils.validators import ValidationError
+
+
+class ExportColumn(NamedTuple):
+    """Колонка выгрузки: заголовок, колонка users и преобразование значения"""
+
+    header: str
+    source: str
+    format: Callable[[Any], Any]
+
+
+def _text(value: Any) -> str:
+    return value or ""
+
+
+EXPORT_COLUMNS = {
+    "id": ExportColumn("ID", "id", int),
+    "username": ExportColumn(
+        "Username", "username", lambda value: f"@{value}" if value else ""
+    ),
+    "first_name": ExportColumn("Имя", "first_name", _text),
+    "last_name": ExportColumn("Фамилия", "last_name", _text),
+    "city": ExportColumn("Город", "city", _text),
+    "interests": ExportColumn(
+        "Интересы", "interests_mask", lambda value: INTERESTS.names_str(value or 0)
+    ),
+    "events": ExportColumn(
+        "Мероприятия", "events_mask", lambda value: EVENTS.names_str(value or 0)
+    ),
+    "about": ExportColumn("О себе", "about", _text),
+    "created_at": ExportColumn(
+        "Дата регистрации",
+        "created_at",
+        lambda value: value.strftime("%Y-%m-%d %H:%M") if value else "",
+    ),
+}
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+
+class ExportRequest(NamedTuple):
+    """Параметры выгрузки"""
+
+    format: str
+    columns: tuple[str, ...]
+    complete_only: bool
+    city: Optional[str]
+
+
+def parse_export_args(args: Optional[str]) -> ExportRequest:
+    """
+    Разобрать аргументы /export.
+
+    Формат: [csv|xlsx] [complete] [city=Город] [columns=id,first_name,...]
+    Название города может содержать пробелы: city= забирает все до следующего
+    параметра.
+
+    Raises:
+        ValidationError: Если аргументы не распознаны
+    """
+    fmt = "csv"
+    columns = tuple(EXPORT_COLUMNS)
+    complete_only = False
+    city = None
+
+    keywords = (*EXPORT_FORMATS, "complete")
+    tokens = (args or "").split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token.lower() in EXPORT_FORMATS:
+            fmt = token.lower()
+        elif token.lower() == "complete":
+            complete_only = True
+        elif token.lower().startswith("city="):
+            parts = [token[len("city="):]]
+            while i < len(tokens) and "=" not in tokens[i] and tokens[i].lower() not in keywords:
+                parts.append(tokens[i])
+                i += 1
+            city = " ".join(filter(None, parts)) or None
+        elif token.lower().startswith("columns="):
+            columns = tuple(
+                column.strip().lower()
+                for column in token[len("columns="):].split(",")
+                if column.strip()
+            )
+            unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+            if unknown or not columns:
+                raise ValidationError(
+                    f"❌ Неизвестные колонки: {', '.join(unknown) or '—'}\n"
+                    f"Доступны: {', '.join(EXPORT_COLUMNS)}"
+                )
+        else:
+            raise ValidationError(f"❌ Непонятный параметр: {token}")
+
+    return ExportRequest(fmt, columns, complete_only, city)
+
+
+# Excel считает ячейку с таким первым символом формулой
+_CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value: Any) -> Any:
+    """Текст пользователя, похожий на формулу, Excel должен показать как текст"""
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class CsvWriter:
+    """Потоковая запись CSV (UTF-8 с BOM — Excel открывает кириллицу без настройки)"""
+
+    def __init__(self, path: str, headers: list[str]):
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+
+    def write_rows(self, rows: list[list[Any]]) -> None:
+        self._writer.writerows([_csv_cell(value) for value in row] for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# Символы, недопустимые в XML 1.0
+_XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Участники" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_cell(value: Any) -> str:
+    if isinstance(value, int):
+        return f"<c><v>{value}</v></c>"
+    value = escape(_XML_ILLEGAL_RE.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{value}</t></is></c>'
+
+
+class XlsxWriter:
+    """Потоковая запись XLSX: один лист, строки пишутся в архив по мере поступления"""
+
+    def __init__(self, path: str, headers: list[str]):
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        for name, content in _XLSX_STATIC_PARTS.items():
+            self._zip.writestr(name, content)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b"<sheetData>"
+        )
+        self.write_rows([headers])
+
+    def write_rows(self, rows: list[list[Any]]) -> None:
+        chunk = "".join(
+            "<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>"
+            for row in rows
+        )
+        self._sheet.write(chunk.encode("utf-8"))
+
+    def close(self) -> None:
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter}
+
+
+async def export_users(request: ExportRequest) -> tuple[str, int]:
+    """
+    Выгрузить пользователей во временный файл.
+
+    Файл удаляет вызывающий (после отправки).
+
+    Returns:
+        (путь к файлу, число строк)
+    """
+    columns = [EXPORT_COLUMNS[name] for name in request.columns]
+    fd, path = tempfile.mkstemp(prefix="users_", suffix=f".{request.format}")
+    os.close(fd)
+
+    # Колонка users читается один раз, даже если ее выводят несколько колонок
+    sources = list(dict.fromkeys(column.source for column in columns))
+    cells = [(sources.index(column.source), column.format) for column in columns]
+
+    def write_chunk(writer, rows) -> None:
+        writer.write_rows([[fmt(row[i]) for i, fmt in cells] for row in rows])
+
+    count = 0
+    try:
+        writer = WRITERS[request.format](path, [column.header for column in columns])
+        try:
+            cursor = 0
+            while True:
+                # Своя короткая сессия на страницу: пока файл пишется в потоке,
+                # транзакция чтения не держит БД (без WAL она мешает записи)
+                async with async_session_maker() as session:
+                    rows = await UserRepository(session).get_rows_page(
+                        sources,
+                        after_user_id=cursor,
+                        complete_only=request.complete_only,
+                        city=request.city,
+                        limit=EXPORT_CHUNK_SIZE,
+                    )
+                if rows:
+                    await asyncio.to_thread(write_chunk, writer, rows)
+                    count += len(rows)
+                if len(rows) < EXPORT_CHUNK_SIZE:
+                    break
+                cursor = rows[-1].id
+        finally:
+            writer.close()
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return path, count
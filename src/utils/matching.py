@@ -0,0 +1,309 @@
+"""
+Подбор собеседников по анкетам.
+
+Близость двух пользователей — взвешенная сумма:
+  * косинуса по выбранным интересам и типам мероприятий (битовые маски);
+  * косинуса TF-IDF векторов текста «О себе».
+
+Все анкеты лежат в матрицах (плотная N x 12 для меток и разреженная CSR N x V
+для текста), поэтому подбор для одного пользователя — два умножения матрицы на
+вектор. Изменения анкет копятся в небольшой дельте поверх основной матрицы; когда
+дельта вырастает (needs_rebuild), владелец индекса перестраивает его целиком в
+отдельном потоке (заодно обновляются словарь и IDF).
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+from scipy import sparse
+
+from options import EVENTS, INTERESTS
+
+# Слова короче не несут смысла ("и", "в", "на")
+MIN_TOKEN_LENGTH = 3
+# Грубый стемминг для русского: первые 6 букв ("конференции" и "конференциях"
+# дают одну основу)
+STEM_LENGTH = 6
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+TAG_BITS = len(INTERESTS.options) + len(EVENTS.options)
+
+# Сколько ячеек матрицы близости считать за раз в пакетном режиме (~16 МБ)
+BLOCK_CELLS = 4_000_000
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Основы слов текста"""
+    if not text:
+        return []
+    words = TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [word[:STEM_LENGTH] for word in words if len(word) >= MIN_TOKEN_LENGTH]
+
+
+class Profile(NamedTuple):
+    """Данные анкеты, участвующие в подборе"""
+
+    user_id: int
+    interests_mask: int
+    events_mask: int
+    about: Optional[str]
+
+
+def _tag_matrix(profiles: list[Profile]) -> np.ndarray:
+    """Нормированные векторы меток: бит маски -> столбец"""
+    combined = np.fromiter(
+        (p.interests_mask | p.events_mask << len(INTERESTS.options) for p in profiles),
+        dtype=np.int64,
+        count=len(profiles),
+    )
+    tags = ((combined[:, None] >> np.arange(TAG_BITS)) & 1).astype(np.float32)
+    norms = np.linalg.norm(tags, axis=1, keepdims=True)
+    np.divide(tags, norms, out=tags, where=norms > 0)
+    return tags
+
+
+def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr().astype(np.float32)
+
+
+class MatchIndex:
+    """Индекс анкет для подбора собеседников"""
+
+    def __init__(
+        self,
+        tag_weight: float = 0.4,
+        text_weight: float = 0.6,
+        rebuild_ratio: float = 0.1,
+        rebuild_min: int = 256,
+    ):
+        """
+        Args:
+            tag_weight: Вес совпадения интересов и мероприятий
+            text_weight: Вес сходства текстов «О себе»
+            rebuild_ratio: Доля измененных анкет, после которой индекс перестраивается
+            rebuild_min: Размер дельты, до которого перестройка не нужна
+        """
+        self.tag_weight = tag_weight
+        self.text_weight = text_weight
+        self.rebuild_ratio = rebuild_ratio
+        self.rebuild_min = rebuild_min
+        self.rebuilds = 0
+        self._profiles: dict[int, Profile] = {}
+        self.build([])
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """Дельта выросла настолько, что индекс пора перестроить"""
+        return len(self._delta) > max(self.rebuild_min, self.rebuild_ratio * len(self._ids))
+
+    def profiles(self) -> list[Profile]:
+        """Снимок всех анкет индекса"""
+        return list(self._profiles.values())
+
+    def build(self, profiles: Iterable[Profile]) -> None:
+        """Построить индекс заново по всем анкетам"""
+        self._profiles = {p.user_id: p for p in profiles}
+        profiles = list(self._profiles.values())
+
+        documents = [Counter(tokenize(p.about)) for p in profiles]
+        vocab: dict[str, int] = {}
+        indptr, indices, counts = [0], [], []
+        for document in documents:
+            for term, count in document.items():
+                indices.append(vocab.setdefault(term, len(vocab)))
+                counts.append(count)
+            indptr.append(len(indices))
+
+        indices = np.asarray(indices, dtype=np.int32)
+        tf = 1 + np.log(np.asarray(counts, dtype=np.float32))
+        df = np.bincount(indices, minlength=len(vocab))
+        # Сглаженный IDF: термин из всех документов все равно имеет вес 1
+        self._idf = (np.log((1 + len(profiles)) / (1 + df)) + 1).astype(np.float32)
+        text = sparse.csr_matrix(
+            (tf * self._idf[indices], indices, np.asarray(indptr)),
+            shape=(len(profiles), len(vocab)),
+        )
+
+        self._vocab = vocab
+        self._text = _normalize_rows(text)
+        self._tags = _tag_matrix(profiles)
+        self._ids = np.fromiter(
+            (p.user_id for p in profiles), dtype=np.int64, count=len(profiles)
+        )
+        self._rows = {user_id: row for row, user_id in enumerate(self._ids.tolist())}
+        self._alive = np.ones(len(profiles), dtype=bool)
+        self._delta: dict[int, tuple[np.ndarray, sparse.csr_matrix]] = {}
+        self._delta_cache: Optional[tuple] = None
+        self.rebuilds += 1
+
+    def _text_vector(self, about: Optional[str]) -> sparse.csr_matrix:
+        """TF-IDF вектор по текущему словарю (новые слова ждут перестройки)"""
+        counts = Counter(
+            self._vocab[term] for term in tokenize(about) if term in self._vocab
+        )
+        columns = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        tf = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        vector = sparse.csr_matrix(
+            (tf * self._idf[columns], columns, [0, len(columns)]),
+            shape=(1, len(self._vocab)),
+        )
+        return _normalize_rows(vector)
+
+    def upsert(self, profile: Profile) -> None:
+        """Добавить или обновить анкету"""
+        self._profiles[profile.user_id] = profile
+        row = self._rows.get(profile.user_id)
+        if row is not None:
+            self._alive[row] = False
+        self._delta[profile.user_id] = (
+            _tag_matrix([profile])[0],
+            self._text_vector(profile.about),
+        )
+        self._delta_cache = None
+
+    def remove(self, user_id: int) -> None:
+        """Убрать анкету из подбора"""
+        if self._profiles.pop(user_id, None) is None:
+            return
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._alive[row] = False
+        if self._delta.pop(user_id, None) is not None:
+            self._delta_cache = None
+
+    def _vectors(self, user_id: int) -> Optional[tuple[np.ndarray, sparse.csr_matrix]]:
+        if user_id in self._delta:
+            return self._delta[user_id]
+        row = self._rows.get(user_id)
+        if row is None or not self._alive[row]:
+            return None
+        return self._tags[row], self._text[row]
+
+    def _scores(
+        self,
+        tags: np.ndarray,
+        text: sparse.csr_matrix,
+        tag_vector: np.ndarray,
+        text_vector: sparse.csr_matrix,
+    ) -> np.ndarray:
+        text_scores = text.dot(text_vector.T).toarray().ravel()
+        return self.tag_weight * tags.dot(tag_vector) + self.text_weight * text_scores
+
+    def _delta_matrices(self) -> tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+        if self._delta_cache is None:
+            ids = np.fromiter(self._delta.keys(), dtype=np.int64, count=len(self._delta))
+            tags = np.vstack([tag for tag, _ in self._delta.values()])
+            text = sparse.vstack([text for _, text in self._delta.values()]).tocsr()
+            self._delta_cache = (ids, tags, text)
+        return self._delta_cache
+
+    def top_k(
+        self, user_id: int, k: int = 5, min_score: float = 0.0
+    ) -> list[tuple[int, float]]:
+        """
+        Лучшие собеседники для пользователя.
+
+        Returns:
+            Список (user_id, близость от 0 до 1) по убыванию близости
+        """
+        vectors = self._vectors(user_id)
+        if vectors is None:
+            return []
+
+        ids = self._ids
+        scores = self._scores(self._tags, self._text, *vectors)
+        scores[~self._alive] = -np.inf
+        if self._delta:
+            delta_ids, delta_tags, delta_text = self._delta_matrices()
+            ids = np.concatenate([ids, delta_ids])
+            scores = np.concatenate(
+                [scores, self._scores(delta_tags, delta_text, *vectors)]
+            )
+        scores[ids == user_id] = -np.inf
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (int(ids[i]), float(scores[i])) for i in top if scores[i] > min_score
+        ]
+
+    def all_top_k(
+        self, k: int = 5, min_score: float = 0.0
+    ) -> dict[int, list[tuple[int, float]]]:
+        """
+        Лучшие собеседники для всех пользователей сразу (пакетный режим).
+
+        Матрица близости считается блоками строк, чтобы память не росла как N^2.
+        """
+        if self._delta or not self._alive.all():
+            self.build(self._profiles.values())
+
+        n = len(self._ids)
+        k = min(k, n - 1)
+        if k <= 0:
+            return {int(user_id): [] for user_id in self._ids}
+
+        text_t = self._text.T.tocsr()
+        tags_t = self._tags.T
+        block = max(1, BLOCK_CELLS // n)
+        result: dict[int, list[tuple[int, float]]] = {}
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            scores = self.tag_weight * self._tags[start:stop].dot(tags_t)
+            scores += self.text_weight * self._text[start:stop].dot(text_t).toarray()
+            rows = np.arange(stop - start)
+            scores[rows, rows + start] = -np.inf
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            for row in rows:
+                result[int(self._ids[start + row])] = [
+                    (int(self._ids[column]), float(score))
+                    for column, score in zip(top[row], top_scores[row])
+                    if score > min_score
+                ]
+        return result
+
+
+def pair_up(
+    candidates: dict[int, list[tuple[int, float]]],
+) -> tuple[list[tuple[int, int, float]], list[int]]:
+    """
+    Разбить пользователей на пары для знакомства.
+
+    Жадно берет самые близкие пары из списков кандидатов, каждый пользователь
+    попадает не больше чем в одну пару.
+
+    Returns:
+        (пары (user_a, user_b, близость), пользователи без пары)
+    """
+    edges = {}
+    for user_id, partners in candidates.items():
+        for partner_id, score in partners:
+            key = (min(user_id, partner_id), max(user_id, partner_id))
+            edges[key] = max(score, edges.get(key, -math.inf))
+
+    paired: set[int] = set()
+    pairs = []
+    for (user_a, user_b), score in sorted(edges.items(), key=lambda e: -e[1]):
+        if user_a in paired or user_b in paired:
+            continue
+        paired.update((user_a, user_b))
+        pairs.append((user_a, user_b, score))
+
+    unpaired = [user_id for user_id in candidates if user_id not in paired]
+    return pairs, unpaired
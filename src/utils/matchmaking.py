@@ -0,0 +1,162 @@
+"""
+Индекс подбора собеседников процесса.
+
+Индекс строится из БД при первом обращении. NumPy и SciPy импортируются тоже
+только тогда, поэтому холодный старт функции их не загружает. Дальше индекс
+обновляется по мере изменения анкет этого процесса через profile_changed().
+Анкеты, измененные на других инстансах функции, сюда не приходят, поэтому
+по истечении MATCH_INDEX_TTL (или когда локальных изменений накопилось много)
+следующий get_match_index() перечитывает анкеты из БД, строит индекс в
+отдельном потоке и подменяет готовым. Пока идет перестройка, подбор работает
+по старому индексу.
+"""
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from config import settings
+from database import async_session_maker, UserRepository
+
+if TYPE_CHECKING:
+    from utils.matching import MatchIndex, Profile
+
+logger = logging.getLogger(__name__)
+
+# Анкет в одном запросе при построении индекса
+LOAD_PAGE_SIZE = 2000
+
+_index: Optional["MatchIndex"] = None
+# Когда начато чтение анкет для текущего индекса (time.monotonic)
+_loaded_at: Optional[float] = None
+_building = False
+# Изменения анкет, пришедшие во время построения индекса
+_pending: dict[int, Any] = {}
+# Блокировка привязана к event loop, а в Cloud Functions у каждого вызова свой
+_lock: Optional[asyncio.Lock] = None
+_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _to_profile(user: Any) -> Optional["Profile"]:
+    """Анкета для подбора (None, если регистрация не завершена)"""
+    from utils.matching import Profile
+
+    if not user.first_name:
+        return None
+    return Profile(user.id, user.interests_mask or 0, user.events_mask or 0, user.about)
+
+
+def _apply(index: "MatchIndex", user: Any) -> None:
+    profile = _to_profile(user)
+    if profile is None:
+        index.remove(user.id)
+    else:
+        index.upsert(profile)
+
+
+def profile_changed(user: Any) -> None:
+    """
+    Учесть изменение анкеты в индексе.
+
+    Args:
+        user: Строка или модель User с актуальными полями (после записи в БД)
+    """
+    if _index is not None:
+        _apply(_index, user)
+    if _building:
+        _pending[user.id] = user
+
+
+def _get_lock() -> asyncio.Lock:
+    """Блокировка построения индекса для текущего event loop"""
+    global _lock, _lock_loop, _building
+    loop = asyncio.get_running_loop()
+    if _lock is None or _lock_loop is not loop:
+        # Построение, начатое в прошлом event loop, уже не завершится
+        _lock, _lock_loop = asyncio.Lock(), loop
+        _building = False
+        _pending.clear()
+    return _lock
+
+
+async def _load_profiles() -> list["Profile"]:
+    profiles = []
+    cursor = 0
+    async with async_session_maker() as session:
+        repo = UserRepository(session)
+        while True:
+            page = await repo.get_profiles_page(cursor, LOAD_PAGE_SIZE)
+            if not page:
+                return profiles
+            profiles.extend(_to_profile(row) for row in page)
+            cursor = page[-1].id
+
+
+def _is_stale(index: "MatchIndex") -> bool:
+    """Индекс пора перечитать из БД"""
+    ttl = settings.MATCH_INDEX_TTL
+    expired = ttl > 0 and (_loaded_at is None or time.monotonic() - _loaded_at >= ttl)
+    return expired or index.needs_rebuild
+
+
+async def _build() -> "MatchIndex":
+    """Прочитать анкеты из БД, построить индекс в отдельном потоке и подменить текущий"""
+    global _index, _loaded_at, _building
+    from utils.matching import MatchIndex
+
+    _building = True
+    try:
+        started = time.monotonic()
+        profiles = await _load_profiles()
+        index = MatchIndex()
+        await asyncio.to_thread(index.build, profiles)
+        for user in _pending.values():
+            _apply(index, user)
+        _index = index
+        _loaded_at = started
+    finally:
+        _building = False
+        _pending.clear()
+    return index
+
+
+async def get_match_index() -> "MatchIndex":
+    """Индекс подбора (строится при первом вызове, перечитывается по мере устаревания)"""
+    if _index is not None and not _is_stale(_index):
+        return _index
+
+    lock = _get_lock()
+    if _index is not None and lock.locked():
+        # Перестройка уже идет — пока подбираем по текущему индексу
+        return _index
+
+    async with lock:
+        # Пока ждали блокировку, индекс мог перестроить другой запрос
+        if _index is None or _is_stale(_index):
+            rebuilt = _index is not None
+            index = await _build()
+            logger.info(f"Match index {'rebuilt' if rebuilt else 'built'}: {len(index)} profiles")
+    return _index
+
+
+async def compute_introductions(k: int = 5) -> tuple[list[tuple[int, int, float]], list[int]]:
+    """
+    Пары для знакомства на мероприятии по всем анкетам.
+
+    Считается в отдельном потоке на снимке анкет, чтобы не блокировать обработку
+    апдейтов и не пересекаться с обновлениями индекса.
+
+    Returns:
+        (пары (user_a, user_b, близость), пользователи без пары)
+    """
+    from utils.matching import MatchIndex, pair_up
+
+    snapshot = (await get_match_index()).profiles()
+
+    def _compute():
+        index = MatchIndex()
+        index.build(snapshot)
+        return pair_up(index.all_top_k(k))
+
+    return await asyncio.to_thread(_compute)
@@ -0,0 +1,561 @@
+"""
+Метрики обработки апдейтов.
+
+Собирается три вида времени, чтобы отличить медленный код хендлера от ожидания
+SQLite и Bot API:
+  - время хендлера — гистограмма по имени хендлера и состоянию FSM, в котором
+    пришел апдейт;
+  - запросы к БД — число и время через события движка SQLAlchemy;
+  - вызовы Bot API — число и время через middleware сессии бота.
+
+Время БД и Bot API дополнительно суммируется по хендлеру, который их вызвал,
+а число сессий и запросов апдейта сверяется с бюджетом (utils/query_budget.py).
+
+Локально (polling) метрики отдаются в текстовом формате Prometheus по адресу
+/metrics. В Cloud Functions экспортировать некуда, поэтому каждый вызов
+функции пишет одну строку лога с итогами (см. invocation_metrics).
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import WriteQueue
+from utils.query_budget import QueryBudgetExceeded, QueryUsage, check_usage
+from utils.rate_limiter import send_limiter
+from utils.tracing import handler_name
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метки для апдейтов без хендлера и без состояния FSM
+UNHANDLED_NAME = "unhandled"
+NO_STATE = "none"
+
+# Операции БД, которые различаются в метриках (остальное — "other")
+DB_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT"})
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # метки -> [счетчики корзин..., сумма, количество]
+        self.values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self) -> Iterator[str]:
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]!r}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class CallbackMetric:
+    """Значение, которое считывается функцией в момент выдачи метрик"""
+
+    def __init__(
+        self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {_number(self.read())}"
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self.metrics: list[Counter | Histogram | CallbackMetric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames))
+
+    def callback(
+        self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"
+    ) -> CallbackMetric:
+        return self._add(CallbackMetric(name, documentation, read, kind))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+handler_seconds = registry.histogram(
+    "bot_handler_seconds",
+    "Время обработки апдейта по хендлеру и состоянию FSM",
+    ("handler", "state"),
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Апдейты, обработка которых упала", ("handler",)
+)
+handler_db_statements = registry.counter(
+    "bot_handler_db_statements_total", "Запросы к БД, выполненные хендлером", ("handler",)
+)
+handler_db_seconds = registry.counter(
+    "bot_handler_db_seconds_total", "Время запросов к БД внутри хендлера", ("handler",)
+)
+handler_api_calls = registry.counter(
+    "bot_handler_api_calls_total", "Вызовы Bot API из хендлера", ("handler",)
+)
+handler_api_seconds = registry.counter(
+    "bot_handler_api_seconds_total", "Время вызовов Bot API внутри хендлера", ("handler",)
+)
+handler_budget_exceeded = registry.counter(
+    "bot_query_budget_exceeded_total",
+    "Апдейты сверх бюджета запросов к БД (utils/query_budget.py)",
+    ("handler",),
+)
+db_seconds = registry.histogram(
+    "bot_db_statement_seconds", "Время запроса к БД по типу запроса", ("operation",)
+)
+db_errors = registry.counter(
+    "bot_db_errors_total", "Ошибки запросов к БД (locked — не дождались блокировки)", ("kind",)
+)
+api_seconds = registry.histogram(
+    "bot_api_request_seconds", "Время вызова Bot API по методу и результату", ("method", "status")
+)
+registry.callback(
+    "bot_send_waiting", "Отправки, ждущие лимита сейчас", lambda: send_limiter.waiting
+)
+registry.callback(
+    "bot_send_wait_seconds_total",
+    "Суммарное ожидание лимитов отправки",
+    lambda: send_limiter.wait_time,
+    "counter",
+)
+registry.callback(
+    "bot_send_retries_total", "Повторы отправки после 429", lambda: send_limiter.retries, "counter"
+)
+
+
+class UpdateMetrics:
+    """Итоги одного апдейта: хендлер, запросы к БД и вызовы Bot API внутри него"""
+
+    __slots__ = (
+        "task",
+        "handler",
+        "db_sessions",
+        "db_statements",
+        "db_time",
+        "queued_statements",
+        "statement_counts",
+        "api_calls",
+        "api_time",
+    )
+
+    def __init__(self):
+        # Фоновые задачи (очередь записи, рассылка) наследуют контекст апдейта,
+        # который их запустил, — их запросы апдейту не засчитываются
+        self.task = asyncio.current_task()
+        self.handler = UNHANDLED_NAME
+        self.db_sessions = 0
+        self.db_statements = 0
+        self.db_time = 0.0
+        # Записи, переданные в очередь группового коммита
+        self.queued_statements = 0
+        # SQL -> сколько раз выполнен (поиск запросов в цикле)
+        self.statement_counts: dict[str, int] = {}
+        self.api_calls = 0
+        self.api_time = 0.0
+
+    def query_usage(self) -> QueryUsage:
+        repeated, repeated_sql = 0, ""
+        for statement, count in self.statement_counts.items():
+            if count > repeated:
+                repeated, repeated_sql = count, statement
+        return QueryUsage(
+            self.db_sessions,
+            self.db_statements + self.queued_statements,
+            repeated,
+            repeated_sql,
+        )
+
+
+class InvocationMetrics:
+    """Итоги одного вызова функции для строки лога"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.updates = 0
+        self.errors = 0
+        # хендлер -> [апдейты, время]
+        self.handlers: dict[str, list[float]] = {}
+        self._start_totals = _totals()
+
+    def add(self, handler: str, elapsed: float, failed: bool) -> None:
+        self.updates += 1
+        self.errors += failed
+        stats = self.handlers.setdefault(handler, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def log_line(self) -> str:
+        """
+        Компактная строка итогов.
+
+        БД и Bot API считаются по всему инстансу за время вызова: запись через
+        общую очередь не принадлежит одному апдейту.
+        """
+        elapsed = time.perf_counter() - self.started
+        db_count, db_time, api_count, api_time = (
+            now - before for now, before in zip(_totals(), self._start_totals)
+        )
+        handlers = ",".join(
+            f"{name}={int(count)}/{seconds * 1000:.1f}ms"
+            for name, (count, seconds) in sorted(self.handlers.items())
+        )
+        return (
+            f"metrics updates={self.updates} errors={self.errors} "
+            f"time={elapsed * 1000:.1f}ms db={int(db_count)}/{db_time * 1000:.1f}ms "
+            f"api={int(api_count)}/{api_time * 1000:.1f}ms handlers={handlers or '-'}"
+        )
+
+
+_update: ContextVar[Optional[UpdateMetrics]] = ContextVar("metrics_update", default=None)
+_invocation: ContextVar[Optional[InvocationMetrics]] = ContextVar(
+    "metrics_invocation", default=None
+)
+
+
+def _totals() -> tuple[float, float, float, float]:
+    """Сколько запросов к БД и вызовов Bot API выполнено с запуска процесса"""
+    db_count = db_time = api_count = api_time = 0.0
+    for series in db_seconds.values.values():
+        db_time += series[-2]
+        db_count += series[-1]
+    for series in api_seconds.values.values():
+        api_time += series[-2]
+        api_count += series[-1]
+    return db_count, db_time, api_count, api_time
+
+
+def _current_update() -> Optional[UpdateMetrics]:
+    current = _update.get()
+    if current is None or current.task is not asyncio.current_task():
+        return None
+    return current
+
+
+def count_queued_statements(count: int) -> None:
+    """Засчитать текущему апдейту записи, отданные в очередь записи"""
+    current = _update.get()
+    if current is not None:
+        current.queued_statements += count
+
+
+@contextmanager
+def invocation_metrics() -> Iterator[InvocationMetrics]:
+    """Собрать итоги апдейтов, обработанных внутри блока"""
+    invocation = InvocationMetrics()
+    token = _invocation.set(invocation)
+    try:
+        yield invocation
+    finally:
+        _invocation.reset(token)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки апдейта целиком.
+
+    Регистрируется outer-middleware апдейтов после встроенного
+    FSMContextMiddleware (в data уже есть raw_state), но до FSMFlushMiddleware,
+    чтобы запись FSM тоже попала во время хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        current = UpdateMetrics()
+        token = _update.set(current)
+        started = time.perf_counter()
+        failed = False
+        try:
+            result = await handler(event, data)
+            if result is UNHANDLED:
+                current.handler = UNHANDLED_NAME
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _update.reset(token)
+            violation = self._record(current, data.get("raw_state") or NO_STATE, elapsed, failed)
+
+        if violation and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(violation)
+        return result
+
+    @staticmethod
+    def _record(
+        current: UpdateMetrics, state: str, elapsed: float, failed: bool
+    ) -> Optional[str]:
+        """Записать итоги апдейта; возвращает нарушение бюджета запросов"""
+        name = current.handler
+        handler_seconds.observe(elapsed, name, state)
+        if failed:
+            handler_errors.inc(name)
+        if current.db_statements:
+            handler_db_statements.inc(name, value=current.db_statements)
+            handler_db_seconds.inc(name, value=current.db_time)
+        if current.api_calls:
+            handler_api_calls.inc(name, value=current.api_calls)
+            handler_api_seconds.inc(name, value=current.api_time)
+        invocation = _invocation.get()
+        if invocation is not None:
+            invocation.add(name, elapsed, failed)
+        if name == UNHANDLED_NAME:
+            return None
+        violation = check_usage(name, current.query_usage())
+        if violation:
+            handler_budget_exceeded.inc(name)
+        return violation
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Запоминает, какой хендлер выбран для апдейта (inner-middleware событий)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        current = _update.get()
+        handler_object = data.get("handler")
+        if current is not None and handler_object is not None:
+            current.handler = handler_name(handler_object.callback)
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Число и время вызовов Bot API.
+
+    Регистрируется последним middleware сессии: меряется сам HTTP-запрос,
+    каждый повтор после 429 — отдельным вызовом, без ожидания лимитов отправки.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            api_seconds.observe(elapsed, type(method).__name__, status)
+            current = _current_update()
+            if current is not None:
+                current.api_calls += 1
+                current.api_time += elapsed
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Считать запросы движка и их время"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        operation = statement.lstrip()[:7].split(None, 1)[0].upper() if statement else ""
+        db_seconds.observe(elapsed, operation if operation in DB_OPERATIONS else "other")
+        # Контекстные переменные доходят сюда: SQLAlchemy запускает гринлет
+        # с контекстом вызывающей задачи
+        current = _current_update()
+        if current is not None:
+            current.db_statements += 1
+            current.db_time += elapsed
+            counts = current.statement_counts
+            counts[statement] = counts.get(statement, 0) + 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            started = context.connection.info.get("metrics_started")
+            if started and context.cursor is not None:
+                started.pop()
+        db_errors.inc("locked" if "locked" in str(context.original_exception) else "other")
+
+    # Сессия считается, когда начинает работу с БД (autobegin первого запроса)
+    @event.listens_for(Session, "after_transaction_create")
+    def _session_begin(session, transaction):
+        if transaction.parent is None:
+            current = _current_update()
+            if current is not None:
+                current.db_sessions += 1
+
+
+def instrument_write_queue(write_queue: WriteQueue) -> None:
+    """Счетчики очереди записи; ее запросы засчитываются апдейту, который их поставил"""
+    registry.callback("bot_write_queue_depth", "Запросы в очереди записи", write_queue.depth)
+    registry.callback(
+        "bot_write_queue_commits_total",
+        "Коммиты очереди записи",
+        lambda: write_queue.commits,
+        "counter",
+    )
+    registry.callback(
+        "bot_write_queue_statements_total",
+        "Запросы, записанные через очередь",
+        lambda: write_queue.statements,
+        "counter",
+    )
+    # Запросы выполняет общая фоновая задача, поэтому апдейту они
+    # засчитываются при постановке в очередь
+    write_queue.on_submit = count_queued_statements
+
+
+def setup_metrics(
+    dp: Dispatcher, bot: Bot, engine: AsyncEngine, write_queue: WriteQueue
+) -> None:
+    """
+    Подключить сбор метрик.
+
+    Вызывать до регистрации FSMFlushMiddleware и после остальных middleware
+    сессии бота.
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    names = HandlerNameMiddleware()
+    # inner-middleware диспетчера действуют и во вложенных роутерах
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(names)
+    bot.session.middleware(ApiMetricsMiddleware())
+    instrument_engine(engine)
+    instrument_write_queue(write_queue)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """HTTP-сервер с /metrics для Prometheus (локальный режим)"""
+
+    async def metrics_view(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+    return runner
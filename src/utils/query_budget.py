@@ -0,0 +1,98 @@
+"""
+Бюджет запросов к БД на апдейт.
+
+Лишние сессии и запросы незаметны на одном пользователе, но в пике
+регистрации каждый из них стоит очереди за блокировкой SQLite. Счетчики
+собирает utils/metrics.py (сессии, выполненные запросы и записи через очередь
+внутри апдейта), здесь они сравниваются с бюджетом хендлера:
+  - превышение бюджета пишется в лог с именем хендлера;
+  - один и тот же SQL, выполненный в апдейте REPEATED_STATEMENT_LIMIT раз и
+    больше, отмечается как вероятный N+1 (запрос в цикле);
+  - в строгом режиме (QUERY_BUDGET_STRICT, для тестов) апдейт с нарушением
+    завершается ошибкой QueryBudgetExceeded.
+
+Максимум по каждому хендлеру копится в usage_by_handler — по нему
+tests/query_budget_test.py ловит рост числа запросов относительно базы.
+"""
+
+import logging
+from typing import NamedTuple, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Столько одинаковых запросов в одном апдейте — уже запрос в цикле
+REPEATED_STATEMENT_LIMIT = 5
+
+
+class QueryBudget(NamedTuple):
+    """Сколько сессий и запросов разрешено хендлеру на один апдейт"""
+
+    sessions: int
+    statements: int
+
+
+class QueryUsage(NamedTuple):
+    """Сколько сессий и запросов потратил апдейт"""
+
+    sessions: int
+    statements: int
+    # Сколько раз выполнен самый частый запрос и его текст
+    repeated: int = 0
+    repeated_sql: str = ""
+
+
+class QueryBudgetExceeded(Exception):
+    """Апдейт превысил бюджет запросов (только в строгом режиме)"""
+
+    pass
+
+
+DEFAULT_BUDGET = QueryBudget(settings.QUERY_BUDGET_SESSIONS, settings.QUERY_BUDGET_STATEMENTS)
+
+# Хендлеры, которым по делу нужно больше (имя — как в метриках: модуль.функция),
+# например "admin.rebuild_stats": QueryBudget(sessions=1, statements=20)
+HANDLER_BUDGETS: dict[str, QueryBudget] = {}
+
+# Максимум по каждому хендлеру с запуска процесса
+usage_by_handler: dict[str, QueryUsage] = {}
+
+
+def budget_for(handler: str) -> QueryBudget:
+    return HANDLER_BUDGETS.get(handler, DEFAULT_BUDGET)
+
+
+def check_usage(handler: str, usage: QueryUsage) -> Optional[str]:
+    """
+    Сравнить расход апдейта с бюджетом хендлера.
+
+    Returns:
+        Описание нарушения (уже записано в лог) или None
+    """
+    peak = usage_by_handler.get(handler)
+    usage_by_handler[handler] = (
+        QueryUsage(
+            max(usage.sessions, peak.sessions),
+            max(usage.statements, peak.statements),
+            max(usage.repeated, peak.repeated),
+        )
+        if peak
+        else QueryUsage(usage.sessions, usage.statements, usage.repeated)
+    )
+
+    budget = budget_for(handler)
+    problems = []
+    if usage.sessions > budget.sessions:
+        problems.append(f"sessions {usage.sessions}/{budget.sessions}")
+    if usage.statements > budget.statements:
+        problems.append(f"statements {usage.statements}/{budget.statements}")
+    if usage.repeated >= REPEATED_STATEMENT_LIMIT:
+        sql = " ".join(usage.repeated_sql.split())[:120]
+        problems.append(f"possible N+1: {usage.repeated}x {sql}")
+    if not problems:
+        return None
+
+    message = f"Query budget exceeded in {handler}: " + ", ".join(problems)
+    logger.warning(message)
+    return message
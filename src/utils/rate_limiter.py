@@ -0,0 +1,185 @@
+"""
+Ограничение скорости исходящих сообщений.
+
+Telegram ограничивает рассылку: около 30 сообщений в секунду на бота, около
+одного сообщения в секунду в личный чат и 20 в минуту в группу. При превышении
+приходит 429 с retry_after. Этот middleware сессии бота выдерживает лимиты
+токен-бакетами (общим и по чатам) и повторяет запрос после retry_after, так что
+в пиковую нагрузку сообщения уходят чуть позже, а не падают с ошибкой.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from config import settings
+from utils.tracing import trace_span
+
+logger = logging.getLogger(__name__)
+
+# Вызовы, которые считаются отправкой сообщения
+RATE_LIMITED_PREFIXES = ("send", "copy", "forward")
+NOT_RATE_LIMITED = frozenset({"sendChatAction"})
+
+
+class TokenBucket:
+    """Токен-бакет с резервированием: ожидающие обслуживаются по очереди"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """Забрать токен и вернуть, сколько секунд ждать до его появления"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Общий и початовый лимиты отправки с повтором после flood wait"""
+
+    # При таком числе початовых бакетов удаляем заполненные (неактивные)
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        group_rate: float,
+        max_retries: int = 5,
+    ):
+        """
+        Args:
+            global_rate: Сообщений в секунду на весь бот
+            chat_rate: Сообщений в секунду в личный чат
+            chat_burst: Сколько сообщений подряд можно отправить в чат без ожидания
+            group_rate: Сообщений в секунду в группу
+            max_retries: Сколько раз повторять запрос после 429
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._paused_until = 0.0
+
+        self.waiting = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_IDLE_BUCKETS:
+                self._chats = {
+                    key: b for key, b in self._chats.items() if not b.is_full(now)
+                }
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: int | str | None) -> None:
+        # Сначала лимит чата, и только потом общий токен — на момент фактической
+        # отправки. Иначе отложенная отправка тратит общий слот сейчас, а уходит
+        # позже пачкой с другими и превышает общий лимит
+        now = time.monotonic()
+        delay = self._paused_until - now
+        if chat_id is not None:
+            delay = max(delay, self._chat_bucket(chat_id, now).reserve(now))
+        total = 0.0
+        if delay > 0:
+            total += delay
+            await self._sleep(delay)
+            now = time.monotonic()
+
+        delay = max(self._global.reserve(now), self._paused_until - now)
+        if delay > 0:
+            total += delay
+            await self._sleep(delay)
+        if total > 0:
+            self.waits += 1
+            self.wait_time += total
+            self.max_wait = max(self.max_wait, total)
+
+    async def _sleep(self, delay: float) -> None:
+        self.waiting += 1
+        try:
+            with trace_span("rate_limit.wait", delay_ms=round(delay * 1000)):
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        if not api_method.startswith(RATE_LIMITED_PREFIXES) or api_method in NOT_RATE_LIMITED:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                # Пауза для всех отправок: 429 означает, что лимит уже превышен
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + e.retry_after
+                )
+                logger.warning(
+                    f"Flood wait {e.retry_after}s on {api_method} "
+                    f"(chat {chat_id}), retry {attempt}/{self.max_retries}"
+                )
+
+    def stats(self) -> dict[str, float]:
+        """Очередь и время ожидания отправки"""
+        return {
+            "waiting": self.waiting,
+            "waits": self.waits,
+            "wait_time": round(self.wait_time, 3),
+            "max_wait": round(self.max_wait, 3),
+            "retries": self.retries,
+            "chat_buckets": len(self._chats),
+        }
+
+
+send_limiter = RateLimitMiddleware(
+    global_rate=settings.RATE_GLOBAL_PER_SEC,
+    chat_rate=settings.RATE_CHAT_PER_SEC,
+    chat_burst=settings.RATE_CHAT_BURST,
+    group_rate=settings.RATE_GROUP_PER_MIN / 60,
+)
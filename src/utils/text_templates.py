@@ -2,13 +2,200 @@
 Утилита для работы с текстовыми шаблонами из БД
 """
 
-from typing import Optional
+import asyncio
+import time
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Mapping, NamedTuple, Optional
+
+from config import settings
 from database import async_session_maker, TextTemplateRepository
+from database.init_texts import TEXT_PLACEHOLDERS
+from utils.validators import ValidationError
+
+_formatter = Formatter()
+
+# Все подстановки в тексты — строки; этим значением шаблон пробно рендерится
+_SAMPLE_VALUE = "Текст"
+
+
+class CompiledTemplate:
+    """
+    Шаблон, разобранный один раз на литералы и подстановки.
+
+    В отличие от str.format, отсутствующие параметры подставляются
+    значением по умолчанию, а не приводят к выводу сырого '{city}'.
+    """
+
+    __slots__ = ("parts", "fields")
+
+    def __init__(self, content: str):
+        # parts: список (литерал, имя поля или None, формат, конверсия)
+        self.parts: list[tuple[str, Optional[str], str, Optional[str]]] = []
+        for literal, field, spec, conversion in _formatter.parse(content):
+            self.parts.append((literal, field, spec or "", conversion))
+        self.fields = frozenset(
+            field for _, field, _, _ in self.parts if field is not None
+        )
+
+    def render(self, values: Mapping[str, Any], default: str = "") -> str:
+        """Подставить значения; отсутствующие и None заменяются на default"""
+        chunks = []
+        for literal, field, spec, conversion in self.parts:
+            if literal:
+                chunks.append(literal)
+            if field is None:
+                continue
+            value = values.get(field)
+            if value is None:
+                chunks.append(default)
+                continue
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            chunks.append(format(value, spec))
+        return "".join(chunks)
+
+
+@lru_cache(maxsize=256)
+def compile_template(content: str) -> CompiledTemplate:
+    """Скомпилировать шаблон (результат кэшируется по содержимому)"""
+    try:
+        return CompiledTemplate(content)
+    except ValueError:
+        # Текст сохранен до появления проверки в админке — отдаем как есть
+        return CompiledTemplate(content.replace("{", "{{").replace("}", "}}"))
+
+
+def validate_template_placeholders(key: str, content: str) -> None:
+    """
+    Проверить подстановки в тексте перед сохранением в админке.
+
+    Raises:
+        ValidationError: Если текст не разбирается, содержит неизвестные для
+            этого ключа подстановки или не рендерится (формат вроде
+            {first_name:d} или конверсия {first_name!x})
+    """
+    try:
+        compiled = CompiledTemplate(content)
+    except ValueError:
+        raise ValidationError(
+            "❌ Ошибка в фигурных скобках.\n"
+            "Подстановки пишутся как {first_name}, а одиночные скобки — как {{ и }}."
+        )
+
+    allowed = TEXT_PLACEHOLDERS.get(key, frozenset())
+    unknown = sorted(compiled.fields - allowed)
+    if unknown:
+        allowed_text = ", ".join(f"{{{name}}}" for name in sorted(allowed)) or "нет"
+        unknown_text = ", ".join(f"{{{name}}}" for name in unknown)
+        raise ValidationError(
+            f"❌ Неизвестные подстановки: {unknown_text}\n"
+            f"Доступные для этого текста: {allowed_text}"
+        )
+
+    try:
+        compiled.render(dict.fromkeys(compiled.fields, _SAMPLE_VALUE))
+    except (ValueError, TypeError):
+        raise ValidationError(
+            "❌ Формат или конверсия в подстановке не подходят к тексту.\n"
+            "Пишите подстановки просто как {first_name}."
+        )
+
+
+class CachedTemplate(NamedTuple):
+    """Снимок шаблона в кэше"""
+
+    content: str
+    updated_at: Optional[datetime]
+    compiled: CompiledTemplate
+
+
+class TemplateCache:
+    """
+    Процессный кэш текстовых шаблонов.
+
+    Все строки TextTemplate загружаются одним запросом и дальше отдаются из памяти.
+    Кэш перечитывается по истечении TTL (другие инстансы функции могли изменить
+    тексты) и обновляется сразу после сохранения текста в админке.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._templates: dict[str, CachedTemplate] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self.ttl <= 0 or time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self) -> None:
+        """Загрузить все шаблоны из БД одним запросом"""
+        async with async_session_maker() as session:
+            repo = TextTemplateRepository(session)
+            templates = await repo.get_all()
+
+        self._templates = {
+            t.key: CachedTemplate(t.content, t.updated_at, compile_template(t.content))
+            for t in templates
+        }
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        self.reloads += 1
+
+    async def get(self, key: str) -> Optional[CachedTemplate]:
+        """Получить шаблон по ключу (None, если шаблона нет)"""
+        if self._is_fresh():
+            self.hits += 1
+            return self._templates.get(key)
+
+        self.misses += 1
+        await self.warm()
+        return self._templates.get(key)
+
+    async def warm(self) -> None:
+        """Загрузить шаблоны, если кэш пуст или устарел"""
+        async with self._lock:
+            # Пока ждали блокировку, кэш мог загрузить другой запрос
+            if not self._is_fresh():
+                await self.load()
+
+    def put(self, key: str, content: str, updated_at: Optional[datetime] = None) -> None:
+        """Обновить один шаблон после записи в БД"""
+        self._templates[key] = CachedTemplate(
+            content, updated_at, compile_template(content)
+        )
+        self.version += 1
+
+    def invalidate(self) -> None:
+        """Сбросить кэш — следующий запрос перечитает шаблоны из БД"""
+        self._loaded_at = None
+
+    def stats(self) -> dict[str, int]:
+        """Счетчики попаданий/промахов кэша"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "version": self.version,
+            "size": len(self._templates),
+        }
+
+
+template_cache = TemplateCache(ttl=settings.TEXT_CACHE_TTL)
 
 
 async def get_text_template(key: str, **format_kwargs) -> str:
     """
-    Получить текст шаблона из БД и отформатировать его.
+    Получить текст шаблона из кэша и отформатировать его.
+
+    Отсутствующие параметры подставляются пустой строкой.
 
     Args:
         key: Ключ шаблона (например, 'welcome_new')
@@ -17,25 +204,18 @@ async def get_text_template(key: str, **format_kwargs) -> str:
     Returns:
         Отформатированный текст шаблона
     """
-    async with async_session_maker() as session:
-        repo = TextTemplateRepository(session)
-        template = await repo.get_by_key(key)
+    template = await template_cache.get(key)
 
-        if not template:
-            # Если шаблон не найден, возвращаем дефолтный текст
-            return f"⚠️ Текст '{key}' не найден в базе данных."
+    if not template:
+        # Если шаблон не найден, возвращаем дефолтный текст
+        return f"⚠️ Текст '{key}' не найден в базе данных."
 
-        try:
-            # Форматируем текст с переданными параметрами
-            return template.content.format(**format_kwargs)
-        except KeyError as e:
-            # Если не хватает параметров для форматирования
-            return template.content
+    return template.compiled.render(format_kwargs)
 
 
 async def get_text_or_default(key: str, default: str, **format_kwargs) -> str:
     """
-    Получить текст из БД или вернуть дефолтный, если не найден.
+    Получить текст из кэша или вернуть дефолтный, если не найден.
 
     Args:
         key: Ключ шаблона
@@ -45,14 +225,14 @@ async def get_text_or_default(key: str, default: str, **format_kwargs) -> str:
     Returns:
         Текст шаблона или дефолтный текст
     """
-    async with async_session_maker() as session:
-        repo = TextTemplateRepository(session)
-        template = await repo.get_by_key(key)
+    template = await template_cache.get(key)
+
+    if not template:
+        return compile_template(default).render(format_kwargs)
+
+    return template.compiled.render(format_kwargs)
 
-        if not template:
-            return default.format(**format_kwargs) if format_kwargs else default
 
-        try:
-            return template.content.format(**format_kwargs)
-        except KeyError:
-            return template.content
+def get_template_cache_stats() -> dict[str, int]:
+    """Счетчики кэша шаблонов (для админки и мониторинга)"""
+    return template_cache.stats()
@@ -0,0 +1,426 @@
+"""
+Трассировка отдельных апдейтов.
+
+Когда участник жалуется на 15 секунд ожидания, метрики покажут только
+распределение. Трасса показывает, что делал конкретный апдейт: разбор тела
+вебхука, подбор хендлера фильтрами, сам хендлер, каждую сессию и SQL-запрос,
+ожидание очереди записи и лимита отправки, каждый запрос к Bot API.
+
+Включается настройками (по умолчанию выключено):
+  - TRACE_SAMPLE_RATE — доля трасс, которые пишутся всегда;
+  - TRACE_SLOW_MS — трассы дольше порога пишутся независимо от доли (для этого
+    спаны собираются у каждого апдейта, а решение принимается в конце).
+
+Трасса — одна строка JSONL в TRACE_FILE: JSON-массив спанов в формате Zipkin v2.
+Строку можно отправить в Zipkin как есть:
+    curl -X POST -H 'Content-Type: application/json' -d "$LINE" \
+        http://localhost:9411/api/v2/spans
+Если TRACE_FILE пустой, трассы пишутся в лог (в Cloud Functions /tmp живет не
+дольше инстанса).
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "conference-bot"
+# Больше спанов в одной трассе не храним (например, рассылка внутри хендлера)
+MAX_SPANS = 2000
+# Сколько символов SQL сохранять в теге
+MAX_SQL_LENGTH = 500
+
+
+class Trace:
+    """Спаны одного апдейта (или вызова функции)"""
+
+    __slots__ = ("trace_id", "sampled", "epoch", "origin", "spans", "dropped", "closed")
+
+    def __init__(self, trace_id: str, sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        # Время спанов меряется perf_counter и переводится в эпоху при выгрузке
+        self.epoch = time.time()
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self.dropped = 0
+        # Закрытая трасса не принимает спаны: завершена или не выбрана выборкой
+        self.closed = not recording
+
+
+class Span:
+    """Интервал внутри трассы"""
+
+    __slots__ = (
+        "trace", "span_id", "parent_id", "name", "kind", "remote", "tags", "start", "end", "task"
+    )
+
+    def __init__(
+        self,
+        trace: Trace,
+        span_id: str,
+        parent_id: Optional[str],
+        name: str,
+        start: float,
+        kind: Optional[str] = None,
+        remote: Optional[str] = None,
+    ):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.remote = remote
+        self.tags: dict[str, str] = {}
+        self.start = start
+        self.end: Optional[float] = None
+        # Задача, в которой открыт спан: события БД и Bot API из фоновых задач
+        # (очередь записи, рассылка) наследуют контекст, но апдейту не относятся
+        self.task = asyncio.current_task()
+
+    def tag(self, key: str, value: Any) -> None:
+        self.tags[key] = str(value)
+
+    def to_zipkin(self) -> dict[str, Any]:
+        trace = self.trace
+        end = self.end if self.end is not None else time.perf_counter()
+        span: dict[str, Any] = {
+            "traceId": trace.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int((trace.epoch + self.start - trace.origin) * 1_000_000),
+            "duration": max(1, int((end - self.start) * 1_000_000)),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        if self.kind:
+            span["kind"] = self.kind
+        if self.remote:
+            span["remoteEndpoint"] = {"serviceName": self.remote}
+        if self.tags:
+            span["tags"] = self.tags
+        return span
+
+
+class Tracer:
+    """Выборка трасс и запись в JSONL"""
+
+    def __init__(self, sample_rate: float, slow_ms: float, path: str):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000
+        self.path = path
+        self.exported = 0
+        self._random = random.Random()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_seconds > 0
+
+    def new_id(self, bits: int = 64) -> str:
+        return f"{self._random.getrandbits(bits):0{bits // 4}x}"
+
+    def start_trace(self) -> Trace:
+        """
+        Новая трасса.
+
+        Невыбранная трасса все равно становится текущей (закрытой), чтобы
+        вложенные спаны не открывали свои трассы.
+        """
+        sampled = self.sample_rate > 0 and self._random.random() < self.sample_rate
+        return Trace(self.new_id(128), sampled, recording=sampled or self.slow_seconds > 0)
+
+    def finish_trace(self, root: Span) -> None:
+        trace = root.trace
+        if trace.closed:
+            return
+        trace.closed = True
+        slow = self.slow_seconds and root.end - root.start >= self.slow_seconds
+        if not (trace.sampled or slow):
+            return
+        if slow:
+            root.tag("slow", "true")
+        if trace.dropped:
+            root.tag("dropped_spans", trace.dropped)
+        self.export(trace)
+        if slow:
+            logger.warning(
+                f"Slow {root.name}: {(root.end - root.start) * 1000:.0f}ms, "
+                f"trace {trace.trace_id}"
+            )
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps([span.to_zipkin() for span in trace.spans], ensure_ascii=False)
+        self.exported += 1
+        if not self.path:
+            logger.info(f"trace {line}")
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.error(f"Failed to write trace {trace.trace_id}: {e}")
+
+
+tracer = Tracer(settings.TRACE_SAMPLE_RATE, settings.TRACE_SLOW_MS, settings.TRACE_FILE)
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def _add_span(
+    parent: Span,
+    name: str,
+    start: float,
+    kind: Optional[str] = None,
+    remote: Optional[str] = None,
+) -> Optional[Span]:
+    trace = parent.trace
+    if len(trace.spans) >= MAX_SPANS:
+        trace.dropped += 1
+        return None
+    span = Span(trace, tracer.new_id(), parent.span_id, name, start, kind, remote)
+    trace.spans.append(span)
+    return span
+
+
+def _event_parent() -> Optional[Span]:
+    """Текущий спан, если событие (SQL, Bot API) произошло в его задаче"""
+    parent = _current.get()
+    if parent is None or parent.trace.closed or parent.task is not asyncio.current_task():
+        return None
+    return parent
+
+
+@contextmanager
+def trace_span(name: str, **tags: Any) -> Iterator[Optional[Span]]:
+    """
+    Спан вокруг блока кода.
+
+    Вне трассы открывает новую (корень), если ее выбрала выборка. Возвращает
+    None, когда трасса не собирается.
+    """
+    parent = _current.get()
+    if parent is None:
+        if not tracer.enabled:
+            yield None
+            return
+        trace = tracer.start_trace()
+        span = Span(trace, tracer.new_id(), None, name, time.perf_counter())
+        if trace.closed:
+            token = _current.set(span)
+            try:
+                yield None
+            finally:
+                _current.reset(token)
+            return
+        trace.spans.append(span)
+    elif parent.trace.closed:
+        # Трасса не выбрана или фоновая задача пережила апдейт, который ее запустил
+        yield None
+        return
+    else:
+        span = _add_span(parent, name, time.perf_counter())
+        if span is None:
+            yield None
+            return
+
+    for key, value in tags.items():
+        span.tag(key, value)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.tag("error", type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        span.end = time.perf_counter()
+        if parent is None:
+            tracer.finish_trace(span)
+
+
+@contextmanager
+def trace_update(update: Update) -> Iterator[Optional[Span]]:
+    """Спан обработки апдейта с id апдейта и пользователя"""
+    if not tracer.enabled:
+        yield None
+        return
+    with trace_span("update", update_id=update.update_id) as span:
+        if span is not None:
+            try:
+                span.tag("type", update.event_type)
+                user = getattr(update.event, "from_user", None)
+                if user is not None:
+                    span.tag("user_id", user.id)
+            except Exception:
+                pass  # неизвестный тип апдейта
+        yield span
+
+
+def handler_name(callback: Callable) -> str:
+    """Имя хендлера с модулем: cancel_edit есть и в admin, и в registration"""
+    module = getattr(callback, "__module__", None) or ""
+    name = getattr(callback, "__name__", None) or type(callback).__name__
+    return f"{module.rsplit('.', 1)[-1]}.{name}" if module else name
+
+
+class DispatchTracingMiddleware(BaseMiddleware):
+    """Спан подбора и выполнения хендлера (outer-middleware событий)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        parent = _current.get()
+        if parent is None or parent.trace.closed:
+            return await handler(event, data)
+        with trace_span(f"dispatch {type(event).__name__}") as span:
+            if span is not None:
+                span.tag("state", data.get("raw_state") or "none")
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """
+    Спан хендлера (inner-middleware событий).
+
+    Inner-middleware вызывается после того, как фильтры выбрали хендлер, поэтому
+    время от начала dispatch до этого момента — подбор хендлера фильтрами.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        parent = _current.get()
+        if parent is None or parent.trace.closed:
+            return await handler(event, data)
+        filters = _add_span(parent, "filters", parent.start)
+        if filters is not None:
+            filters.end = time.perf_counter()
+        with trace_span(f"handler {handler_name(data['handler'].callback)}"):
+            return await handler(event, data)
+
+
+class ApiTracingMiddleware(BaseRequestMiddleware):
+    """Спан каждого HTTP-запроса к Bot API (последний middleware сессии)"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        parent = _event_parent()
+        if parent is None:
+            return await make_request(bot, method)
+        span = _add_span(
+            parent, f"bot_api {method.__api_method__}", time.perf_counter(), "CLIENT", "telegram"
+        )
+        if span is None:
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            span.tag("chat_id", chat_id)
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            span.tag("error", type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Спаны SQL-запросов и сессий"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _event_parent()
+        span = None
+        if parent is not None:
+            operation = statement.lstrip()[:7].split(None, 1)[0].upper() if statement else ""
+            span = _add_span(parent, f"db {operation}", time.perf_counter(), "CLIENT", "sqlite")
+            if span is not None:
+                span.tag("sql", statement[:MAX_SQL_LENGTH])
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = conn.info["trace_spans"].pop()
+        if span is not None:
+            span.end = time.perf_counter()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection else None
+        if spans and context.cursor is not None:
+            span = spans.pop()
+            if span is not None:
+                span.tag("error", str(context.original_exception)[:200])
+                span.end = time.perf_counter()
+
+    # Сессия: от первого запроса (autobegin) до commit / rollback / close
+    @event.listens_for(Session, "after_transaction_create")
+    def _session_begin(session, transaction):
+        if transaction.parent is not None:
+            return
+        parent = _event_parent()
+        if parent is not None:
+            session.info["trace_span"] = _add_span(parent, "db.session", time.perf_counter())
+
+    @event.listens_for(Session, "after_transaction_end")
+    def _session_end(session, transaction):
+        if transaction.parent is not None:
+            return
+        span = session.info.pop("trace_span", None)
+        if span is not None:
+            span.end = time.perf_counter()
+
+
+def instrument_write_queue(write_queue: WriteQueue) -> None:
+    """Спан ожидания коммита очереди записи (сами запросы выполняет ее задача)"""
+    write_queue.wait_context = lambda count: trace_span("write_queue.wait", statements=count)
+
+
+def setup_tracing(
+    dp: Dispatcher, bot: Bot, engine: AsyncEngine, write_queue: WriteQueue
+) -> None:
+    """Подключить трассировку, если она включена настройками"""
+    if not tracer.enabled:
+        return
+    dispatch = DispatchTracingMiddleware()
+    handlers = HandlerTracingMiddleware()
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.outer_middleware(dispatch)
+            observer.middleware(handlers)
+    bot.session.middleware(ApiTracingMiddleware())
+    instrument_engine(engine)
+    instrument_write_queue(write_queue)
@@ -0,0 +1,108 @@
+"""
+Планировщик апдейтов с отдельной очередью на каждый чат.
+
+Апдейты одного чата обрабатываются строго по очереди (нет гонок в
+get_data/update_data при быстрых нажатиях), а разные чаты — параллельно
+с общим ограничением на число одновременно обрабатываемых апдейтов.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+def lane_key(update: Update) -> int:
+    """Ключ очереди апдейта: чат (или пользователь), иначе сам апдейт"""
+    context = UserContextMiddleware.resolve_event_context(update)
+    return context.chat_id or context.user_id or -update.update_id
+
+
+class ChatLaneScheduler:
+    """Очереди по чатам, обрабатываемые параллельно с общим лимитом"""
+
+    def __init__(
+        self,
+        process: Callable[[Update], Awaitable[object]],
+        max_concurrency: int,
+    ):
+        """
+        Args:
+            process: Обработчик одного апдейта (обычно dp.feed_update)
+            max_concurrency: Максимум апдейтов в обработке одновременно
+        """
+        self.process = process
+        self.max_concurrency = max_concurrency
+        self.processed = 0
+        self.failed = 0
+        self.max_lane_depth = 0
+        self._lanes: dict[int, deque[Update]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._queued = 0
+        self._dequeued = asyncio.Condition()
+
+    def submit(self, update: Update) -> None:
+        """Поставить апдейт в очередь его чата"""
+        key = lane_key(update)
+        self._queued += 1
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(update)
+            self.max_lane_depth = max(self.max_lane_depth, len(lane))
+            return
+
+        lane = self._lanes[key] = deque([update])
+        task = asyncio.create_task(self._run_lane(key, lane))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_lane(self, key: int, lane: deque[Update]) -> None:
+        try:
+            while lane:
+                # Апдейт остается в очереди до конца обработки — так он
+                # учитывается в глубине очереди
+                update = lane[0]
+                async with self._semaphore:
+                    self._in_flight += 1
+                    try:
+                        await self.process(update)
+                    except Exception as e:
+                        self.failed += 1
+                        logger.error(f"Update {update.update_id} failed: {e}")
+                    finally:
+                        self._in_flight -= 1
+                        self.processed += 1
+                lane.popleft()
+                self._queued -= 1
+                async with self._dequeued:
+                    self._dequeued.notify_all()
+        finally:
+            del self._lanes[key]
+
+    async def wait_below(self, limit: int) -> None:
+        """Дождаться, пока в очередях (включая обрабатываемые) станет меньше limit апдейтов"""
+        async with self._dequeued:
+            await self._dequeued.wait_for(lambda: self._queued < limit)
+
+    async def join(self) -> None:
+        """Дождаться обработки всех поставленных апдейтов"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def stats(self) -> dict[str, int]:
+        """Метрики очередей"""
+        return {
+            "lanes": len(self._lanes),
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+            "max_lane_depth": self.max_lane_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -1,5 +1,7 @@
 import re
-from typing import Optional
+from typing import Mapping, Optional
+
+from options import EVENTS, INTERESTS
 
 
 class ValidationError(Exception):
@@ -129,25 +131,11 @@ def validate_about(text: str) -> Optional[str]:
     return text
 
 
-def get_interest_names() -> dict[str, str]:
+def get_interest_names() -> Mapping[str, str]:
     """Получить маппинг callback_data -> название интереса"""
-    return {
-        "interest_investments": "Инвестиции",
-        "interest_career": "Карьерное развитие",
-        "interest_business": "Предпринимательство и бизнес",
-        "interest_economy": "Экономика",
-        "interest_marketing": "Маркетинг",
-        "interest_art": "Искусство",
-        "interest_sport": "Спорт",
-    }
-
-
-def get_event_names() -> dict[str, str]:
+    return INTERESTS.names
+
+
+def get_event_names() -> Mapping[str, str]:
     """Получить маппинг callback_data -> название типа мероприятия"""
-    return {
-        "event_business": "Деловые",
-        "event_educational": "Обучающие",
-        "event_sport": "Спортивные",
-        "event_cultural": "Культурные",
-        "event_gastronomic": "Гастрономические",
-    }
+    return EVENTS.names
@@ -0,0 +1,79 @@
+"""
+Ответ на апдейт прямо в HTTP-ответе вебхука.
+
+Telegram позволяет вернуть в ответе на вебхук один вызов Bot API. Пока идет
+обработка апдейта, первый подходящий вызов (answerCallbackQuery) не отправляется,
+а сохраняется и возвращается телом ответа функции — минус один исходящий
+HTTPS-запрос на каждый callback.
+"""
+
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+# Методы, результат которых известен заранее (True), — их можно не отправлять
+REPLYABLE_METHODS = (AnswerCallbackQuery,)
+
+# Список для перехваченного вызова (None — перехват выключен)
+_captured: ContextVar[Optional[list[TelegramMethod]]] = ContextVar(
+    "webhook_reply_captured", default=None
+)
+
+
+class WebhookReplyMiddleware(BaseRequestMiddleware):
+    """Перехватывает первый подходящий вызов Bot API внутри capture_webhook_reply()"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        captured = _captured.get()
+        if captured is None or not isinstance(method, REPLYABLE_METHODS):
+            return await make_request(bot, method)
+
+        if not captured:
+            captured.append(method)
+            return True
+        # Повторный ответ на тот же callback (например, alert после пустого
+        # answer()) — Telegram примет только один, поэтому оставляем последний
+        if (
+            isinstance(method, AnswerCallbackQuery)
+            and isinstance(captured[0], AnswerCallbackQuery)
+            and method.callback_query_id == captured[0].callback_query_id
+        ):
+            captured[0] = method
+            return True
+        return await make_request(bot, method)
+
+
+@contextmanager
+def capture_webhook_reply() -> Iterator[list[TelegramMethod]]:
+    """Включить перехват на время обработки одного апдейта"""
+    captured: list[TelegramMethod] = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+def webhook_reply_response(method: TelegramMethod) -> dict:
+    """Ответ функции с вызовом Bot API в теле"""
+    payload = method.model_dump(exclude_none=True, mode="json")
+    payload["method"] = method.__api_method__
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(payload, ensure_ascii=False),
+    }
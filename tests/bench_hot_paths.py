@@ -0,0 +1,413 @@
+"""
+Микробенчмарки горячих путей обработки апдейта.
+
+Каждый путь вызывается в цикле, число вызовов подбирается так, чтобы один замер
+длился не меньше --min-time; из --repeat замеров берется медиана времени на
+вызов. Пути:
+
+    validators.*   validate_full_name / validate_city / validate_about
+    keyboards.*    клавиатуры выбора (из кэша и сборка заново), меню правки
+    templates.*    компиляция и подстановка шаблона, get_text_template
+    update.*       json.loads + Update.model_validate, как в main.handler
+    repo.user.*    каждый метод UserRepository
+    repo.text.*    каждый метод TextTemplateRepository
+
+Репозитории работают с временной SQLite-БД (1000 пользователей), каждый вызов —
+в своей сессии, как в обработчиках. Запись по умолчанию напрямую, без очереди
+группового коммита (она добавляет задержку сбора пачки): --write-queue включает ее.
+
+Результаты сохраняются в JSON и сравниваются с сохраненной базой:
+    python tests/bench_hot_paths.py
+    python tests/bench_hot_paths.py --save tests/baselines/hot_paths.json
+    python tests/bench_hot_paths.py --compare tests/baselines/hot_paths.json --threshold 20
+    python tests/bench_hot_paths.py --filter repo.user
+
+В режиме --compare код выхода 1, если хоть один путь медленнее базы больше чем на
+--threshold процентов (по умолчанию сравнивается минимальное время вызова —
+оно меньше всего зависит от фоновой нагрузки). Базу стоит снимать на той же
+машине; на общих виртуальных машинах разброс между запусками доходит до 30–50%,
+там порог нужно поднимать.
+"""
+
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+SEED_USERS = 1000
+# Пользователи, которых меняют бенчмарки записи (читающие пути их не видят)
+SCRATCH_USERS = 200
+FIRST_USER_ID = 1_000_000
+
+
+class Benchmark(NamedTuple):
+    """Измеряемый путь: функция без аргументов (обычная или async)"""
+
+    name: str
+    func: Callable[[], Any]
+
+
+def configure_environment() -> str:
+    """Временная БД и фиктивный токен — до импорта модулей бота"""
+    directory = tempfile.mkdtemp(prefix="bench_hot_paths_")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+    return directory
+
+
+async def seed_database() -> None:
+    from sqlalchemy import insert
+
+    from database import engine, User
+    from database.bootstrap import prepare_database
+    from utils.text_templates import template_cache
+
+    await prepare_database()
+    now = datetime.utcnow()
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(User),
+            [
+                {
+                    "id": FIRST_USER_ID + i,
+                    "username": f"user{i}",
+                    "first_name": "Иван",
+                    "last_name": "Петров",
+                    "city": ("Москва", "Казань", "Самара")[i % 3],
+                    "interests_mask": i % 128,
+                    "events_mask": i % 32,
+                    "about": "Люблю конференции, инвестиции и новые знакомства",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(SEED_USERS + SCRATCH_USERS)
+            ],
+        )
+    await template_cache.warm()
+
+
+def sync_benchmarks() -> list[Benchmark]:
+    from aiogram.types import Update
+
+    from keyboards.registration import (
+        _selection_keyboard,
+        get_edit_profile_keyboard,
+        update_interests_keyboard,
+    )
+    from options import INTERESTS
+    from utils.text_templates import compile_template
+    from utils.validators import validate_about, validate_city, validate_full_name
+
+    masks = itertools.cycle(range(INTERESTS.full_mask + 1))
+    template = "👋 Привет, <b>{first_name}</b>!\n\nГород: {city}\nИнтересы: {interests}"
+    compiled = compile_template(template)
+    message_body = json.dumps(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 1700000000,
+                "chat": {"id": 42, "type": "private"},
+                "from": {"id": 42, "is_bot": False, "first_name": "Иван"},
+                "text": "Иван Петров",
+            },
+        }
+    )
+    callback_body = json.dumps(
+        {
+            "update_id": 2,
+            "callback_query": {
+                "id": "1",
+                "from": {"id": 42, "is_bot": False, "first_name": "Иван"},
+                "chat_instance": "42",
+                "data": "interest_investments",
+                "message": {
+                    "message_id": 2,
+                    "date": 1700000000,
+                    "chat": {"id": 42, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "Bot"},
+                    "text": "Какими сферами вы интересуетесь?",
+                },
+            },
+        }
+    )
+
+    return [
+        Benchmark("validators.full_name", lambda: validate_full_name("  иван   петров ")),
+        Benchmark("validators.city", lambda: validate_city("  нижний   новгород ")),
+        Benchmark(
+            "validators.about",
+            lambda: validate_about("Люблю конференции, инвестиции и новые знакомства " * 4),
+        ),
+        Benchmark("keyboards.selection_cached", lambda: update_interests_keyboard(next(masks))),
+        Benchmark(
+            "keyboards.selection_build",
+            lambda: _selection_keyboard.__wrapped__(INTERESTS, next(masks)),
+        ),
+        Benchmark("keyboards.edit_profile_build", get_edit_profile_keyboard.__wrapped__),
+        Benchmark("templates.compile", lambda: compile_template.__wrapped__(template)),
+        Benchmark(
+            "templates.render",
+            lambda: compiled.render({"first_name": "Иван", "city": "Москва"}),
+        ),
+        Benchmark(
+            "update.parse_message", lambda: Update.model_validate(json.loads(message_body))
+        ),
+        Benchmark(
+            "update.parse_callback", lambda: Update.model_validate(json.loads(callback_body))
+        ),
+    ]
+
+
+def async_benchmarks() -> list[Benchmark]:
+    from database import async_session_maker, TextTemplateRepository, UserRepository
+    from options import EVENTS, INTERESTS
+    from utils.text_templates import get_text_template
+
+    existing = itertools.cycle(range(FIRST_USER_ID, FIRST_USER_ID + SEED_USERS))
+    scratch = itertools.cycle(
+        range(FIRST_USER_ID + SEED_USERS, FIRST_USER_ID + SEED_USERS + SCRATCH_USERS)
+    )
+    new_ids = itertools.count(FIRST_USER_ID + SEED_USERS + SCRATCH_USERS)
+    some_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + 100))
+    text_keys = itertools.count()
+    interests = INTERESTS.bits["interest_investments"] | INTERESTS.bits["interest_art"]
+    events = EVENTS.bits["event_business"]
+
+    def user_repo(call: Callable[[UserRepository], Any]):
+        async def run():
+            async with async_session_maker() as session:
+                return await call(UserRepository(session))
+
+        return run
+
+    def text_repo(call: Callable[[TextTemplateRepository], Any]):
+        async def run():
+            async with async_session_maker() as session:
+                return await call(TextTemplateRepository(session))
+
+        return run
+
+    async def export_pages(repo: UserRepository) -> int:
+        count = cursor = 0
+        while rows := await repo.get_rows_page(["id", "first_name", "city"], cursor):
+            count += len(rows)
+            cursor = rows[-1].id
+        return count
+
+    async def create_and_delete(repo: TextTemplateRepository) -> bool:
+        key = f"bench_{next(text_keys)}"
+        await repo.create_or_update(key, "Бенчмарк", "Привет, {first_name}!")
+        return await repo.delete(key)
+
+    return [
+        Benchmark(
+            "templates.get_text_template",
+            lambda: get_text_template("welcome_new", first_name="Иван"),
+        ),
+        Benchmark("repo.user.get_by_id", user_repo(lambda r: r.get_by_id(next(existing)))),
+        Benchmark("repo.user.create", user_repo(lambda r: r.create(next(new_ids), "new", "Новый"))),
+        Benchmark(
+            "repo.user.update",
+            user_repo(lambda r: r.update(next(scratch), city="Москва", about="Обновил анкету")),
+        ),
+        Benchmark(
+            "repo.user.get_or_create",
+            user_repo(lambda r: r.get_or_create(next(existing), "user", "Иван")),
+        ),
+        Benchmark(
+            "repo.user.create_or_reset",
+            user_repo(lambda r: r.create_or_reset(next(new_ids), "new", "Новый")),
+        ),
+        Benchmark("repo.user.reset_profile", user_repo(lambda r: r.reset_profile(next(scratch)))),
+        Benchmark(
+            "repo.user.get_profiles_page",
+            user_repo(lambda r: r.get_profiles_page(FIRST_USER_ID, 100)),
+        ),
+        Benchmark("repo.user.get_by_ids", user_repo(lambda r: r.get_by_ids(some_ids))),
+        Benchmark(
+            "repo.user.find_by_options",
+            user_repo(lambda r: r.find_by_options(interests, events, limit=100)),
+        ),
+        Benchmark(
+            "repo.user.count_by_options",
+            user_repo(lambda r: r.count_by_options(interests, events)),
+        ),
+        Benchmark(
+            "repo.user.count_per_option",
+            user_repo(lambda r: r.count_per_option("interests_mask")),
+        ),
+        Benchmark("repo.user.get_rows_page", user_repo(export_pages)),
+        Benchmark("repo.text.get_by_key", text_repo(lambda r: r.get_by_key("welcome_new"))),
+        Benchmark("repo.text.get_all", text_repo(lambda r: r.get_all())),
+        Benchmark(
+            "repo.text.create_missing",
+            text_repo(
+                lambda r: r.create_missing(
+                    [{"key": "welcome_new", "title": "—", "content": "—"}]
+                )
+            ),
+        ),
+        Benchmark("repo.text.create_or_update_delete", text_repo(create_and_delete)),
+    ]
+
+
+async def measure(bench: Benchmark, min_time: float, repeat: int) -> dict:
+    """Медиана и минимум времени одного вызова, мкс"""
+    # Первый вызов — прогрев и заодно проверка, async ли путь
+    result = bench.func()
+    is_async = inspect.isawaitable(result)
+    if is_async:
+        await result
+
+    async def run(number: int) -> float:
+        started = time.perf_counter()
+        if is_async:
+            for _ in range(number):
+                await bench.func()
+        else:
+            func = bench.func
+            for _ in range(number):
+                func()
+        return time.perf_counter() - started
+
+    # Подбор числа вызовов: удваиваем, пока замер не станет длиннее min_time
+    number = 1
+    while (elapsed := await run(number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    timings = [elapsed / number] + [await run(number) / number for _ in range(repeat - 1)]
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "calls": number,
+    }
+
+
+def load_baseline(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(path: str, results: dict[str, dict], args) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.node(),
+            "write_queue": args.write_queue,
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"\nБаза сохранена: {path}")
+
+
+def compare(
+    results: dict[str, dict], baseline: dict, threshold: float, metric: str
+) -> list[str]:
+    """Таблица сравнения; возвращает имена путей, замедлившихся больше порога"""
+    key = f"{metric}_us"
+    meta = baseline.get("meta", {})
+    if meta.get("machine") not in (None, platform.node()):
+        print(f"⚠️ База снята на другой машине ({meta['machine']}) — сравнение условное")
+
+    base_results = baseline.get("results", {})
+    regressions = []
+    print(f"\n{'путь':<38} {'база мкс':>10} {'сейчас мкс':>11} {'изменение':>10}")
+    for name, current in results.items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<38} {'—':>10} {current[key]:>11.2f} {'новый':>10}")
+            continue
+        change = (current[key] / base[key] - 1) * 100
+        mark = ""
+        if change > threshold:
+            regressions.append(name)
+            mark = " ❌"
+        print(
+            f"{name:<38} {base[key]:>10.2f} {current[key]:>11.2f} "
+            f"{change:>+9.1f}%{mark}"
+        )
+    return regressions
+
+
+async def run(args) -> int:
+    configure_environment()
+
+    from database import engine, write_queue
+
+    write_queue.enabled = args.write_queue
+    await seed_database()
+
+    benchmarks = sync_benchmarks() + async_benchmarks()
+    if args.filter:
+        benchmarks = [b for b in benchmarks if any(f in b.name for f in args.filter)]
+
+    results: dict[str, dict] = {}
+    print(f"{'путь':<38} {'медиана мкс':>12} {'мин мкс':>10} {'вызовов':>8}")
+    for bench in benchmarks:
+        result = await measure(bench, args.min_time, args.repeat)
+        results[bench.name] = result
+        print(
+            f"{bench.name:<38} {result['median_us']:>12.2f} {result['min_us']:>10.2f} "
+            f"{result['calls']:>8}"
+        )
+    await engine.dispose()
+
+    if args.save:
+        save_results(args.save, results, args)
+    if args.compare:
+        regressions = compare(
+            results, load_baseline(args.compare), args.threshold, args.metric
+        )
+        if regressions:
+            print(
+                f"\n❌ Медленнее базы больше чем на {args.threshold:g}%: "
+                + ", ".join(regressions)
+            )
+            return 1
+        print(f"\n✅ Регрессий больше {args.threshold:g}% нет")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--save", metavar="PATH", help="сохранить результаты как базу (JSON)")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с базой (JSON)")
+    parser.add_argument(
+        "--threshold", type=float, default=20, help="допустимое замедление, %% (по умолчанию 20)"
+    )
+    parser.add_argument(
+        "--metric",
+        choices=("min", "median"),
+        default="min",
+        help="что сравнивать с базой: минимум меньше зависит от фоновой нагрузки",
+    )
+    parser.add_argument("--filter", nargs="+", help="только пути, содержащие подстроку")
+    parser.add_argument("--min-time", type=float, default=0.05, help="длительность замера, с")
+    parser.add_argument("--repeat", type=int, default=5, help="число замеров")
+    parser.add_argument(
+        "--write-queue", action="store_true", help="писать через очередь группового коммита"
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,195 @@
+"""
+Бенчмарк профилей хранения SQLite.
+
+Для каждого профиля из database.engine.STORAGE_PROFILES создается отдельная БД,
+и N виртуальных пользователей одновременно проходят регистрацию в том же
+соотношении чтений и записей, что и бот:
+
+    /start          get_or_create + чтение FSM + чтение шаблона
+    имя, город      чтение FSM + запись FSM (x2)
+    интересы        3 переключения (чтение + запись FSM) + подтверждение
+    мероприятия     2 переключения + подтверждение
+    о себе          запись анкеты (UPDATE) + 2 чтения шаблонов + сброс FSM
+
+Запуск из корня репозитория:
+    python tests/bench_storage_profiles.py
+    python tests/bench_storage_profiles.py --users 10 50 --profiles durable throughput
+    python tests/bench_storage_profiles.py --write-queue   # с групповым коммитом
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+from database.engine import STORAGE_PROFILES, create_engine  # noqa: E402
+from database.models import Base  # noqa: E402
+from database.repository import UserRepository, TextTemplateRepository  # noqa: E402
+from database.fsm_storage import SQLiteStorage  # noqa: E402
+from database.write_queue import write_queue  # noqa: E402
+
+from stats import percentile  # noqa: E402
+
+BOT_ID = 1
+
+
+class Recorder:
+    """Собирает длительности операций по типам (мс)"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors = 0
+
+    async def measure(self, kind: str, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.samples[kind].append((time.perf_counter() - started) * 1000)
+
+    def all(self) -> list[float]:
+        return [v for values in self.samples.values() for v in values]
+
+
+async def registration(
+    user_id: int,
+    session_maker: async_sessionmaker,
+    storage: SQLiteStorage,
+    rec: Recorder,
+):
+    key = StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+
+    async def read_template(name: str):
+        async with session_maker() as session:
+            return await TextTemplateRepository(session).get_by_key(name)
+
+    async def get_or_create():
+        async with session_maker() as session:
+            return await UserRepository(session).get_or_create(user_id, f"u{user_id}", "Tg")
+
+    async def fsm_step(**data):
+        current = await storage.get_data(key)
+        current.update(data)
+        await storage.set_data(key, current)
+        await storage.set_state(key, f"step_{len(current)}")
+
+    async def save_profile():
+        async with session_maker() as session:
+            return await UserRepository(session).update(
+                user_id,
+                first_name="Иван",
+                last_name="Иванов",
+                city="Москва",
+                interests_mask=0b1000001,
+                events_mask=0b1,
+                about="Люблю конференции и новые знакомства",
+            )
+
+    await rec.measure("read", get_or_create())
+    await rec.measure("read", storage.get_state(key))
+    await rec.measure("read", read_template("welcome_new"))
+    await rec.measure("write", fsm_step(first_name="Иван", last_name="Иванов"))
+    await rec.measure("write", fsm_step(city="Москва"))
+    for i in range(3):
+        await rec.measure("write", fsm_step(interests_mask=(1 << (i + 1)) - 1))
+    for i in range(2):
+        await rec.measure("write", fsm_step(events_mask=(1 << (i + 1)) - 1))
+    await rec.measure("write", save_profile())
+    await rec.measure("read", read_template("status_diamond"))
+    await rec.measure("read", read_template("event_invitation"))
+    await rec.measure("write", storage.set_state(key, None))
+    await rec.measure("write", storage.set_data(key, {}))
+
+
+async def run_profile(profile: str, users: int, use_write_queue: bool) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench_")
+    path = os.path.join(directory, "bench.db")
+    engine = create_engine(f"sqlite+aiosqlite:///{path}", profile=profile)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    # Репозитории пишут через глобальную очередь — направляем ее в БД бенчмарка
+    write_queue.engine = engine
+    write_queue.enabled = use_write_queue
+    commits_before = write_queue.commits
+    storage = SQLiteStorage(session_maker=session_maker, write_queue=write_queue)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        await TextTemplateRepository(session).create_missing(
+            [
+                {"key": key, "title": key, "content": "Привет, {first_name}!"}
+                for key in ("welcome_new", "status_diamond", "event_invitation")
+            ]
+        )
+
+    rec = Recorder()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(registration(1000 + i, session_maker, storage, rec) for i in range(users)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    samples = rec.all()
+    return {
+        "profile": profile,
+        "users": users,
+        "ops": len(samples),
+        "ops_per_s": len(samples) / elapsed if elapsed else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "write_p99": percentile(rec.samples["write"], 99),
+        "read_p99": percentile(rec.samples["read"], 99),
+        "mean": statistics.fmean(samples) if samples else 0.0,
+        "failed_users": failed,
+        "group_commits": write_queue.commits - commits_before,
+    }
+
+
+def print_row(row: dict):
+    print(
+        f"{row['profile']:<14} {row['users']:>5} {row['ops_per_s']:>9.0f} "
+        f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f} "
+        f"{row['read_p99']:>9.1f} {row['write_p99']:>9.1f} {row['failed_users']:>6} "
+        f"{row['group_commits']:>7}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 120, 500])
+    parser.add_argument(
+        "--profiles", nargs="+", default=list(STORAGE_PROFILES), choices=list(STORAGE_PROFILES)
+    )
+    parser.add_argument(
+        "--write-queue", action="store_true", help="писать через очередь группового коммита"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'profile':<14} {'users':>5} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'read p99':>9} {'write p99':>9} {'failed':>6} {'commits':>7}"
+    )
+    for users in args.users:
+        for profile in args.profiles:
+            print_row(await run_profile(profile, users, args.write_queue))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Локальный стенд Telegram Bot API для нагрузочных тестов.
+
+aiohttp-сервер принимает запросы бота по адресу /bot<token>/<method>, записывает
+каждый вызов (метод, чат, время прихода) и отвечает правдоподобным результатом:
+sendMessage / edit* возвращают сообщение, остальные методы — True. getUpdates
+отдает апдейты, поставленные через push_update (для проверки polling-режима).
+
+Можно добавить задержку ответа (как у настоящего API) и случайные 429, чтобы
+проверить повторы отправки.
+
+Бот направляется на стенд переменной окружения TELEGRAM_API_URL.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from typing import Any, NamedTuple, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+
+class ApiCall(NamedTuple):
+    """Записанный вызов Bot API"""
+
+    method: str
+    chat_id: Optional[int]
+    received_at: float
+    text: Optional[str]
+    status: int
+
+
+class FakeBotAPI:
+    """Стенд Bot API в том же процессе"""
+
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            latency: Задержка каждого ответа, сек
+            flood_rate: Доля send*/edit* вызовов, на которые отвечать 429
+            seed: Зерно генератора для повторяемости 429
+        """
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.calls: list[ApiCall] = []
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1000)
+        self._updates: asyncio.Queue = asyncio.Queue()
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер; возвращает базовый адрес для TELEGRAM_API_URL"""
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        # port=0 — свободный порт, выбранный ОС
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def push_update(self, update: dict) -> None:
+        """Поставить апдейт в очередь getUpdates"""
+        self._updates.put_nowait(update)
+
+    def calls_by_method(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for call in self.calls:
+            counts[call.method] = counts.get(call.method, 0) + 1
+        return counts
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout or 0.01))
+        except asyncio.TimeoutError:
+            return []
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def _message(self, chat_id: Optional[int], text: Optional[str]) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id or 0, "type": "private"},
+            "from": BOT_USER,
+            "text": text or "",
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        received_at = time.perf_counter()
+        method = request.match_info["method"]
+        params: dict[str, Any] = dict(await request.post())
+        if not params and request.query:
+            params = dict(request.query)
+        chat_id = params.get("chat_id")
+        chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else None
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        lowered = method.lower()
+        sends = lowered.startswith(("send", "edit"))
+        if sends and self.flood_rate and self._random.random() < self.flood_rate:
+            self.calls.append(ApiCall(method, chat_id, received_at, params.get("text"), 429))
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                },
+                status=429,
+            )
+
+        if lowered == "getupdates":
+            result: Any = await self._get_updates(params)
+        elif lowered == "getme":
+            result = BOT_USER
+        elif sends:
+            result = self._message(chat_id, params.get("text"))
+        else:
+            result = True
+
+        self.calls.append(ApiCall(method, chat_id, received_at, params.get("text"), 200))
+        return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,463 @@
+"""
+Нагрузочный тест регистрации.
+
+N виртуальных пользователей одновременно проходят регистрацию целиком через
+настоящий бот (main.handler или polling-цикл), а все вызовы Bot API уходят на
+локальный стенд tests/fake_bot_api.py — сеть и токен не нужны:
+
+    /start -> имя -> город -> 3 интереса -> подтверждение
+           -> 2 типа мероприятий -> подтверждение -> «О себе» (текст или пропуск)
+
+Для каждого уровня нагрузки печатается:
+  * пропускная способность (апдейтов и регистраций в секунду);
+  * p50 / p95 / p99 по каждому шагу сценария;
+  * вызовы Bot API по методам, их время и ответы 429;
+  * запросы записи в БД: время, долгие (ожидание блокировки SQLite) и ошибки
+    «database is locked»;
+  * ошибки обработчиков и незавершенные регистрации.
+
+Код выхода 1, если были ошибки или кто-то не завершил регистрацию.
+
+Запуск из корня репозитория:
+    python tests/load_test.py
+    python tests/load_test.py --users 120 --think 2 --ramp 30
+    python tests/load_test.py --mode polling
+    python tests/load_test.py --api-latency 0.05 --flood-rate 0.01
+    python tests/load_test.py --no-rate-limit      # без пауз лимитов Telegram
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from stats import percentile  # noqa: E402
+
+# Порог, после которого запрос записи считается ждавшим блокировку БД, мс
+LOCK_WAIT_THRESHOLD_MS = 100
+
+FIRST_USER_ID = 100_000
+
+
+def configure_environment(api_url: str, database_url: Optional[str], no_rate_limit: bool):
+    """Переменные окружения бота — до импорта main и config"""
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="load_test_")
+        database_url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bot.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["TELEGRAM_API_URL"] = api_url
+    os.environ.setdefault("BOT_TOKEN", "123456:LOAD-TEST")
+    if no_rate_limit:
+        for name in ("RATE_GLOBAL_PER_SEC", "RATE_CHAT_PER_SEC", "RATE_CHAT_BURST"):
+            os.environ[name] = "1000000"
+    return database_url
+
+
+class UpdateFactory:
+    """Апдейты Telegram от имени виртуальных пользователей"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Тест", "username": f"load{user_id}"}
+
+    def message(self, user_id: int, text: str) -> dict:
+        update_id = next(self._ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+            ]
+        return {"update_id": update_id, "message": message}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "LoadTestBot"},
+                    "text": "...",
+                },
+            },
+        }
+
+
+def registration_steps(
+    factory: UpdateFactory, user_id: int, rnd: random.Random
+) -> list[tuple[str, dict]]:
+    """Шаги полной регистрации: (название шага, апдейт)"""
+    from options import EVENTS, INTERESTS
+
+    steps = [
+        ("start", factory.message(user_id, "/start")),
+        ("name", factory.message(user_id, "Иван Петров")),
+        ("city", factory.message(user_id, rnd.choice(["Москва", "Казань", "Самара"]))),
+    ]
+    for option in rnd.sample(INTERESTS.options, 3):
+        steps.append(("interest_toggle", factory.callback(user_id, option.callback_data)))
+    steps.append(("interests_confirm", factory.callback(user_id, INTERESTS.confirm_callback)))
+    for option in rnd.sample(EVENTS.options, 2):
+        steps.append(("event_toggle", factory.callback(user_id, option.callback_data)))
+    steps.append(("events_confirm", factory.callback(user_id, EVENTS.confirm_callback)))
+    if rnd.random() < 0.5:
+        steps.append(("about", factory.message(user_id, "Люблю конференции и новые знакомства")))
+    else:
+        steps.append(("skip_about", factory.callback(user_id, "skip_about")))
+    return steps
+
+
+class Metrics:
+    """Длительности шагов, вызовов Bot API и запросов к БД"""
+
+    def __init__(self):
+        self.steps: dict[str, list[float]] = defaultdict(list)
+        self.step_errors: dict[str, int] = defaultdict(int)
+        self.api: dict[str, list[float]] = defaultdict(list)
+        self.db_writes: list[float] = []
+        self.db_reads: list[float] = []
+        self.db_locked = 0
+        self.log_errors = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+
+class ErrorCounter(logging.Handler):
+    """Считает записи логов уровня ERROR и выше"""
+
+    def __init__(self, metrics: Metrics):
+        super().__init__(logging.ERROR)
+        self.metrics = metrics
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.metrics.log_errors += 1
+
+
+def attach_db_monitor(engine, metrics: Metrics) -> None:
+    """
+    Время каждого запроса к БД.
+
+    Ожидание блокировки SQLite происходит внутри execute (busy_timeout), поэтому
+    долгие запросы записи — это и есть ожидание другого писателя.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("load_test_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info["load_test_started"].pop()) * 1000
+        is_write = statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE", "REPLAC")
+        (metrics.db_writes if is_write else metrics.db_reads).append(elapsed)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(context):
+        if context.cursor is not None and context.connection is not None:
+            started = context.connection.info.get("load_test_started")
+            if started:
+                started.pop()
+        if "locked" in str(context.original_exception):
+            metrics.db_locked += 1
+
+
+def api_timer(metrics: Metrics):
+    """Middleware сессии бота: время каждого вызова Bot API"""
+    from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+    class ApiTimer(BaseRequestMiddleware):
+        async def __call__(self, make_request, bot, method):
+            started = time.perf_counter()
+            try:
+                return await make_request(bot, method)
+            finally:
+                name = type(method).__name__
+                metrics.api[name].append((time.perf_counter() - started) * 1000)
+
+    return ApiTimer()
+
+
+def handler_sender(main) -> Callable[[dict], Awaitable[bool]]:
+    """Отправка апдейта через main.handler (как вебхук Cloud Functions)"""
+
+    async def send(update: dict) -> bool:
+        response = await main.handler({"body": json.dumps(update)}, None)
+        return response["statusCode"] == 200
+
+    return send
+
+
+def polling_sender(main, api: FakeBotAPI) -> tuple[Callable[[dict], Awaitable[bool]], Callable]:
+    """
+    Отправка апдейта через getUpdates стенда в polling-цикл main.
+
+    Шаг завершен, когда диспетчер закончил обработку апдейта.
+    """
+    from aiogram import BaseMiddleware
+
+    waiting: dict[int, asyncio.Future] = {}
+
+    class CompletionMiddleware(BaseMiddleware):
+        async def __call__(self, handler, event, data):
+            ok = False
+            try:
+                result = await handler(event, data)
+                ok = True
+                return result
+            finally:
+                future = waiting.pop(event.update_id, None)
+                if future is not None and not future.done():
+                    future.set_result(ok)
+
+    main.dp.update.outer_middleware(CompletionMiddleware())
+    polling = asyncio.create_task(main._poll_updates(polling_timeout=1))
+
+    async def send(update: dict) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        waiting[update["update_id"]] = future
+        api.push_update(update)
+        try:
+            return await asyncio.wait_for(future, timeout=120)
+        except asyncio.TimeoutError:
+            waiting.pop(update["update_id"], None)
+            return False
+
+    async def stop():
+        polling.cancel()
+        try:
+            await polling
+        except asyncio.CancelledError:
+            pass
+
+    return send, stop
+
+
+async def virtual_user(
+    steps: list[tuple[str, dict]],
+    send: Callable[[dict], Awaitable[bool]],
+    metrics: Metrics,
+    think: float,
+    delay: float,
+    rnd: random.Random,
+) -> None:
+    await asyncio.sleep(delay)
+    for step, update in steps:
+        if think:
+            await asyncio.sleep(rnd.uniform(0.5, 1.5) * think)
+        started = time.perf_counter()
+        try:
+            ok = await send(update)
+        except Exception:
+            ok = False
+        metrics.steps[step].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            metrics.step_errors[step] += 1
+
+
+async def completed_registrations(user_ids: list[int]) -> int:
+    """Сколько пользователей из списка сохранили анкету"""
+    from database import async_session_maker, UserRepository
+
+    async with async_session_maker() as session:
+        users = await UserRepository(session).get_by_ids(user_ids)
+    return sum(
+        1
+        for user in users.values()
+        if user.first_name and user.city and user.interests_mask and user.events_mask
+    )
+
+
+def print_report(
+    title: str,
+    elapsed: float,
+    users: int,
+    completed: int,
+    metrics: Metrics,
+    api: FakeBotAPI,
+    api_calls_before: int,
+    extra: dict,
+) -> None:
+    updates = sum(len(v) for v in metrics.steps.values())
+    step_errors = sum(metrics.step_errors.values())
+    print(f"\n=== {title} ===")
+    print(
+        f"Время: {elapsed:.2f} с, апдейтов: {updates} ({updates / elapsed:.1f}/с), "
+        f"регистраций: {completed}/{users} ({completed / elapsed:.2f}/с)"
+    )
+    print(f"{'шаг':<18} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'ошибок':>7}")
+    for step, samples in metrics.steps.items():
+        print(
+            f"{step:<18} {len(samples):>6} {percentile(samples, 50):>8.1f} "
+            f"{percentile(samples, 95):>8.1f} {percentile(samples, 99):>8.1f} "
+            f"{max(samples):>8.1f} {metrics.step_errors.get(step, 0):>7}"
+        )
+
+    calls = api.calls[api_calls_before:]
+    flood = sum(1 for call in calls if call.status == 429)
+    api_samples = [v for values in metrics.api.values() for v in values]
+    by_method = ", ".join(
+        f"{name}={len(values)}" for name, values in sorted(metrics.api.items())
+    )
+    print(
+        f"Bot API: вызовов {len(calls)} ({by_method}), p50 {percentile(api_samples, 50):.1f} мс, "
+        f"p99 {percentile(api_samples, 99):.1f} мс, ответов 429: {flood}"
+    )
+
+    writes = metrics.db_writes
+    lock_waits = sum(1 for v in writes if v >= LOCK_WAIT_THRESHOLD_MS)
+    print(
+        f"БД: чтений {len(metrics.db_reads)} (p99 {percentile(metrics.db_reads, 99):.1f} мс), "
+        f"записей {len(writes)} (p50 {percentile(writes, 50):.1f} мс, "
+        f"p99 {percentile(writes, 99):.1f} мс, max {max(writes, default=0):.1f} мс), "
+        f"ожиданий блокировки >{LOCK_WAIT_THRESHOLD_MS} мс: {lock_waits}, "
+        f"«database is locked»: {metrics.db_locked}"
+    )
+    print(
+        "Очередь записи: "
+        f"коммитов {extra['commits']}, запросов {extra['statements']}; "
+        f"отправка: отложено {extra['send_waits']}, повторов после 429 {extra['send_retries']}"
+    )
+    print(f"Ошибок: шагов {step_errors}, в логах {metrics.log_errors}")
+
+
+async def run(args) -> int:
+    api = FakeBotAPI(latency=args.api_latency, flood_rate=args.flood_rate, seed=args.seed)
+    api_url = await api.start()
+    database_url = configure_environment(api_url, args.database_url, args.no_rate_limit)
+
+    # Логи бота (INFO на каждый апдейт) только мешают отчету
+    logging.basicConfig(level=logging.WARNING)
+    import main
+    from database import engine, write_queue
+    from utils.rate_limiter import send_limiter
+
+    logging.getLogger().setLevel(logging.WARNING)
+    metrics = Metrics()
+    logging.getLogger().addHandler(ErrorCounter(metrics))
+    attach_db_monitor(engine, metrics)
+    main.bot.session.middleware(api_timer(metrics))
+
+    print(f"Bot API стенд: {api_url}, БД: {database_url}, режим: {args.mode}")
+
+    # Холодный старт: подготовка БД отдельно от замеров
+    started = time.perf_counter()
+    if args.mode == "handler":
+        await main.handler({"body": "{}"}, None)
+        send = handler_sender(main)
+        stop = None
+    else:
+        from database.bootstrap import prepare_database
+
+        await prepare_database()
+        send, stop = polling_sender(main, api)
+    print(f"Холодный старт: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    factory = UpdateFactory()
+    rnd = random.Random(args.seed)
+    next_user = FIRST_USER_ID
+    failed = False
+    try:
+        for users in args.users:
+            metrics.reset()
+            api_calls_before = len(api.calls)
+            commits, statements = write_queue.commits, write_queue.statements
+            send_stats = send_limiter.stats()
+
+            user_ids = list(range(next_user, next_user + users))
+            next_user += users
+            scenarios = [registration_steps(factory, user_id, rnd) for user_id in user_ids]
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    virtual_user(
+                        steps,
+                        send,
+                        metrics,
+                        args.think,
+                        rnd.uniform(0, args.ramp) if args.ramp else 0,
+                        random.Random(rnd.random()),
+                    )
+                    for steps in scenarios
+                )
+            )
+            elapsed = time.perf_counter() - started
+
+            completed = await completed_registrations(user_ids)
+            stats = send_limiter.stats()
+            print_report(
+                f"{users} пользователей",
+                elapsed,
+                users,
+                completed,
+                metrics,
+                api,
+                api_calls_before,
+                {
+                    "commits": write_queue.commits - commits,
+                    "statements": write_queue.statements - statements,
+                    "send_waits": stats["waits"] - send_stats["waits"],
+                    "send_retries": stats["retries"] - send_stats["retries"],
+                },
+            )
+            if completed < users or metrics.step_errors or metrics.log_errors:
+                failed = True
+    finally:
+        if stop is not None:
+            await stop()
+        else:
+            await main.bot.session.close()
+        await api.stop()
+
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 20, 50, 120])
+    parser.add_argument("--mode", choices=("handler", "polling"), default="handler")
+    parser.add_argument(
+        "--think", type=float, default=0.5, help="средняя пауза пользователя между шагами, с"
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=0, help="за сколько секунд подключаются все пользователи"
+    )
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument(
+        "--no-rate-limit", action="store_true", help="снять лимиты отправки Telegram"
+    )
+    parser.add_argument("--database-url", help="БД (по умолчанию новая во временной папке)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
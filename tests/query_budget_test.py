@@ -0,0 +1,190 @@
+"""
+Проверка числа запросов к БД по хендлерам.
+
+Сценарий проходит основные хендлеры через main.handler с локальным стендом
+Bot API: регистрацию, повторный /start, профиль и правку анкеты, /match,
+/match_pairs, /stats, /export и меню администратора (статистика, тексты,
+чаты). Для каждого хендлера считается максимум сессий и запросов на один
+апдейт (записи через очередь группового коммита тоже считаются, чтение
+состояния FSM до хендлера — нет).
+
+Бот работает в строгом режиме QUERY_BUDGET_STRICT: апдейт, превысивший бюджет
+хендлера из utils/query_budget.py или выполнивший один запрос в цикле, падает.
+
+Число запросов не зависит от машины, поэтому база хранится в репозитории:
+    python tests/query_budget_test.py
+    python tests/query_budget_test.py --compare tests/baselines/query_counts.json
+    python tests/query_budget_test.py --save tests/baselines/query_counts.json
+
+Код выхода 1, если шаг упал или у какого-то хендлера выросло число сессий или
+запросов относительно базы. Если число уменьшилось — обновите базу (--save).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime
+
+from fake_bot_api import FakeBotAPI
+from load_test import (
+    FIRST_USER_ID,
+    UpdateFactory,
+    configure_environment,
+    handler_sender,
+    registration_steps,
+)
+
+ADMIN_ID = FIRST_USER_ID
+# Участники помимо администратора, чтобы /match, /stats и /export читали данные
+OTHER_USERS = 5
+
+
+def scenario(factory: UpdateFactory) -> list[tuple[str, dict]]:
+    """Шаги сценария: (название, апдейт)"""
+    from database.init_texts import TEXT_KEYS
+    from options import INTERESTS
+
+    rnd = random.Random(1)
+    steps = []
+    for user_id in range(ADMIN_ID + 1, ADMIN_ID + 1 + OTHER_USERS):
+        steps.extend(registration_steps(factory, user_id, rnd))
+    steps.extend(registration_steps(factory, ADMIN_ID, rnd))
+
+    message = lambda text: factory.message(ADMIN_ID, text)  # noqa: E731
+    callback = lambda data: factory.callback(ADMIN_ID, data)  # noqa: E731
+    text_key = next(iter(TEXT_KEYS))
+    steps += [
+        ("start_returning", message("/start")),
+        ("profile", message("/profile")),
+        ("edit", message("/edit")),
+        ("edit_name", callback("edit_name")),
+        ("edit_name_text", message("Петр Сидоров")),
+        ("edit", message("/edit")),
+        ("edit_city", callback("edit_city")),
+        ("edit_city_text", message("Казань")),
+        ("edit", message("/edit")),
+        ("edit_interests", callback("edit_interests")),
+        ("edit_interest_toggle", callback(INTERESTS.options[0].callback_data)),
+        ("edit_interests_confirm", callback(INTERESTS.confirm_callback)),
+        ("match", message("/match")),
+        ("match_pairs", message("/match_pairs")),
+        ("stats", message("/stats")),
+        ("stats_rebuild", callback("admin_stats_rebuild")),
+        ("export", message("/export csv")),
+        ("admin", message("/admin")),
+        ("admin_stats", callback("admin_stats")),
+        ("admin_back", callback("admin_back_to_main")),
+        ("admin_edit_texts", callback("admin_edit_texts")),
+        ("admin_edit_text", callback(f"admin_edit_{text_key}")),
+        ("admin_view_text", callback(f"admin_view_{text_key}")),
+        ("admin_list_texts", callback("admin_list_texts")),
+        ("admin_back", callback("admin_back_to_main")),
+        ("admin_chats", callback("admin_chats")),
+        ("admin_chat_open", callback("admin_chat_open_1")),
+        ("admin_chat_tags", callback("admin_chat_tags_1")),
+        ("admin_back", callback("admin_back_to_main")),
+        ("admin_close", callback("admin_close")),
+    ]
+    return steps
+
+
+def save_results(path: str, results: dict[str, dict]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "meta": {"created_at": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"\nБаза сохранена: {path}")
+
+
+def compare(results: dict[str, dict], baseline: dict) -> list[str]:
+    """Таблица сравнения; возвращает хендлеры, у которых выросло число запросов"""
+    base_results = baseline.get("results", {})
+    regressions = []
+    print(f"\n{'хендлер':<46} {'сессий':>12} {'запросов':>12}")
+    for name, current in sorted(results.items()):
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<46} {current['sessions']:>12} {current['statements']:>12}  новый")
+            continue
+        mark = ""
+        if current["sessions"] > base["sessions"] or current["statements"] > base["statements"]:
+            regressions.append(name)
+            mark = "  ❌"
+        elif current["sessions"] < base["sessions"] or current["statements"] < base["statements"]:
+            mark = "  ⬇️"
+        sessions = f"{base['sessions']}→{current['sessions']}"
+        statements = f"{base['statements']}→{current['statements']}"
+        print(f"{name:<46} {sessions:>12} {statements:>12}{mark}")
+    for name in sorted(set(base_results) - set(results)):
+        print(f"{name:<46} {'—':>12} {'—':>12}  не вызывался")
+    return regressions
+
+
+async def run(args) -> int:
+    api = FakeBotAPI()
+    configure_environment(await api.start(), None, no_rate_limit=True)
+    os.environ["ADMIN_USER_ID"] = str(ADMIN_ID)
+    os.environ["QUERY_BUDGET_STRICT"] = "1"
+
+    logging.basicConfig(level=logging.WARNING)
+    import main
+    from utils.query_budget import budget_for, usage_by_handler
+
+    logging.getLogger().setLevel(logging.WARNING)
+    send = handler_sender(main)
+    failed = []
+    try:
+        for step, update in scenario(UpdateFactory()):
+            if not await send(update):
+                failed.append(step)
+    finally:
+        await main.bot.session.close()
+        await api.stop()
+
+    results = {
+        name: {"sessions": usage.sessions, "statements": usage.statements}
+        for name, usage in usage_by_handler.items()
+    }
+    print(f"{'хендлер':<46} {'сессий':>12} {'запросов':>12}")
+    for name, usage in sorted(results.items()):
+        budget = budget_for(name)
+        print(
+            f"{name:<46} {usage['sessions']:>5} из {budget.sessions:<4} "
+            f"{usage['statements']:>5} из {budget.statements:<4}"
+        )
+
+    code = 0
+    if failed:
+        print(f"\n❌ Упали шаги (см. предупреждения выше): {', '.join(failed)}")
+        code = 1
+    if args.save:
+        save_results(args.save, results)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"\n❌ Выросло число запросов: {', '.join(regressions)}")
+            code = 1
+        else:
+            print("\n✅ Число запросов не выросло")
+    return code
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--save", metavar="PATH", help="сохранить результаты как базу (JSON)")
+    parser.add_argument("--compare", metavar="PATH", help="сравнить с базой (JSON)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,72 @@
+"""
+Быстрая проверка одного пользователя.
+
+Один пользователь проходит регистрацию через main.handler с локальным стендом
+Bot API. Для каждого шага печатаются время и ответы бота, в конце — сохраненная
+анкета. Код выхода 1, если шаг упал или анкета не сохранилась.
+
+Запуск из корня репозитория:
+    python tests/quick_test.py
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from fake_bot_api import FakeBotAPI
+from load_test import (
+    FIRST_USER_ID,
+    UpdateFactory,
+    configure_environment,
+    handler_sender,
+    registration_steps,
+)
+
+
+async def run() -> int:
+    api = FakeBotAPI()
+    configure_environment(await api.start(), None, no_rate_limit=True)
+
+    logging.basicConfig(level=logging.WARNING)
+    import main
+    from database import async_session_maker, UserRepository
+    from options import EVENTS, INTERESTS
+
+    logging.getLogger().setLevel(logging.WARNING)
+    send = handler_sender(main)
+    user_id = FIRST_USER_ID
+    failed = False
+    try:
+        for step, update in registration_steps(UpdateFactory(), user_id, random.Random(1)):
+            calls_before = len(api.calls)
+            started = time.perf_counter()
+            ok = await send(update)
+            elapsed = (time.perf_counter() - started) * 1000
+            failed |= not ok
+            print(f"{'✅' if ok else '❌'} {step:<18} {elapsed:7.1f} мс")
+            for call in api.calls[calls_before:]:
+                text = (call.text or "").replace("\n", " ")
+                print(f"     {call.method:<24} {text[:70]}")
+
+        async with async_session_maker() as session:
+            user = await UserRepository(session).get_by_id(user_id)
+    finally:
+        await main.bot.session.close()
+        await api.stop()
+
+    if not user or not (user.first_name and user.city and user.interests_mask and user.events_mask):
+        print("❌ Анкета не сохранена")
+        return 1
+    print(
+        f"\nАнкета: {user.first_name} {user.last_name}, {user.city}\n"
+        f"Интересы: {INTERESTS.names_str(user.interests_mask)}\n"
+        f"Мероприятия: {EVENTS.names_str(user.events_mask)}\n"
+        f"О себе: {user.about or '—'}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
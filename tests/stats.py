@@ -0,0 +1,15 @@
+"""
+Общие вспомогательные функции статистики для тестовых скриптов.
+
+Перцентили считаются одинаково в нагрузочном тесте и бенчмарке профилей
+хранения, чтобы их отчеты можно было сравнивать между собой.
+"""
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Перцентиль pct (0–100) методом ближайшего ранга; 0 для пустого списка"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,80 @@
+"""
+Проверка ответа на callback в теле ответа вебхука (WEBHOOK_REPLY).
+
+Через main.handler с локальным стендом Bot API проходят два нажатия:
+  - обычное: answerCallbackQuery возвращается в теле ответа функции и не
+    отправляется отдельным запросом;
+  - хендлер падает после callback.answer(): функция отвечает ошибкой, которую
+    Telegram не выполнит, поэтому answerCallbackQuery должен уйти в Bot API сам.
+
+Запуск из корня репозитория:
+    python tests/webhook_reply_test.py
+
+Код выхода 1, если какая-то проверка не прошла.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from fake_bot_api import FakeBotAPI
+from load_test import FIRST_USER_ID, UpdateFactory, configure_environment
+
+FAILING_CALLBACK = "webhook_reply_test_fail"
+
+
+async def run() -> int:
+    api = FakeBotAPI()
+    configure_environment(await api.start(), None, no_rate_limit=True)
+    os.environ["WEBHOOK_REPLY"] = "1"
+
+    logging.basicConfig(level=logging.WARNING)
+    import main
+    from aiogram import F
+    from aiogram.types import CallbackQuery
+
+    @main.dp.callback_query(F.data == FAILING_CALLBACK)
+    async def failing_handler(callback: CallbackQuery):
+        await callback.answer("Сейчас упаду")
+        raise RuntimeError("handler failed after answer")
+
+    # Ошибка хендлера ожидаема — не засоряем вывод трассировкой
+    logging.getLogger().setLevel(logging.CRITICAL)
+    factory = UpdateFactory()
+    checks: list[tuple[str, bool]] = []
+    try:
+        await main.handler({"body": json.dumps(factory.message(FIRST_USER_ID, "/start"))}, None)
+
+        calls_before = len(api.calls)
+        response = await main.handler(
+            {"body": json.dumps(factory.callback(FIRST_USER_ID, "event_register"))}, None
+        )
+        body = json.loads(response["body"] or "{}")
+        sent = [call.method for call in api.calls[calls_before:]]
+        checks.append(
+            ("ответ на нажатие — в теле ответа", body.get("method") == "answerCallbackQuery")
+        )
+        checks.append(("ответ на нажатие не отправлен отдельно", "answerCallbackQuery" not in sent))
+
+        calls_before = len(api.calls)
+        response = await main.handler(
+            {"body": json.dumps(factory.callback(FIRST_USER_ID, FAILING_CALLBACK))}, None
+        )
+        sent = [call.method for call in api.calls[calls_before:]]
+        checks.append(("упавший хендлер — ответ 500", response["statusCode"] == 500))
+        checks.append(
+            ("упавший хендлер — answerCallbackQuery ушел в Bot API", "answerCallbackQuery" in sent)
+        )
+    finally:
+        await main.bot.session.close()
+        await api.stop()
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))